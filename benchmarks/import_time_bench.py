@@ -0,0 +1,163 @@
+from typing import Any, Optional
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from json import dump
+from statistics import median
+from sys import argv
+import subprocess, platform, sys, os
+
+
+ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#cold start budget of each entry point, in milliseconds of cumulative import time (the imports of the script plus
+#everything that runs at its module level), measured with `python -X importtime` in a fresh interpreter
+#the scripts that do their work at the module level, like snapshot_sensitive.py, can't be imported and aren't here
+ENTRY_POINT_BUDGETS_MS: dict[str, float] = {
+    "commands/display_multiplication_table.py": 30,
+    "commands/multiplication_trainer_game.py": 30,
+    "routines/multiplication_trainer.py": 30,
+    "routines/mkftp_android_snapshot.py": 75,
+    "share/python/script_utils.py": 25,
+}
+
+
+def parse_import_times(stderr: str) -> list[tuple[int, int, str]]:
+    r"""
+    Parses the `-X importtime` report, each line looks like `import time:  self [us] | cumulative | imported package`,
+    the nesting of the imports is kept as the leading spaces of the package name.
+
+    :return:
+        A list of (self microseconds, cumulative microseconds, package) tuples, in the order that they were reported.
+    """
+
+    imports: list[tuple[int, int, str]] = []
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, package = line[len("import time:"):].split("|", 2)
+        imports.append((int(self_us), int(cumulative_us), package.rstrip()[1:]))
+
+    return imports
+
+
+def measure_entry_point(script: str) -> dict[str, Any]:
+    r"""
+    Imports the script as a module in a new interpreter, so nothing is already cached in sys.modules, and returns its
+    cumulative import time with the heaviest modules that it imported.
+    """
+
+    module: str = os.path.splitext(os.path.basename(script))[0]
+    code: str = f"import sys; sys.path.insert(0, {os.path.dirname(script)!r}); import {module}"
+    process: subprocess.CompletedProcess = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                                          capture_output=True, text=True, cwd=ROOT_DIR)
+
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1]}
+
+    imports: list[tuple[int, int, str]] = parse_import_times(process.stderr)
+    index: int = next(index for index, (_, _, package) in enumerate(imports) if package == module)
+    children: list[tuple[int, int, str]] = []
+
+    for entry in reversed(imports[:index]):  #the imports of a module are reported right before the module itself
+        if not entry[2].startswith(" "):
+            break
+        if not entry[2].startswith("   "):
+            children.append(entry)
+
+    cumulative_us: int = imports[index][1]
+    heaviest: list[tuple[int, int, str]] = sorted(children, key=lambda entry: entry[1], reverse=True)
+
+    return {
+        "cumulative_ms": cumulative_us / 1000,
+        "heaviest": {package.strip(): round(cumulative / 1000, 3) for _, cumulative, package in heaviest[:5]},
+    }
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_user_arguments(usr_args: list[str]) -> Namespace:
+    r"""
+    Parses the arguments of the import time benchmark.
+
+    :param usr_args:
+        User arguments
+
+    :return:
+        Parsed arguments
+    """
+
+    parser: ArgumentParser = ArgumentParser(description="Measure the cold start import time of the command line\
+                                            entry points with `python -X importtime` and fail when any of them goes\
+                                            over its budget.")
+
+    parser.add_argument("-E", "--entry-points", type=str, nargs="+", choices=ENTRY_POINT_BUDGETS_MS.keys(),
+                        default=list(ENTRY_POINT_BUDGETS_MS), help="Scripts to measure, relative to the repository.")
+    parser.add_argument("-r", "--runs", type=int, default=5, help="Fresh interpreters started for each entry point,\
+                        the fastest of the runs is compared with the budget.")
+    parser.add_argument("-x", "--scale", type=float, default=1.0, help="Multiplier for every budget, for slower\
+                        machines.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="JSON file where the results are saved, by\
+                        default nothing is saved.")
+
+    return parser.parse_args(usr_args)
+
+
+def main(usr_args: list[str]) -> int:
+    args: Namespace = parse_user_arguments(usr_args)
+    report: dict[str, Any] = {
+        "commit": get_git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "results": [],
+    }
+    over_budget: int = 0
+
+    for entry_point in args.entry_points:
+        runs: list[dict[str, Any]] = [measure_entry_point(os.path.join(ROOT_DIR, entry_point))
+                                      for _ in range(args.runs)]
+        budget_ms: float = ENTRY_POINT_BUDGETS_MS[entry_point] * args.scale
+        errors: list[str] = [run["error"] for run in runs if "error" in run]
+
+        if errors:
+            over_budget += 1
+            report["results"].append({"entry_point": entry_point, "budget_ms": budget_ms, "error": errors[0]})
+            print(f"  {entry_point:>42}: FAILED  {errors[0]}")
+            continue
+
+        elapsed_ms: float = min(run["cumulative_ms"] for run in runs)  #the least disturbed by the rest of the machine
+        passed: bool = elapsed_ms <= budget_ms
+        over_budget += not passed
+
+        report["results"].append({
+            "entry_point": entry_point,
+            "budget_ms": budget_ms,
+            "min_ms": round(elapsed_ms, 3),
+            "median_ms": round(median(run["cumulative_ms"] for run in runs), 3),
+            "passed": passed,
+            "heaviest": runs[-1]["heaviest"],
+        })
+
+        print(f"  {entry_point:>42}: {elapsed_ms:>8.2f} ms / {budget_ms:>6.1f} ms  {'ok' if passed else 'OVER BUDGET'}"
+              f"  ({', '.join(f'{package} {ms:.1f}' for package, ms in runs[-1]['heaviest'].items())})")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            dump(report, file, indent=2)
+
+        print(f"Results saved to {args.output}")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(argv[1:]))
@@ -0,0 +1,117 @@
+from typing import Any, Callable
+from argparse import ArgumentParser, Namespace
+from contextlib import redirect_stdout
+from json import dump
+from time import perf_counter, sleep
+from sys import argv
+import importlib.util, tempfile, platform, random, io, os
+
+
+ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_SCRIPT: str = os.path.join(ROOT_DIR, "routines", "mkftp_android_snapshot.py")
+DATA_PATHS: list[str] = ["/storage/emulated/0/DCIM", "/storage/emulated/0/WhatsApp", "/storage/emulated/0/Android"]
+
+
+def load_snapshot_module(path: str) -> Any:
+    spec: Any = importlib.util.spec_from_file_location("mkftp_android_snapshot", path)
+    module: Any = importlib.util.module_from_spec(spec)
+
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def write_manifest(root: str, name: str, entries: int, churn: float, rand: random.Random) -> None:
+    r"""
+    Writes a synthetic digest manifest with the entries spread over the data paths, where a churn fraction of them is
+    deleted, added or modified, depending on the seed.
+    """
+
+    lines: list[str] = []
+
+    for index in range(entries):
+        path: str = f"{DATA_PATHS[index % len(DATA_PATHS)].lstrip('/')}/dir{index % 1000:03}/file{index:08}.bin"
+        change: float = rand.random()
+
+        if change < churn / 3:  #deleted
+            continue
+
+        if change < churn * 2 / 3:  #replaced by a new file
+            path += ".new"
+
+        version: int = 1 if change < churn else 0
+        lines.append(f"blake2b:{index + version * entries:032x}\t{1024 + index % 4096 + version}\t{path}\n")
+
+    with open(os.path.join(root, name), "w", encoding="utf-8") as file:
+        file.writelines(sorted(lines, key=lambda line: line.split("\t", 2)[2]))
+
+
+def time_call(function: Callable, *args) -> tuple[float, Any]:
+    start: float = perf_counter()
+    result: Any = function(*args)
+
+    return (perf_counter() - start) * 1000, result
+
+
+def parse_user_arguments(usr_args: list[str]) -> Namespace:
+    r"""
+    Parses the arguments of the manifest diff benchmark.
+
+    :param usr_args:
+        User arguments
+
+    :return:
+        Parsed arguments
+    """
+
+    parser: ArgumentParser = ArgumentParser(description="Benchmark the --diff of the snapshot script: archive two\
+                                            synthetic digest manifests and compare them with the streaming merge.")
+
+    parser.add_argument("-n", "--entries", type=int, default=1_000_000, help="Files in each synthetic manifest.")
+    parser.add_argument("-c", "--churn", type=float, default=.05, help="Fraction of the files that changed between\
+                        the two snapshots.")
+    parser.add_argument("-s", "--seed", type=int, default=42, help="Seed for the synthetic changes.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="JSON file where the results are saved, by\
+                        default nothing is saved.")
+
+    return parser.parse_args(usr_args)
+
+
+def main(usr_args: list[str]) -> None:
+    args: Namespace = parse_user_arguments(usr_args)
+    snapshot: Any = load_snapshot_module(SNAPSHOT_SCRIPT)
+    results: dict[str, float] = {}
+
+    with tempfile.TemporaryDirectory(prefix="diff-bench-") as work_dir:
+        archived: list[str] = []
+
+        for label, churn in [("old", 0), ("new", args.churn)]:
+            write_manifest(work_dir, snapshot.DIGEST_MANIFEST_NAME, args.entries, churn, random.Random(args.seed))
+            results[f"archive_{label}_ms"], path = time_call(snapshot.archive_digest_manifest, work_dir, DATA_PATHS)
+            archived.append(path)
+            sleep(1)  #the archives are named after the second they were made
+
+        results["diff_ms"], diffs = time_call(snapshot.diff_manifests, *archived)
+        results["archive_size_kb"] = os.path.getsize(archived[1]) / 1024
+
+        with redirect_stdout(io.StringIO()):
+            results["report_ms"], _ = time_call(snapshot.diff_snapshots, Namespace(diff=[work_dir]))
+
+    for label, value in results.items():
+        print(f"  {label:>20}: {value:>12.2f}")
+
+    for diff in diffs:
+        print(f"  {diff.data_path}: +{diff.added} -{diff.deleted} ~{diff.modified}")
+
+    print(f"  {results['diff_ms'] * 1000 / args.entries:.2f} us per entry")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            dump({"python": platform.python_version(), "platform": platform.platform(), "entries": args.entries,
+                  "churn": args.churn, "seed": args.seed, "results": results}, file, indent=2)
+
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main(argv[1:])
@@ -0,0 +1,282 @@
+from typing import Any, Callable, Optional
+from argparse import ArgumentParser, Namespace
+from contextlib import redirect_stdout
+from datetime import datetime
+from ftplib import FTP
+from json import dump, loads
+from time import perf_counter
+from sys import argv
+import importlib.util, multiprocessing, subprocess, tempfile, platform, random, shutil, sys, os
+
+
+ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_SCRIPT: str = os.path.join(ROOT_DIR, "routines", "mkftp_android_snapshot.py")
+SERVER_SCRIPT: str = os.path.join(ROOT_DIR, "share", "python", "ftp_standin_server.py")
+LINK_PROFILES: list[str] = ["loopback", "wifi", "bad-wifi"]
+ENGINES: list[str] = ["threads", "asyncio"]
+BENCH_USERNAME: str = "bench"
+BENCH_PASSWORD: str = "bench"
+BENCH_TIMEOUT: int = 10
+KiB: int = 1024
+MiB: int = 1024 * KiB
+
+
+def write_random_file(path: str, size: int, rand: random.Random) -> None:
+    with open(path, "wb") as file:
+        for offset in range(0, size, MiB):
+            file.write(rand.randbytes(min(MiB, size - offset)))
+
+
+def make_tiny_tree(root: str, scale: float, rand: random.Random) -> None:
+    r"""
+    Many tiny files (1-4 KiB) spread over a few directories, like thumbnails and app caches.
+    """
+
+    for index in range(int(400 * scale)):
+        directory: str = os.path.join(root, f"dir{index % 20:02}")
+        os.makedirs(directory, exist_ok=True)
+        write_random_file(os.path.join(directory, f"tiny{index:05}.bin"), rand.randint(KiB, 4 * KiB), rand)
+
+
+def make_huge_tree(root: str, scale: float, rand: random.Random) -> None:
+    r"""
+    A few huge files, like recorded videos, above the SEGMENTED_MIN_SIZE of the snapshot script at any scale, so they
+    are always downloaded in segments.
+    """
+
+    min_size: int = load_snapshot_module(SNAPSHOT_SCRIPT).SEGMENTED_MIN_SIZE
+
+    os.makedirs(root, exist_ok=True)
+
+    for index in range(3):
+        write_random_file(os.path.join(root, f"huge{index}.mp4"), min_size + int(32 * MiB * scale), rand)
+
+
+def make_deep_tree(root: str, scale: float, rand: random.Random) -> None:
+    r"""
+    A deeply nested chain of directories with a handful of small files on each level.
+    """
+
+    directory: str = root
+
+    for level in range(int(25 * scale) or 1):
+        directory = os.path.join(directory, f"level{level:02}")
+        os.makedirs(directory, exist_ok=True)
+
+        for index in range(4):
+            write_random_file(os.path.join(directory, f"file{index}.txt"), rand.randint(KiB, 16 * KiB), rand)
+
+
+def make_wide_tree(root: str, scale: float, rand: random.Random) -> None:
+    r"""
+    A single directory with a lot of small files, like the WhatsApp media directories.
+    """
+
+    os.makedirs(root, exist_ok=True)
+
+    for index in range(int(1000 * scale)):
+        write_random_file(os.path.join(root, f"IMG_{index:06}.jpg"), 512, rand)
+
+
+SCENARIOS: dict[str, Callable[[str, float, random.Random], None]] = {
+    "tiny": make_tiny_tree,
+    "huge": make_huge_tree,
+    "deep": make_deep_tree,
+    "wide": make_wide_tree,
+}
+
+
+def load_snapshot_module(path: str) -> Any:
+    spec: Any = importlib.util.spec_from_file_location("mkftp_android_snapshot", path)
+    module: Any = importlib.util.module_from_spec(spec)
+
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  #not available on Windows
+        return None
+
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak / MiB if sys.platform == "darwin" else peak / KiB
+
+
+def run_mirror(host: str, port: int, ftp_path: str, target: str, procs: int, engine: str,
+               results: multiprocessing.Queue) -> None:
+    r"""
+    Mirrors the ftp_path into the target with the mkftp_android_snapshot functions, the same way its main() does. It
+    runs in its own process, so the peak RSS reported belongs to this run only.
+    """
+
+    snapshot: Any = load_snapshot_module(SNAPSHOT_SCRIPT)
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        start: float = perf_counter()
+        writer: Any = snapshot.DiskWriter(snapshot.WRITE_BUFFER_BUDGET)
+        digests: Any = snapshot.DigestManifest(target, snapshot.DIGEST_ALGORITHMS[0])
+
+        with snapshot.create_executor(engine, procs) as executor:
+            snapshot.mirror_ftp_files(ftp_path, target, [], executor, host, port, BENCH_USERNAME, BENCH_PASSWORD,
+                                      BENCH_TIMEOUT, writer=writer, digests=digests)
+
+        writer.close()
+        elapsed: float = perf_counter() - start
+
+    results.put({"elapsed": elapsed, "peak_rss_mb": get_peak_rss_mb(), "writer_mb_per_sec": writer.throughput() / MiB})
+
+
+def count_tree(root: str) -> tuple[int, int]:
+    files: int = 0
+    size: int = 0
+
+    for directory, _, names in os.walk(root):
+        files += len(names)
+        size += sum(os.path.getsize(os.path.join(directory, name)) for name in names)
+
+    return files, size
+
+
+def start_server(root: str, link: str, seed: int) -> tuple[subprocess.Popen, int]:
+    server: subprocess.Popen = subprocess.Popen([sys.executable, SERVER_SCRIPT, root, "--link", link, "--seed",
+                                                 str(seed)], stdout=subprocess.PIPE, text=True)
+    port: int = int(server.stdout.readline().strip().rsplit(":", 1)[1])
+
+    return server, port
+
+
+def get_server_commands(port: int) -> dict[str, int]:
+    with FTP() as ftp:
+        ftp.connect("127.0.0.1", port, timeout=BENCH_TIMEOUT)
+        ftp.login(BENCH_USERNAME, BENCH_PASSWORD)
+
+        return loads(ftp.sendcmd("SITE STATS")[4:])
+
+
+def run_scenario(scenario: str, link: str, engine: str, server_root: str, work_dir: str, procs: int,
+                 seed: int) -> dict[str, Any]:
+    target: str = os.path.join(work_dir, f"{scenario}-{link}")
+    server, port = start_server(server_root, link, seed)
+
+    try:
+        context: Any = multiprocessing.get_context("spawn")
+        results: Any = context.Queue()
+        worker: Any = context.Process(target=run_mirror, args=("127.0.0.1", port, f"/{scenario}", target, procs,
+                                                               engine, results))
+
+        worker.start()
+        measures: dict[str, Any] = results.get()
+        worker.join()
+
+        commands: dict[str, int] = get_server_commands(port)
+        commands = {command: count - (command in ["USER", "PASS", "SITE"])  #minus the stats session itself
+                    for command, count in commands.items()}
+
+    finally:
+        server.terminate()
+        server.wait()
+
+    files, size = count_tree(target)
+    expected_files, expected_size = count_tree(os.path.join(server_root, scenario))
+    shutil.rmtree(target, ignore_errors=True)
+
+    return {
+        "scenario": scenario,
+        "link": link,
+        "engine": engine,
+        "procs": procs,
+        "files": files,
+        "bytes": size,
+        "complete": (files, size) == (expected_files, expected_size),
+        "elapsed_sec": round(measures["elapsed"], 4),
+        "files_per_sec": round(files / measures["elapsed"], 2),
+        "mb_per_sec": round(size / MiB / measures["elapsed"], 3),
+        "writer_mb_per_sec": round(measures["writer_mb_per_sec"], 3),
+        "round_trips_per_file": round(sum(commands.values()) / max(1, files), 2),
+        "peak_rss_mb": measures["peak_rss_mb"] and round(measures["peak_rss_mb"], 2),
+        "commands": commands,
+    }
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_user_arguments(usr_args: list[str]) -> Namespace:
+    r"""
+    Parses the arguments of the mkftp_android_snapshot benchmark.
+
+    :param usr_args:
+        User arguments
+
+    :return:
+        Parsed arguments
+    """
+
+    parser: ArgumentParser = ArgumentParser(description="Benchmark the mkftp_android_snapshot mirror functions against\
+                                            a local stand-in FTP server filled with synthetic directory trees.")
+
+    parser.add_argument("-S", "--scenarios", type=str, nargs="+", choices=SCENARIOS.keys(), default=list(SCENARIOS),
+                        help="Synthetic trees to mirror.")
+    parser.add_argument("-l", "--links", type=str, nargs="+", choices=LINK_PROFILES, default=["loopback", "wifi"],
+                        help="Latency and packet drop profiles to simulate on the stand-in server.")
+    parser.add_argument("-e", "--engines", type=str, nargs="+", choices=ENGINES, default=["threads"],
+                        help="Transfer engines to compare, see the --engine argument of the snapshot script.")
+    parser.add_argument("-x", "--scale", type=float, default=1.0, help="Multiplier for the number and the size of\
+                        the files of each synthetic tree.")
+    parser.add_argument("-j", "--procs", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Number of\
+                        worker threads, the same default as the PROCS of the snapshot script.")
+    parser.add_argument("-s", "--seed", type=int, default=42, help="Seed for the synthetic files and the drops.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="JSON file where the results are saved, by\
+                        default a file named after the current commit in the current directory.")
+
+    return parser.parse_args(usr_args)
+
+
+def main(usr_args: list[str]) -> None:
+    args: Namespace = parse_user_arguments(usr_args)
+    commit: Optional[str] = get_git_commit()
+    report: dict[str, Any] = {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="mkftp-bench-") as work_dir:
+        server_root: str = os.path.join(work_dir, "server")
+
+        for scenario in args.scenarios:
+            print(f"Generating the {scenario} tree...")
+            SCENARIOS[scenario](os.path.join(server_root, scenario), args.scale, random.Random(args.seed))
+
+            for link, engine in [(link, engine) for link in args.links for engine in args.engines]:
+                result: dict[str, Any] = run_scenario(scenario, link, engine, server_root, work_dir, args.procs,
+                                                      args.seed)
+                report["results"].append(result)
+
+                print(f"  {scenario:>5} {link:>9} {engine:>7}: {result['files']:>6} files {result['elapsed_sec']:>9.3f} s "
+                      f"{result['files_per_sec']:>9.2f} files/s {result['mb_per_sec']:>8.3f} MB/s (disk {result['writer_mb_per_sec']:.1f}) "
+                      f"{result['round_trips_per_file']:>6.2f} rt/file  rss {result['peak_rss_mb']} MB"
+                      f"{'' if result['complete'] else '  (INCOMPLETE)'}")
+
+    output: str = args.output or f"mkftp_android_snapshot.bench.{commit or 'nocommit'}.json"
+
+    with open(output, "w") as file:
+        dump(report, file, indent=2)
+
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main(argv[1:])
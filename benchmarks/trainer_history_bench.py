@@ -0,0 +1,104 @@
+from typing import Any, Callable
+from argparse import ArgumentParser, Namespace
+from datetime import datetime, timedelta
+from json import dump
+from time import perf_counter
+from sys import argv
+import importlib.util, tempfile, platform, random, os
+
+
+ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAINER_SCRIPT: str = os.path.join(ROOT_DIR, "routines", "multiplication_trainer.py")
+
+
+def load_trainer_module(path: str) -> Any:
+    spec: Any = importlib.util.spec_from_file_location("multiplication_trainer", path)
+    module: Any = importlib.util.module_from_spec(spec)
+
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def write_sessions(log_file: str, sessions: int, start: datetime, rand: random.Random) -> datetime:
+    r"""
+    Appends synthetic sessions to a trainer log, with the accuracy going up and the duration going down over time.
+    """
+
+    with open(log_file, "a") as file:
+        for index in range(sessions):
+            start += timedelta(hours=rand.randint(1, 30))
+            accuracy: float = .5 + .4 * index / sessions
+            results: str = "".join("P" if rand.random() < accuracy else "F" for _ in range(25))
+
+            file.write(f"{str(start).replace(' ', '_')} {results} {rand.uniform(30, 90) - 20 * index / sessions:.2f}\n")
+
+    return start
+
+
+def time_call(function: Callable, *args) -> tuple[float, Any]:
+    start: float = perf_counter()
+    result: Any = function(*args)
+
+    return (perf_counter() - start) * 1000, result
+
+
+def parse_user_arguments(usr_args: list[str]) -> Namespace:
+    r"""
+    Parses the arguments of the trainer history benchmark.
+
+    :param usr_args:
+        User arguments
+
+    :return:
+        Parsed arguments
+    """
+
+    parser: ArgumentParser = ArgumentParser(description="Benchmark the history analytics of the multiplication\
+                                            trainer: the first load of a synthetic log, a load from the column cache\
+                                            and a load after a few sessions were appended.")
+
+    parser.add_argument("-n", "--sessions", type=int, default=100_000, help="Sessions in the synthetic log.")
+    parser.add_argument("-a", "--appended", type=int, default=10, help="Sessions appended for the incremental load.")
+    parser.add_argument("-s", "--seed", type=int, default=42, help="Seed for the synthetic sessions.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="JSON file where the results are saved, by\
+                        default nothing is saved.")
+
+    return parser.parse_args(usr_args)
+
+
+def main(usr_args: list[str]) -> None:
+    args: Namespace = parse_user_arguments(usr_args)
+    trainer: Any = load_trainer_module(TRAINER_SCRIPT)
+    rand: random.Random = random.Random(args.seed)
+    results: dict[str, float] = {}
+
+    with tempfile.TemporaryDirectory(prefix="trainer-bench-") as work_dir:
+        log_file: str = os.path.join(work_dir, "trainer.log.txt")
+        cache_dir: str = os.path.join(work_dir, "history")
+        last: datetime = write_sessions(log_file, args.sessions, datetime(2020, 1, 1), rand)
+
+        for label in ["cold", "cached"]:
+            results[f"{label}_load_ms"], history = time_call(trainer.load_history, log_file, cache_dir)
+            results[f"{label}_summary_ms"], summary = time_call(trainer.summarize_history, *history)
+
+        write_sessions(log_file, args.appended, last, rand)
+        results["appended_load_ms"], history = time_call(trainer.load_history, log_file, cache_dir)
+        results["appended_summary_ms"], summary = time_call(trainer.summarize_history, *history)
+
+    for label, elapsed in results.items():
+        print(f"  {label:>20}: {elapsed:>9.2f} ms")
+
+    print(f"  {summary['sessions']} sessions, {summary['accuracy']:.1%} accuracy, median of"
+          f" {summary['median_duration']:.2f} secs")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            dump({"python": platform.python_version(), "platform": platform.platform(), "sessions": args.sessions,
+                  "results": results}, file, indent=2)
+
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main(argv[1:])
@@ -1,46 +1,166 @@
 #!/usr/bin/env python3
 
-from sys import argv
+from sys import argv, stdout
+from typing import Optional
 from argparse import ArgumentParser, Namespace
+from html import escape
+import csv, os
 
 FG = [ "\033[30m", "\033[31m", "\033[32m",
        "\033[33m", "\033[34m", "\033[35m",
        "\033[36m", "\033[37m", "\033[m" ]
 
+EXPORT_FORMATS = ["csv", "html"]
+
+Table = list[list[Optional[int]]]
+
 
 def parse_command_arguments(cmd_args: list[str]) -> Namespace:
-	parser = ArgumentParser(description="...todo...")
+	parser = ArgumentParser(description="Display the multiplication table from 1 to --max, without the squares and\
+	                        the mirrored duplicates, or export it to a CSV/HTML file.")
 
 	parser.add_argument("-m", "--max", type=int, default=10)
 	parser.add_argument("-e", "--exclude", type=str, default="")
+	parser.add_argument("-o", "--output", type=str, default=None, help="Export the table to this file instead of\
+	                    printing it, the format is guessed by the file extension (.csv or .html).")
+	parser.add_argument("-f", "--format", type=str, choices=EXPORT_FORMATS, default=None, help="Force the export\
+	                    format of the --output file.")
+	parser.add_argument("-p", "--pager", action="store_true", help="Browse the table in a scrollable window, only\
+	                    the visible cells are computed, so it works with a very large --max.")
+
+	return parser.parse_args(cmd_args)
+
+
+def table_cell(ir: int, ic: int, excluded: set[int]) -> Optional[int]:
+	# a cell is only shown once, in the upper triangle: that skips the squares (ir == ic) and the mirrored
+	# duplicates (ic < ir) with a single comparison, no need to remember the pairs that were already used
+	if ic <= ir or ir in excluded or ic in excluded:
+		return None
+
+	return ir * ic
+
+
+def build_table(n: int, excluded: set[int]) -> Table:
+	return [[table_cell(ir, ic, excluded) for ic in range(1, n + 1)] for ir in range(1, n + 1)]
+
+
+def render_table(table: Table) -> str:
+	n = len(table)
+	w = max(3, len(str(n * n)))
+	blank = " " * w
+	lines = [f"{' ' * w}{FG[3]} " + " ".join(f"{ih:>{w}}" for ih in range(1, n + 1)) + f" {FG[-1]}"]
+
+	for ir, row in enumerate(table, start=1):
+		cells = [blank if r is None else f"{FG[2] if r % 2 == 0 else FG[1]}{r:>{w}}{FG[-1]}" for r in row]
+		lines.append(f"{FG[3]}{ir:>{w}}{FG[-1]} " + " ".join(cells) + " ")
+
+	return "\n".join(lines) + "\n"
+
+
+def export_table(table: Table, output: str, fmt: str) -> None:
+	headers = list(range(1, len(table) + 1))
+
+	with open(output, "w", newline="") as f:
+		if fmt == "csv":
+			writer = csv.writer(f)
+			writer.writerow([""] + headers)
+			writer.writerows([ir] + ["" if r is None else r for r in row] for ir, row in enumerate(table, start=1))
+			return
+
+		rows = ["<tr><th></th>" + "".join(f"<th>{ih}</th>" for ih in headers) + "</tr>"]
+		rows += [f"<tr><th>{ir}</th>" + "".join("<td></td>" if r is None else f"<td>{r}</td>" for r in row) + "</tr>"
+		         for ir, row in enumerate(table, start=1)]
+
+		f.write(f"<table>\n<caption>{escape(os.path.basename(output))}</caption>\n" + "\n".join(rows) + "\n</table>\n")
 
-	return parser.parse_args()
+
+def display_table_pager(n: int, excluded: set[int]) -> None:
+	import curses  # only the pager needs it, printing and exporting the table start faster without it
+
+	w = max(3, len(str(n * n)))
+	row0 = col0 = 1
+
+	def __display_table_pager_wrapper(stdscr: "curses._CursesWindow") -> None:
+		nonlocal row0, col0
+
+		curses.curs_set(0)
+		curses.use_default_colors()
+		curses.init_pair(1, curses.COLOR_RED, -1)
+		curses.init_pair(2, curses.COLOR_GREEN, -1)
+		curses.init_pair(3, curses.COLOR_YELLOW, -1)
+
+		while True:
+			height, width = stdscr.getmaxyx()
+			rows = max(1, height - 2)  #header line plus the status line
+			cols = max(1, (width - w - 1) // (w + 1))
+			last_row = min(n, row0 + rows - 1)
+			last_col = min(n, col0 + cols - 1)
+
+			stdscr.erase()
+
+			for x, ic in enumerate(range(col0, last_col + 1)):  #only the tile in the viewport is computed
+				stdscr.addstr(0, (x + 1) * (w + 1), f"{ic:>{w}}", curses.color_pair(3))
+
+			for y, ir in enumerate(range(row0, last_row + 1), start=1):
+				stdscr.addstr(y, 0, f"{ir:>{w}}", curses.color_pair(3))
+
+				for x, ic in enumerate(range(col0, last_col + 1)):
+					r = table_cell(ir, ic, excluded)
+
+					if r is not None:
+						stdscr.addstr(y, (x + 1) * (w + 1), f"{r:>{w}}", curses.color_pair(2 if r % 2 == 0 else 1))
+
+			status = f" rows {row0}-{last_row} cols {col0}-{last_col} of {n}  (hjkl/arrows, PgUp/PgDn, g/G, q to quit)"
+			stdscr.addnstr(height - 1, 0, status, width - 1, curses.A_REVERSE)
+			stdscr.refresh()
+
+			key = stdscr.getch()
+
+			if key in [ord("q"), 27]:
+				return
+			elif key in [curses.KEY_UP, ord("k")]:
+				row0 -= 1
+			elif key in [curses.KEY_DOWN, ord("j")]:
+				row0 += 1
+			elif key in [curses.KEY_LEFT, ord("h")]:
+				col0 -= 1
+			elif key in [curses.KEY_RIGHT, ord("l")]:
+				col0 += 1
+			elif key == curses.KEY_PPAGE:
+				row0 -= rows
+			elif key == curses.KEY_NPAGE:
+				row0 += rows
+			elif key == ord("g"):
+				row0 = col0 = 1
+			elif key == ord("G"):
+				row0, col0 = n - rows + 1, n - cols + 1
+
+			row0 = min(max(1, row0), max(1, n - rows + 1))
+			col0 = min(max(1, col0), max(1, n - cols + 1))
+
+	curses.wrapper(__display_table_pager_wrapper)
 
 
 def main(cmd_args: list[str]) -> None:
 	args = parse_command_arguments(cmd_args)
-	excluded = list(map(int, args.exclude.split(",")))
-	n = args.max
-	already_used = []
+	excluded = {int(e) for e in args.exclude.split(",") if e.strip()}
+
+	if args.pager:
+		display_table_pager(args.max, excluded)
+		return
 
-	print(" "*3, end=f"{FG[3]} ")
-	for ih in range(1, n + 1):  print(f"{ih:>3}", end=" ")
-	print(FG[-1])
+	table = build_table(args.max, excluded)
 
-	for ir in range(1, n + 1):
-		print(f"{FG[3]}{ir:>3}{FG[-1]}", end=" ")
+	if args.output is None:
+		stdout.write(render_table(table))
+		return
 
-		for ic in range(1, n + 1):
-			if ir in excluded or ic in excluded or (ir, ic) in already_used or ir == ic:
-				print(" "*3, end=" ")
-				continue
+	fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
 
-			r = ir * ic
-			clr = FG[2] if r % 2 == 0 else FG[1]
-			print(f"{clr}{r:>3}{FG[-1]}", end=" ")
+	if fmt not in EXPORT_FORMATS:
+		raise SystemExit(f"Unknown export format '{fmt}', use one of: {', '.join(EXPORT_FORMATS)}")
 
-			already_used += [(ir, ic), (ic, ir)]
-		print()
+	export_table(table, args.output, fmt)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,20 @@
-from typing import Any, Never
-import curses
+from typing import Any, Never, NamedTuple, Optional
 from sys import argv
 from argparse import ArgumentParser, Namespace
 from random import choice
-from num2words import num2words
-from dataclasses import dataclass
 from time import time
-import os
-from datetime import datetime
+import json, os, sys
+
+try:  #optional span timers and profiler, see the --trace argument
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "share", "python"))
+    from instrumentation import traced, start_instrumentation
+except ImportError as _:
+    traced = lambda name: lambda function: function
+    start_instrumentation = lambda *args, **key_args: False
+
+
+NUMBER_WORDS_LANGS: list[str] = ["en", "ptbr"]
+NUMBER_WORDS_CACHE: str = os.path.join(os.path.expanduser("~"), ".cache", "multiplication_trainer.words.json")
 
 
 class ScriptUtils:
@@ -40,9 +47,10 @@ class ScriptUtils:
 
     @staticmethod
     def display_options_menu(title: str, options: dict[Any, str], default_option: int = 0,
-                             up_keys: list[int] = [curses.KEY_UP, ord("k")],
-                             down_keys: list[int] = [curses.KEY_DOWN, ord("j")],
-                             select_keys: list[int] = [curses.KEY_ENTER, 10, 13, ord("o")]) -> Any:
+                             up_keys: Optional[list[int]] = None,
+                             down_keys: Optional[list[int]] = None,
+                             select_keys: Optional[list[int]] = None,
+                             filter_keys: list[int] = [ord("/")]) -> Any:
         r"""
         This function displays an interactive options menu in the terminal. The menu is navigable using specified keys
         for moving the selection up and down, and for selecting an option.
@@ -64,6 +72,11 @@ class ScriptUtils:
         :param select_keys:
             A list of key codes that, when pressed, select the currently highlighted option. By default, these are the
             enter key and the 'o' key.
+        :param filter_keys:
+            A list of key codes that, when pressed, start the type-to-filter mode. While filtering, every printable key
+            narrows the options with a fuzzy (subsequence) match, backspace undoes the last character, the up and down
+            arrows move the selection, the enter key selects and escape clears the filter. By default, this is the '/'
+            key.
 
         :return:
             A tuple containing three elements: the index of the selected option, the key of the selected option, and
@@ -71,11 +84,18 @@ class ScriptUtils:
             user.
         """
 
+        import curses  #only loaded when a menu is shown, the callers that just print don't pay for it
+
+        up_keys = [curses.KEY_UP, ord("k")] if up_keys is None else up_keys
+        down_keys = [curses.KEY_DOWN, ord("j")] if down_keys is None else down_keys
+        select_keys = [curses.KEY_ENTER, 10, 13, ord("o")] if select_keys is None else select_keys
+
         TITLE_PADDING_START: int = 1
         PROMPT_PADDING_START: int = 2
 
         option_keys: list[Any] = list(options.keys())
         option_values: list[str] = list(options.values())
+        option_index: list[str] = [option_value.lower() for option_value in option_values]  #precomputed for the filter
 
         #variables related to formating the style of the menu, size of each option, paddings, etc.
 
@@ -95,7 +115,11 @@ class ScriptUtils:
         def __display_options_menu_wrapper(stdscr: "curses._CursesWindow"):
             r"""
             This function displays an options menu in a curses window. It allows the user to navigate through the
-            options using the up and down keys.
+            options using the up and down keys, or to type a fuzzy filter after pressing one of the filter keys.
+
+            Only the rows that changed are repainted on each keypress (the previous and the new highlighted option), and
+            the screen is flushed with noutrefresh/doupdate. When the menu is taller than the terminal, only a scrolling
+            viewport of the options is drawn, so the cost of a keypress doesn't depend on the number of options.
 
             :param stdscr:
                 The curses window in which the options menu will be displayed.
@@ -105,37 +129,157 @@ class ScriptUtils:
 
             nonlocal title_lines, option_keys, option_values, selected_key, selected_index, selected_value, user_input
 
-            stdscr.refresh()
+            screen_height: int = 0
+            screen_width: int = 0
+            viewport_height: int = 1
+            viewport_top: int = 0
+
+            #the filter keeps a stack of candidates, one level per typed character; each level stores the option indexes
+            #that still match and the position right after their last matched character, so a new character only scans
+            #the previous level instead of every option, and the backspace just pops a level
+
+            filter_mode: bool = False
+            filter_query: str = ""
+            filter_stack: list[tuple[list[int], list[int]]] = [(list(range(len(option_values))), [0] * len(option_values))]
+            visible_options: list[int] = filter_stack[-1][0]
+            cursor: int = selected_index
+
+            def __draw_option(row: int) -> None:
+                option_value: str = option_values[visible_options[row]]
+                option_length_difference: int = max_prompt_length - len(option_value)
+                option_prompt: str = f"  {option_value.strip()}  " + " " * option_length_difference
+
+                stdscr.addnstr(row - viewport_top + menu_list_padding_top, PROMPT_PADDING_START, option_prompt,
+                               max(1, screen_width - PROMPT_PADDING_START - 1), curses.A_REVERSE if row == cursor else 0)
+
+            def __draw_filter_prompt() -> None:
+                if not filter_mode and not filter_query:
+                    return
+
+                filter_prompt: str = f"/{filter_query}" + ("" if visible_options else "  (no matches)")
+
+                stdscr.move(screen_height - 1, 0)
+                stdscr.clrtoeol()
+                stdscr.addnstr(screen_height - 1, PROMPT_PADDING_START, filter_prompt,
+                               max(1, screen_width - PROMPT_PADDING_START - 1))
 
-            while user_input not in select_keys:  #only stops the event listener when the enter key is pressed
-                stdscr.clear()
+            def __draw_viewport() -> None:
+                stdscr.move(menu_list_padding_top, 0)
+                stdscr.clrtobot()
+
+                for row in range(viewport_top, min(len(visible_options), viewport_top + viewport_height)):
+                    __draw_option(row)
+
+                __draw_filter_prompt()
+
+            def __draw_screen() -> None:
+                nonlocal screen_height, screen_width, viewport_height, viewport_top
+
+                screen_height, screen_width = stdscr.getmaxyx()
+                viewport_height = max(1, screen_height - menu_list_padding_top - 2)  #the last line is for the filter
+                viewport_top = min(viewport_top, cursor)
+                viewport_top = max(viewport_top, cursor - viewport_height + 1)
+
+                stdscr.erase()
 
                 for key, title_line in enumerate(title_lines):  #logic to write the title lines
-                    stdscr.addstr(title_padding_top + key, TITLE_PADDING_START + PROMPT_PADDING_START, title_line)
+                    stdscr.addnstr(title_padding_top + key, TITLE_PADDING_START + PROMPT_PADDING_START, title_line,
+                                   max(1, screen_width - TITLE_PADDING_START - PROMPT_PADDING_START - 1))
+
+                __draw_viewport()
+
+            def __narrow_filter(char: str) -> None:
+                candidates: list[int]; positions: list[int]
+                candidates, positions = filter_stack[-1]
+                next_candidates: list[int] = []
+                next_positions: list[int] = []
 
-                for key, option_value in enumerate(option_values):  #logic to write the menu options formated in a beaty way
-                    option_length: int = len(option_value)
-                    option_length_difference: int = max_prompt_length - option_length
-                    option_prompt: str = f"  {option_value.strip()}  " + " " * option_length_difference
+                for index, position in zip(candidates, positions):
+                    found: int = option_index[index].find(char, position)
 
-                    stdscr.addstr(key + menu_list_padding_top, PROMPT_PADDING_START, option_prompt,
-                                  curses.A_REVERSE if key == selected_index else 0)
+                    if found != -1:
+                        next_candidates.append(index)
+                        next_positions.append(found + 1)
 
-                    if key == len(option_values) - 1:
-                        stdscr.addstr(key + menu_list_padding_top + 2, 0, "")
+                filter_stack.append((next_candidates, next_positions))
+
+            curses.set_escdelay(25)
+            __draw_screen()
+
+            while True:  #only stops the event listener when an option is selected
+                shown_options: int = min(len(visible_options) - viewport_top, viewport_height)
+
+                if filter_mode:
+                    stdscr.move(screen_height - 1, min(PROMPT_PADDING_START + 1 + len(filter_query), screen_width - 1))
+                else:
+                    stdscr.move(min(menu_list_padding_top + shown_options + 1, screen_height - 1), 0)
+
+                stdscr.noutrefresh()
+                curses.doupdate()
 
                 #user event listeners section
 
-                stdscr.refresh()
                 user_input = stdscr.getch()
-
-                if user_input in up_keys:
-                    selected_index = (selected_index - 1) % len(option_keys)
+                previous_cursor: int = cursor
+                previous_query: str = filter_query
+                previous_filter_mode: bool = filter_mode
+
+                if user_input == curses.KEY_RESIZE:
+                    __draw_screen()
+                    continue
+
+                if filter_mode:
+                    if user_input in [curses.KEY_ENTER, 10, 13]:
+                        if visible_options:
+                            break
+                    elif user_input == 27:  #escape leaves the filter mode and shows every option again
+                        filter_mode = False
+                        filter_query = ""
+                        del filter_stack[1:]
+                    elif user_input in [curses.KEY_BACKSPACE, 127, 8]:
+                        if filter_query:
+                            filter_query = filter_query[:-1]
+                            filter_stack.pop()
+                    elif user_input == curses.KEY_UP and visible_options:
+                        cursor = (cursor - 1) % len(visible_options)
+                    elif user_input == curses.KEY_DOWN and visible_options:
+                        cursor = (cursor + 1) % len(visible_options)
+                    elif 32 <= user_input <= 126:
+                        filter_query += chr(user_input).lower()
+                        __narrow_filter(filter_query[-1])
+
+                elif user_input in select_keys:
+                    break
+                elif user_input in filter_keys:
+                    filter_mode = True
+                elif user_input in up_keys:
+                    cursor = (cursor - 1) % len(visible_options)
                 elif user_input in down_keys:
-                    selected_index = (selected_index + 1) % len(option_keys)
+                    cursor = (cursor + 1) % len(visible_options)
+
+                if filter_query != previous_query or filter_mode != previous_filter_mode:
+                    visible_options = filter_stack[-1][0]
 
-                selected_key = option_keys[selected_index]
-                selected_value = option_values[selected_index]
+                    try:  #keeps the same option highlighted if it still matches the filter
+                        cursor = visible_options.index(selected_index)
+                    except ValueError:
+                        cursor = 0
+
+                    viewport_top = max(0, cursor - viewport_height + 1)
+                    __draw_viewport()
+
+                elif cursor != previous_cursor:
+                    if viewport_top <= cursor < viewport_top + viewport_height:  #only the two changed rows
+                        __draw_option(previous_cursor)
+                        __draw_option(cursor)
+                    else:
+                        viewport_top = cursor if cursor < viewport_top else cursor - viewport_height + 1
+                        __draw_viewport()
+
+                if visible_options:
+                    selected_index = visible_options[cursor]
+                    selected_key = option_keys[selected_index]
+                    selected_value = option_values[selected_index]
 
         curses.wrapper(__display_options_menu_wrapper)
         return (selected_index, selected_key, selected_value)
@@ -160,6 +304,10 @@ def parse_user_arguments(usr_args: list[str]) -> Namespace:
                         the cases where x == y; a.k.a: the square cases.")
     parser.add_argument("-E", "--exclude", type=str, default="0", help="String (separeted by the ',' without spaces)\
                         with the number that the game will ignore.")
+    parser.add_argument("--trace", type=str, default=os.getenv("SCRIPTS_TRACE"), help="Directory where the time spent\
+                        on each phase of the game is saved when it exits, as a Chrome trace and a summary.")
+    parser.add_argument("--profile", action="store_true", help="Also run cProfile and save its pstats dump in the\
+                        --trace directory.")
 
     return parser.parse_args()
 
@@ -168,19 +316,69 @@ def get_difference_between_two_lists(l1: list[Any], l2: list[Any]) -> list[Any]:
     return [i for i in l1 if i not in l2]
 
 
+@traced("words")
+def load_number_words(numbers: set[int], langs: list[str]) -> dict[str, dict[int, str]]:
+    r"""
+    Returns the spelled out version of each number for each language. The words are read from the NUMBER_WORDS_CACHE
+    file, num2words is only imported (it's the slowest import of the script) when a number is missing from the cache,
+    and the cache is updated with the new words.
+
+    :param numbers:
+        Numbers that should be spelled out.
+    :param langs:
+        Languages supported by num2words, like 'en' and 'ptbr'.
+
+    :return:
+        One dictionary for each language, that maps the number to its words.
+    """
+
+    cache: dict[str, dict[str, str]] = {}
+
+    try:
+        with open(NUMBER_WORDS_CACHE, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError) as _:
+        pass
+
+    missing: list[tuple[str, int]] = [(lang, n) for lang in langs for n in numbers
+                                      if str(n) not in cache.get(lang, {})]
+
+    if missing:
+        from num2words import num2words
+
+        for lang, n in missing:
+            cache.setdefault(lang, {})[str(n)] = num2words(n, lang=lang)
+
+        try:  #written to a temporary file first, so a game that is closed midway doesn't leave a broken cache
+            os.makedirs(os.path.dirname(NUMBER_WORDS_CACHE), exist_ok=True)
+
+            with open(f"{NUMBER_WORDS_CACHE}.tmp", "w", encoding="utf-8") as file:
+                json.dump(cache, file, ensure_ascii=False)
+
+            os.replace(f"{NUMBER_WORDS_CACHE}.tmp", NUMBER_WORDS_CACHE)
+        except OSError as _:
+            pass
+
+    return {lang: {n: cache[lang][str(n)] for n in numbers} for lang in langs}
+
+
 Challenge = tuple[tuple[int, int], list[int, str]]
 
-def generate_chalenges(start: int, end: int, ignore_squares: bool, excluded_numbers: list[int]) -> Challenge:
+def pick_challenge_numbers(start: int, end: int, ignore_squares: bool, excluded_numbers: list[int]) -> tuple[int, int]:
     valid_cases: int = get_difference_between_two_lists(range(start, end + 1), excluded_numbers)
     x: int = choice(valid_cases)
     y: int = choice(valid_cases)
-    r: int = x * y
 
     if x == y and ignore_squares:
-        return generate_chalenges(start, end, ignore_squares, excluded_numbers)
+        return pick_challenge_numbers(start, end, ignore_squares, excluded_numbers)
+
+    return (x, y)
+
 
-    valid_results: list[int, str] = [r, f"{r}", num2words(r), num2words(r, lang="ptbr"),
-                                     num2words(r, lang="ptbr").replace("ê", "e")]
+def generate_chalenges(x: int, y: int, number_words: dict[str, dict[int, str]]) -> Challenge:
+    r: int = x * y
+    valid_results: list[int, str] = [r, f"{r}", number_words["en"][r], number_words["ptbr"][r],
+                                     number_words["ptbr"][r].replace("ê", "e")]
     
     return ((x, y), valid_results)
 
@@ -201,8 +399,7 @@ def convert_number_list_string_to_number_list(num_list_str: list[str]) -> list[i
     return [int(n) for n in set(num_list_str.replace(" ", "").split(","))]
 
 
-@dataclass
-class ChallengeResult:
+class ChallengeResult(NamedTuple):
     x: int
     y: int
     expected_results: list[int, str]
@@ -210,6 +407,7 @@ class ChallengeResult:
     is_correct: bool
 
 
+@traced("challenge")
 def challenge_user(challenge_data: Challenge, key: int) -> ChallengeResult:
     fg: ScriptUtils.Color.Fg = ScriptUtils.Color.Fg
     bg: ScriptUtils.Color.Bg = ScriptUtils.Color.Bg
@@ -232,7 +430,10 @@ def challenge_user(challenge_data: Challenge, key: int) -> ChallengeResult:
     return ChallengeResult(x, y, expected_results, user_input, is_correct)
 
 
+@traced("summary")
 def display_current_game_results(challenge_results: list[ChallengeResult], benchmark: float) -> None:
+    from datetime import datetime
+
     TABLE_SEPARATOR: str = f"  {fg.BLACK}|{fg.RESET}  "
     TABLE_SEPARATOR_LN: str = f"\n  {fg.BLACK}|{fg.RESET}  "
 
@@ -263,8 +464,11 @@ def start_playing(args: Namespace) -> None:
 
     validate_excluded_numbers(args.start, args.end, excluded_numbers)  #to be sure that it's possible to generate a random string quickly
     
-    challenges: list[Challenge] = [generate_chalenges(args.start, args.end, args.ignore_squares, excluded_numbers)
-                                   for _ in range(args.count)]
+    challenge_numbers: list[tuple[int, int]] = [pick_challenge_numbers(args.start, args.end, args.ignore_squares,
+                                                                       excluded_numbers) for _ in range(args.count)]
+    number_words: dict[str, dict[int, str]] = load_number_words({x * y for x, y in challenge_numbers},
+                                                                NUMBER_WORDS_LANGS)
+    challenges: list[Challenge] = [generate_chalenges(x, y, number_words) for x, y in challenge_numbers]
 
     ScriptUtils.clear_screen()
 
@@ -283,6 +487,8 @@ def start_playing(args: Namespace) -> None:
 def main(usr_args: list[str]) -> None:
     args: Namespace = parse_user_arguments(usr_args)
 
+    start_instrumentation("multiplication_trainer_game", args.trace, args.profile)
+
     user_choice: tuple[int, str, str] = ScriptUtils.display_options_menu("Multiplication Game", {
         "start_playing": "Start Game!",
         "exit": "Quit Script"
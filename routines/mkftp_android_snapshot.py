@@ -1,25 +1,80 @@
-from typing import Any, Literal, Optional, Callable
+from typing import Any, Literal, Optional, Callable, Iterator
 from argparse import Namespace, ArgumentParser
-from json import loads, load
-from ftplib import FTP, error_perm
-from time import sleep, time
+from json import loads, load, dump
+from ftplib import FTP, error_perm, error_temp, error_reply, parse227
+from time import sleep, time, perf_counter, strftime, strptime, gmtime
 from sys import argv
-from concurrent.futures import ThreadPoolExecutor
-import curses, os
+from concurrent.futures import Executor, ThreadPoolExecutor, Future, wait as wait_futures
+from contextlib import contextmanager
+from contextvars import ContextVar, Token, copy_context
+from dataclasses import dataclass, field
+from threading import Lock, BoundedSemaphore, Condition, Event, Thread, local
+from queue import Queue
+from io import BytesIO
+import os, re, socket, sys, zlib
+
+try:  #optional span timers and profiler, see the --trace argument
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "share", "python"))
+    from instrumentation import traced, start_instrumentation
+except ImportError as _:
+    traced = lambda name: lambda function: function
+    start_instrumentation = lambda *args, **key_args: False
 
 
 MIRROR_ERROR_DELAY: int = 0
+MIRROR_MAX_ATTEMPTS: int = 5
 FTP_CONN_ERROR_DELAY: int = .5
 DEFAULT_TIMEOUT: int = 1
-PROCS: int = os.cpu_count() // 2
+PROCS: int = max(1, os.cpu_count() // 2)
+MAX_IN_FLIGHT: int = PROCS * 4
 DEFAULT_CREDENTIALS_JSON_PATH: str = "Desktop/data/datasets/fsinfo/android.credential.json"
 DEFAULT_TARGETS_JSON_PATH: str = "Desktop/data/datasets/fsinfo/android-snapshot.backup.json"
+FAILURE_MANIFEST_NAME: str = ".mkftp-failures.json"
+FILE_CACHE_NAME: str = ".mkftp-file-cache.json"
+FILE_CACHE_MAX_AGE: int = 7 * 24 * 60 * 60
+FILE_CACHE_MAX_ENTRIES: int = 100_000
+SEGMENTS: int = 4
+SEGMENTED_MIN_SIZE: int = 64 * 1024 * 1024
+SEGMENT_BLOCK_SIZE: int = 256 * 1024
+SEGMENT_STRIPE_SIZE: int = 8 * 1024 * 1024  #at most SEGMENTS stripes of a file are kept in memory to be digested
+WRITE_BUFFER_BUDGET: int = 64 * 1024 * 1024
+ENGINES: list[str] = ["threads", "asyncio"]
+WATCH_PROBE_DELAYS: list[int] = [5, 10, 20, 30, 60]  #seconds between the probes, the last one repeats
+WATCH_COOLDOWN: int = 30
+HISTORY_NAME: str = ".mkftp-history.json"
+HISTORY_MAX_RUNS: int = 20
+CO_COROUTINE: int = 0x80  #the same flag as inspect.CO_COROUTINE, without importing inspect
+PLAN_LARGEST_DIRECTORIES: int = 10
+ASYNC_TASKS_PER_PROC: int = 16
+ASYNC_CALLBACK_BATCH_SIZE: int = 1024 * 1024  #bytes received before the chunks are handed to a thread, see AsyncFTP
+DIGEST_MANIFEST_NAME: str = ".mkftp-digests.txt"
+MANIFEST_ARCHIVE_DIR: str = ".mkftp-manifests"
+MANIFEST_ARCHIVE_MAX: int = 30
+MANIFEST_HEADER: str = "#mkftp-manifest"
+MANIFEST_READ_SIZE: int = 1024 * 1024
+DIFF_LISTED_FILES: int = 10
+DIGEST_ALGORITHMS: list[str] = ["blake2b", "sha256", "sha1", "md5"]
+PACK_DIR_NAME: str = ".mkftp-packs"
+PACK_INDEX_NAME: str = "index.txt"
+PACK_NAME_PATTERN: re.Pattern = re.compile(r"pack-\d+\.bin$")
+PACK_SIZE: int = 64 * 1024 * 1024
+FTP_HASH_NAMES: dict[str, str] = {"sha256": "SHA-256", "sha1": "SHA-1", "md5": "MD5"}  #names used by the HASH command
+MODE_Z_POLICIES: list[str] = ["auto", "always", "never"]
+MODE_Z_MIN_SIZE: int = 32 * 1024
+MODE_Z_SAMPLE_SIZE: int = 64 * 1024
+MODE_Z_MAX_RATIO: float = .75
+MODE_Z_EXTENSIONS: list[str] = [".txt", ".json", ".xml", ".csv", ".tsv", ".log", ".md", ".html", ".htm", ".vcf", ".ics",
+                                ".db", ".sqlite", ".sqlite3", ".crypt14", ".bak", ".sql", ".svg", ".bmp", ".wav", ".tar"]
+STORED_EXTENSIONS: list[str] = [".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif", ".mp4", ".mkv", ".webm",
+                                ".3gp", ".mov", ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac", ".zip", ".7z", ".gz",
+                                ".xz", ".bz2", ".rar", ".apk", ".apks", ".obb", ".pdf", ".docx", ".xlsx", ".pptx"]
 
 
 def display_options_menu(title: str, options: dict[Any, str], default_option: int = 0,
-                            up_keys: list[int] = [curses.KEY_UP, ord("k")],
-                            down_keys: list[int] = [curses.KEY_DOWN, ord("j")],
-                            select_keys: list[int] = [curses.KEY_ENTER, 10, 13, ord("o")]) -> Any:
+                            up_keys: Optional[list[int]] = None,
+                            down_keys: Optional[list[int]] = None,
+                            select_keys: Optional[list[int]] = None,
+                            filter_keys: list[int] = [ord("/")]) -> Any:
     r"""
     This function displays an interactive options menu in the terminal. The menu is navigable using specified keys
     for moving the selection up and down, and for selecting an option.
@@ -41,6 +96,11 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
     :param select_keys:
         A list of key codes that, when pressed, select the currently highlighted option. By default, these are the
         enter key and the 'o' key.
+    :param filter_keys:
+        A list of key codes that, when pressed, start the type-to-filter mode. While filtering, every printable key
+        narrows the options with a fuzzy (subsequence) match, backspace undoes the last character, the up and down
+        arrows move the selection, the enter key selects and escape clears the filter. By default, this is the '/'
+        key.
 
     :return:
         A tuple containing three elements: the index of the selected option, the key of the selected option, and
@@ -48,11 +108,18 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
         user.
     """
 
+    import curses  #only loaded when a menu is shown, the callers that just print don't pay for it
+
+    up_keys = [curses.KEY_UP, ord("k")] if up_keys is None else up_keys
+    down_keys = [curses.KEY_DOWN, ord("j")] if down_keys is None else down_keys
+    select_keys = [curses.KEY_ENTER, 10, 13, ord("o")] if select_keys is None else select_keys
+
     TITLE_PADDING_START: int = 1
     PROMPT_PADDING_START: int = 2
 
     option_keys: list[Any] = list(options.keys())
     option_values: list[str] = list(options.values())
+    option_index: list[str] = [option_value.lower() for option_value in option_values]  #precomputed for the filter
 
     #variables related to formating the style of the menu, size of each option, paddings, etc.
 
@@ -72,7 +139,11 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
     def __display_options_menu_wrapper(stdscr: "curses._CursesWindow"):
         r"""
         This function displays an options menu in a curses window. It allows the user to navigate through the
-        options using the up and down keys.
+        options using the up and down keys, or to type a fuzzy filter after pressing one of the filter keys.
+
+        Only the rows that changed are repainted on each keypress (the previous and the new highlighted option), and
+        the screen is flushed with noutrefresh/doupdate. When the menu is taller than the terminal, only a scrolling
+        viewport of the options is drawn, so the cost of a keypress doesn't depend on the number of options.
 
         :param stdscr:
             The curses window in which the options menu will be displayed.
@@ -82,65 +153,224 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
 
         nonlocal title_lines, option_keys, option_values, selected_key, selected_index, selected_value, user_input
 
-        stdscr.refresh()
+        screen_height: int = 0
+        screen_width: int = 0
+        viewport_height: int = 1
+        viewport_top: int = 0
+
+        #the filter keeps a stack of candidates, one level per typed character; each level stores the option indexes
+        #that still match and the position right after their last matched character, so a new character only scans
+        #the previous level instead of every option, and the backspace just pops a level
+
+        filter_mode: bool = False
+        filter_query: str = ""
+        filter_stack: list[tuple[list[int], list[int]]] = [(list(range(len(option_values))), [0] * len(option_values))]
+        visible_options: list[int] = filter_stack[-1][0]
+        cursor: int = selected_index
+
+        def __draw_option(row: int) -> None:
+            option_value: str = option_values[visible_options[row]]
+            option_length_difference: int = max_prompt_length - len(option_value)
+            option_prompt: str = f"  {option_value.strip()}  " + " " * option_length_difference
+
+            stdscr.addnstr(row - viewport_top + menu_list_padding_top, PROMPT_PADDING_START, option_prompt,
+                           max(1, screen_width - PROMPT_PADDING_START - 1), curses.A_REVERSE if row == cursor else 0)
+
+        def __draw_filter_prompt() -> None:
+            if not filter_mode and not filter_query:
+                return
 
-        while user_input not in select_keys:  #only stops the event listener when the enter key is pressed
-            stdscr.clear()
+            filter_prompt: str = f"/{filter_query}" + ("" if visible_options else "  (no matches)")
+
+            stdscr.move(screen_height - 1, 0)
+            stdscr.clrtoeol()
+            stdscr.addnstr(screen_height - 1, PROMPT_PADDING_START, filter_prompt,
+                           max(1, screen_width - PROMPT_PADDING_START - 1))
+
+        def __draw_viewport() -> None:
+            stdscr.move(menu_list_padding_top, 0)
+            stdscr.clrtobot()
+
+            for row in range(viewport_top, min(len(visible_options), viewport_top + viewport_height)):
+                __draw_option(row)
+
+            __draw_filter_prompt()
+
+        def __draw_screen() -> None:
+            nonlocal screen_height, screen_width, viewport_height, viewport_top
+
+            screen_height, screen_width = stdscr.getmaxyx()
+            viewport_height = max(1, screen_height - menu_list_padding_top - 2)  #the last line is for the filter
+            viewport_top = min(viewport_top, cursor)
+            viewport_top = max(viewport_top, cursor - viewport_height + 1)
+
+            stdscr.erase()
 
             for key, title_line in enumerate(title_lines):  #logic to write the title lines
-                stdscr.addstr(title_padding_top + key, TITLE_PADDING_START + PROMPT_PADDING_START, title_line)
+                stdscr.addnstr(title_padding_top + key, TITLE_PADDING_START + PROMPT_PADDING_START, title_line,
+                               max(1, screen_width - TITLE_PADDING_START - PROMPT_PADDING_START - 1))
+
+            __draw_viewport()
 
-            for key, option_value in enumerate(option_values):  #logic to write the menu options formated in a beaty way
-                option_length: int = len(option_value)
-                option_length_difference: int = max_prompt_length - option_length
-                option_prompt: str = f"  {option_value.strip()}  " + " " * option_length_difference
+        def __narrow_filter(char: str) -> None:
+            candidates: list[int]; positions: list[int]
+            candidates, positions = filter_stack[-1]
+            next_candidates: list[int] = []
+            next_positions: list[int] = []
 
-                stdscr.addstr(key + menu_list_padding_top, PROMPT_PADDING_START, option_prompt,
-                                curses.A_REVERSE if key == selected_index else 0)
+            for index, position in zip(candidates, positions):
+                found: int = option_index[index].find(char, position)
 
-                if key == len(option_values) - 1:
-                    stdscr.addstr(key + menu_list_padding_top + 2, 0, "")
+                if found != -1:
+                    next_candidates.append(index)
+                    next_positions.append(found + 1)
+
+            filter_stack.append((next_candidates, next_positions))
+
+        curses.set_escdelay(25)
+        __draw_screen()
+
+        while True:  #only stops the event listener when an option is selected
+            shown_options: int = min(len(visible_options) - viewport_top, viewport_height)
+
+            if filter_mode:
+                stdscr.move(screen_height - 1, min(PROMPT_PADDING_START + 1 + len(filter_query), screen_width - 1))
+            else:
+                stdscr.move(min(menu_list_padding_top + shown_options + 1, screen_height - 1), 0)
+
+            stdscr.noutrefresh()
+            curses.doupdate()
 
             #user event listeners section
 
-            stdscr.refresh()
             user_input = stdscr.getch()
+            previous_cursor: int = cursor
+            previous_query: str = filter_query
+            previous_filter_mode: bool = filter_mode
+
+            if user_input == curses.KEY_RESIZE:
+                __draw_screen()
+                continue
 
-            if user_input in up_keys:
-                selected_index = (selected_index - 1) % len(option_keys)
+            if filter_mode:
+                if user_input in [curses.KEY_ENTER, 10, 13]:
+                    if visible_options:
+                        break
+                elif user_input == 27:  #escape leaves the filter mode and shows every option again
+                    filter_mode = False
+                    filter_query = ""
+                    del filter_stack[1:]
+                elif user_input in [curses.KEY_BACKSPACE, 127, 8]:
+                    if filter_query:
+                        filter_query = filter_query[:-1]
+                        filter_stack.pop()
+                elif user_input == curses.KEY_UP and visible_options:
+                    cursor = (cursor - 1) % len(visible_options)
+                elif user_input == curses.KEY_DOWN and visible_options:
+                    cursor = (cursor + 1) % len(visible_options)
+                elif 32 <= user_input <= 126:
+                    filter_query += chr(user_input).lower()
+                    __narrow_filter(filter_query[-1])
+
+            elif user_input in select_keys:
+                break
+            elif user_input in filter_keys:
+                filter_mode = True
+            elif user_input in up_keys:
+                cursor = (cursor - 1) % len(visible_options)
             elif user_input in down_keys:
-                selected_index = (selected_index + 1) % len(option_keys)
+                cursor = (cursor + 1) % len(visible_options)
+
+            if filter_query != previous_query or filter_mode != previous_filter_mode:
+                visible_options = filter_stack[-1][0]
 
-            selected_key = option_keys[selected_index]
-            selected_value = option_values[selected_index]
+                try:  #keeps the same option highlighted if it still matches the filter
+                    cursor = visible_options.index(selected_index)
+                except ValueError:
+                    cursor = 0
+
+                viewport_top = max(0, cursor - viewport_height + 1)
+                __draw_viewport()
+
+            elif cursor != previous_cursor:
+                if viewport_top <= cursor < viewport_top + viewport_height:  #only the two changed rows
+                    __draw_option(previous_cursor)
+                    __draw_option(cursor)
+                else:
+                    viewport_top = cursor if cursor < viewport_top else cursor - viewport_height + 1
+                    __draw_viewport()
+
+            if visible_options:
+                selected_index = visible_options[cursor]
+                selected_key = option_keys[selected_index]
+                selected_value = option_values[selected_index]
 
     curses.wrapper(__display_options_menu_wrapper)
     return (selected_index, selected_key, selected_value)
 
 
-def cprint(message: str) -> None:
+CPRINT_TAGS: dict[str, str] = {
+    "[B]": "\033[;;30m", "[^B]": "\033[;;40m",
+    "[r]": "\033[;;31m", "[^r]": "\033[;;41m",
+    "[g]": "\033[;;32m", "[^g]": "\033[;;42m",
+    "[y]": "\033[;;33m", "[^y]": "\033[;;43m",
+    "[b]": "\033[;;34m", "[^b]": "\033[;;44m",
+    "[m]": "\033[;;35m", "[^m]": "\033[;;45m",
+    "[c]": "\033[;;36m", "[^c]": "\033[;;46m",
+    "[w]": "\033[;;37m", "[^w]": "\033[;;47m",
+    "[/]": "\033[m",
+}
+CPRINT_TAGS_PATTERN: re.Pattern = re.compile(r"\[\^?[Brgybmcw]\]|\[/\]")
+CPRINT_COLORED: bool = sys.stdout.isatty()
+ANSI_CODES_PATTERN: re.Pattern = re.compile(r"\033\[[;\d]*m")
+STDOUT_LOCK: Lock = Lock()
+LOG_LABEL: ContextVar[Optional[str]] = ContextVar("LOG_LABEL", default=None)  #device of the lines, see --devices
+
+
+def write_line(line: str) -> None:
     r"""
-    Prints a colored message to the console based on color tags within the message.
+    Writes a line to the stdout in a single locked call, so the lines written by different threads don't interleave.
+    The line starts with the LOG_LABEL of the context when it's set, so the lines of each device can be told apart.
 
-    :param message: The message to print with color tags.
+    :param line: The line to write, without the trailing line break.
+    """
+
+    label: Optional[str] = LOG_LABEL.get()
+
+    if label is not None:
+        text: str = line.lstrip("\n")  #after the padding of the logger
+        line = f"{line[:len(line) - len(text)]}[{label}] {text}"
+
+    with STDOUT_LOCK:
+        sys.stdout.write(line + "\n")
+
+
+def render_color_tags(message: str, colored: bool = True) -> str:
+    r"""
+    Replaces the color tags within the message by their ANSI codes in a single pass of a precompiled regex, or removes
+    them when the output is not colored.
+
+    :param message: The message with color tags.
+    :param colored: Whether the tags should be replaced by the color codes or just stripped.
+
+    :return: The rendered message.
     """
 
-    clr_tags: list[tuple[str, str]] = [
-        ("[B]", "\033[;;30m"), ("[^B]", "\033[;;40m"),
-        ("[r]", "\033[;;31m"), ("[^r]", "\033[;;41m"),
-        ("[g]", "\033[;;32m"), ("[^g]", "\033[;;42m"),
-        ("[y]", "\033[;;33m"), ("[^y]", "\033[;;43m"),
-        ("[b]", "\033[;;34m"), ("[^b]", "\033[;;44m"),
-        ("[m]", "\033[;;35m"), ("[^m]", "\033[;;45m"),
-        ("[c]", "\033[;;36m"), ("[^c]", "\033[;;46m"),
-        ("[w]", "\033[;;37m"), ("[^w]", "\033[;;47m"),
-        ("[/]", "\033[m"),
-    ]
+    if "[" not in message:  #nothing to render, most of the plain messages end here
+        return message
+
+    return CPRINT_TAGS_PATTERN.sub(lambda match: CPRINT_TAGS[match.group()] if colored else "", message)
+
 
-    for clr_tag, clr_code in clr_tags:
-        message = message.replace(clr_tag, clr_code)
+def cprint(message: str) -> None:
+    r"""
+    Prints a colored message to the console based on color tags within the message. The tags are stripped when the
+    stdout is not a terminal.
+
+    :param message: The message to print with color tags.
+    """
 
-    print(message)
+    write_line(render_color_tags(message, CPRINT_COLORED))
 
 
 logger_msg_type = Literal["warning", "info", "todo", "error", "fail", "good", "pass"]
@@ -148,7 +378,8 @@ logger_pad_type = Literal["top", "bottom", "both"]
 
 def logger(message: str, ptype: logger_msg_type = "info", padding: Optional[logger_pad_type] = None) -> None:
     r"""
-    Logs a message with a specified type and optional padding.
+    Logs a message with a specified type and optional padding. The type label is written without its colors when the
+    stdout is not a terminal, like cprint does.
 
     :param message:
         The message to log.
@@ -171,7 +402,11 @@ def logger(message: str, ptype: logger_msg_type = "info", padding: Optional[logg
     padding_top: str = "\n" if padding in ["top", "both"] else ""
     padding_bottom: str = "\n" if padding in ["bottom", "both"] else ""
 
-    print(f"{padding_top}{prefix[ptype]} {message}\033[m{padding_bottom}")
+    if not CPRINT_COLORED:
+        write_line(f"{padding_top}{ANSI_CODES_PATTERN.sub('', prefix[ptype]).strip()} {message}{padding_bottom}")
+        return
+
+    write_line(f"{padding_top}{prefix[ptype]} {message}\033[m{padding_bottom}")
 
 
 def clear() -> None:
@@ -182,24 +417,30 @@ def clear() -> None:
     os.system("cls" if os.name == "nt" else "clear")
 
 
-def retry(expected_err: Exception = Exception, delay_sec: int = 1) -> Callable:
+def retry(expected_err: Exception = Exception, delay_sec: int = 1, max_attempts: Optional[int] = None) -> Callable:
     r"""
     A decorator for retrying a function execution upon encountering specified exceptions.
 
     This decorator wraps a function such that if the function raises an exception of the type `expected_err`, it will
     retry executing the function after a delay specified by `delay_sec`. If the function raises an exception that is not
-    of the type `expected_err`, it will print an error message and raise that error too.
+    of the type `expected_err`, it will print an error message and raise that error too. When `max_attempts` is set,
+    the last error is raised after that many failed attempts, with the count in its `retry_attempts` attribute.
+    Coroutine functions are retried too, waiting with asyncio.sleep so the event loop keeps running the other tasks.
 
     :param expected_err:
         The type of the exceptions upon which the function should be retried. Default is `Exception`, which means the
         function will be retried for any exception.
     :param delay_sec:
         The number of seconds to wait before retrying the function. Default is 1.
+    :param max_attempts:
+        The maximum number of times the function will be executed before giving up. Default is None, which means the
+        function will be retried forever.
 
     :returns:
         A callable that takes a function and returns a wrapped version of the function.
     :raises Exception:
-        If the function raises an exception that is not of the type `expected_err`.
+        If the function raises an exception that is not of the type `expected_err`, or keeps raising it after
+        `max_attempts` attempts.
 
     :Example:
 
@@ -211,17 +452,47 @@ def retry(expected_err: Exception = Exception, delay_sec: int = 1) -> Callable:
     """
 
     def decorator(function: Callable) -> Callable:
+        def __handle_error(err: Exception, attempts: int) -> None:  #raises the error when it shouldn't be retried
+            if not isinstance(err, expected_err):
+                cprint(f"[r]Unexpected Error[/]: [B][retry][/] {err} at {function}")
+                raise err
+
+            if max_attempts is not None and attempts >= max_attempts:
+                cprint(f"[r]Error[/]: [B][retry][/] {err} at {function}, giving up after {attempts} attempts")
+                err.retry_attempts = attempts
+                raise err
+
+            cprint(f"[r]Error[/]: [B][retry][/] {err} at {function}, trying again...")
+
+        if function.__code__.co_flags & CO_COROUTINE:
+            async def async_wrapper(*args, **key_args) -> Any:
+                import asyncio
+
+                attempts: int = 0
+
+                while True:
+                    attempts += 1
+
+                    try:
+                        return await function(*args, **key_args)
+
+                    except Exception as err:
+                        __handle_error(err, attempts)
+                        await asyncio.sleep(delay_sec)
+
+            return async_wrapper
+
         def wrapper(*args, **key_args) -> Any:
+            attempts: int = 0
+
             while True:
+                attempts += 1
+
                 try:
                     return function(*args, **key_args)
 
                 except Exception as err:
-                    if not isinstance(err, expected_err):
-                        cprint(f"[r]Unexpected Error[/]: [B][retry][/] {err} at {function}")
-                        raise err
-
-                    cprint(f"[r]Error[/]: [B][retry][/] {err} at {function}, trying again...")
+                    __handle_error(err, attempts)
                     sleep(delay_sec)
 
         return wrapper
@@ -332,11 +603,71 @@ def parse_user_arguments(usr_args: list[str]) -> Namespace:
                         directories/files it should mirror.")
     parser.add_argument("-T", "--timeout", type=int, default=defaults.timeout, help="Timeout span, in seconds, that\
                         will be used to throw an error on the FTP connection related code.")
+    parser.add_argument("-i", "--incremental", action="store_true", help="Keep a cache of the size and modify time\
+                        of every mirrored file in each target, and don't download again the files that still have the\
+                        same size and modify time on the server and are still in the target. Every directory is still\
+                        listed, so new files deep in a tree are never missed.")
+    parser.add_argument("-w", "--write-buffer", type=int, default=WRITE_BUFFER_BUDGET // 1024 // 1024, help="Memory\
+                        budget, in MB, shared by all the downloads to queue data for the disk writer thread, so a slow\
+                        target disk doesn't stall the network transfers. Use 0 to write directly from the transfers.")
+    parser.add_argument("-d", "--digest", type=str, choices=DIGEST_ALGORITHMS + ["none"], default="blake2b",
+                        help="Hash algorithm used to digest every file while it's transfered, the digests are saved\
+                        in a manifest on each target. When the server supports the HASH or the XCRC command, the\
+                        remote value is compared too and a mismatch is handled as a failed transfer.")
+    parser.add_argument("-z", "--compress", type=str, choices=MODE_Z_POLICIES, default="auto", help="Use the MODE Z\
+                        (deflate) transfer mode when the server supports it. With auto, it's only used for files with\
+                        text-like extensions or whose extension compressed well in the files already transfered, and\
+                        never for media and archives, where it would only cost CPU on the phone.")
+    parser.add_argument("-k", "--pack", type=int, default=0, help="Size, in KB, up to which the files are\
+                        appended to a few large pack files in each snapshot, with an index of their offsets, instead\
+                        of being written one by one. Saves a lot of file creations on trees with many small files,\
+                        like thumbnails and caches, and --restore reads them back. Use 0 to write every file normally.")
+    parser.add_argument("-R", "--restore", type=str, default=None, help="Push a local snapshot back to the FTP\
+                        server instead of pulling one: the path of a snapshot profile directory (the target plus the\
+                        profile name), or of its digest manifest, saved in it or archived in its .mkftp-manifests\
+                        directory, to upload only the files listed in it. Each file goes to the remote path it was\
+                        mirrored from, and files with the same size and modify time on the\
+                        server are skipped.")
+    parser.add_argument("-x", "--diff", type=str, nargs="+", default=None, help="Report the new, deleted and\
+                        modified files between two snapshots, grouped by data path, only from their digest manifests:\
+                        the path of a snapshot profile directory, to compare its last two snapshots, or the paths of\
+                        two manifests (old and new), archived in its .mkftp-manifests directory or not.")
+    parser.add_argument("-D", "--devices", type=str, default=None, help="Path of a JSON file with the credentials\
+                        of several devices, each one with the names of the profiles to snapshot (and optionally its\
+                        own Procs budget and SyncConfigFile). All the devices are mirrored at the same time, without\
+                        the menu, into a directory named after each device on every target.")
+    parser.add_argument("-e", "--engine", type=str, choices=ENGINES, default="threads", help="How the files are\
+                        transfered: threads uses a blocking FTP session on a thread for each file, asyncio drives many\
+                        more sessions at the same time from a single event loop, which hides the phone latency better\
+                        on trees with lots of small files.")
+    parser.add_argument("-S", "--segments", type=int, default=SEGMENTS, help=f"Number of byte ranges downloaded at\
+                        the same time, each one on its own FTP session, in stripes of\
+                        {SEGMENT_STRIPE_SIZE // 1024 // 1024} MB, for the files of at least\
+                        {SEGMENTED_MIN_SIZE // 1024 // 1024} MB, since a single data connection of the phone is usually\
+                        much slower than the Wi-Fi. Use 0 to download every file in a single transfer.")
+    parser.add_argument("-W", "--watch", type=str, nargs="+", default=None, help="Keep running and probing the host,\
+                        every time the phone shows up on the network an incremental snapshot of these profiles is made,\
+                        without the menu. Stop it with Ctrl+C.")
+    parser.add_argument("-c", "--cooldown", type=int, default=WATCH_COOLDOWN, help="Minutes to wait after a successful\
+                        snapshot of the --watch mode before probing the host again.")
+    parser.add_argument("-n", "--plan", action="store_true", help="Don't download anything, only walk the selected\
+                        profile with its exclude rules and report the number of files and bytes of each data path, the\
+                        largest directories, an estimated time based on the previous snapshots and whether each target\
+                        has enough free space.")
+    parser.add_argument("-r", "--retry-failed", type=str, default=None, help="Path of a failure manifest saved by a\
+                        previous run, only the files listed in it will be transfered again.")
+    parser.add_argument("--trace", type=str, default=os.getenv("SCRIPTS_TRACE"), help="Directory where the time\
+                        spent connecting, listing, retrieving and verifying is saved when the script exits, as a Chrome\
+                        trace (for chrome://tracing or Perfetto) and a summary of each phase. The SCRIPTS_TRACE\
+                        environment variable does the same.")
+    parser.add_argument("--profile", action="store_true", help="Also run cProfile and save its pstats dump in the\
+                        --trace directory.")
 
     return parser.parse_args()
 
 
 @retry(delay_sec=FTP_CONN_ERROR_DELAY)
+@traced("connect")
 def ftp_connect(host: str, port: int, username: str, password: str, timeout: int = 120) -> FTP:
     r"""
     Connects to an FTP server with the provided host, port, username, and password.
@@ -362,7 +693,7 @@ def ftp_connect(host: str, port: int, username: str, password: str, timeout: int
     the FTP object.
     """
 
-    print("Connecting to the ftp server...")
+    cprint("Connecting to the ftp server...")
 
     ftp: FTP = FTP()
 
@@ -445,153 +776,3096 @@ def is_ftp_dir(ftp_path: str, ftp: FTP) -> bool:
     return True
 
 
-@retry(delay_sec=MIRROR_ERROR_DELAY)
-def mirror_ftp_file(ftp_path: str, target: str, host: str, port: int, username: str, password: str,
-                    timeout: int) -> None:
+FTPEntry = tuple[str, bool, int, Optional[str]]  #name, is directory, size and modify time
+
+@traced("list")
+def list_ftp_dir(ftp: FTP, ftp_path: str) -> list[FTPEntry]:
     r"""
-    Mirrors a file from an FTP server to a local target.
+    Lists a directory on an FTP server with a single MLSD command, that already tells which entries are directories,
+    their sizes and modify times. Servers without MLSD fall back to NLST plus one is_ftp_dir check for each entry, and a
+    path that isn't a directory (or doesn't exist) has no entries.
 
+    :param ftp:
+        An FTP object representing the connection to the server.
     :param ftp_path:
-        The path of the file on the FTP server.
-    :param target:
-        The local target where the file will be mirrored.
-    :param host:
-        The host of the FTP server.
-    :param port:
-        The port of the FTP server.
-    :param username:
-        The username to connect to the FTP server.
-    :param password:
-        The password to connect to the FTP server.
-    :param timeout:
-        The timeout for the FTP connection.
+        The path of the directory on the FTP server.
 
-    If the ftp_path is a directory, it will be skipped and a warning will be logged. If the mirroring is successful, a
-    success message will be logged.
+    :return:
+        The list of the entries of the directory.
     """
 
-    cprint(f"Mirroing [c]{ftp_path}[/] to [c]{target}[/]")
+    try:
+        facts: list[tuple[str, dict[str, str]]] = list(ftp.mlsd(ftp_path))
 
-    with ftp_connect(host, port, username, password, timeout=timeout) as ftp:
+    except error_perm as _:
         if not is_ftp_dir(ftp_path, ftp):
-            with open(target, "wb") as target_file:
-                ftp.retrbinary(f"RETR {ftp_path}", target_file.write)
-        else:
-            cprint(f"[y]Warning[/]: Cannot mirror a directory, skiping {ftp_path}...")
+            return []
 
-    cprint(f"[g]Mirror Successfu[/]: [y]{ftp_path}[/] to [y]{target}[/]")
+        ftp.cwd(ftp_path)
 
+        return [(name, is_ftp_dir(f"{ftp_path}/{name}", ftp), 0, None) for name in ftp.nlst()]
 
-@retry(delay_sec=MIRROR_ERROR_DELAY)
-def mirror_ftp_files(ftp_path: str, target: str, exclude: list[str], executor: ThreadPoolExecutor, host: str, port: int,
-                     username: str, password: str, timeout: int) -> None:
+    entries: list[FTPEntry] = []
+
+    for name, fact in facts:
+        entry_type: str = fact.get("type", "file").lower()
+
+        if entry_type not in ["cdir", "pdir"] and name not in [".", ".."]:
+            entries.append((name, entry_type == "dir", int(fact.get("size", 0)), fact.get("modify")))
+
+    return entries
+
+
+FTP_FEATURES: dict[tuple[str, int], dict[str, str]] = {}
+FTP_FEATURES_LOCK: Lock = Lock()
+
+@traced("features")
+def get_ftp_features(ftp: FTP, host: str, port: int) -> dict[str, str]:
     r"""
-    Mirrors the files from an FTP server to a local target.
+    Gets the features that the server advertises with FEAT, asking it only once for each host and port.
 
-    :param ftp_path:
-        The path of the directory on the FTP server.
-    :param target:
-        The local target where the files will be mirrored.
-    :param exclude:
-        A list of FTP paths to exclude from the mirroring.
-    :param executor:
-        The ThreadPoolExecutor that will be used for concurrent file mirroring.
-    :param host:
-        The host of the FTP server.
-    :param port:
-        The port of the FTP server.
-    :param username:
-        The username to connect to the FTP server.
-    :param password:
-        The password to connect to the FTP server.
-    :param timeout:
-        The timeout for the FTP connection.
+    :param ftp:
+        An FTP object representing the connection to the server.
 
-    This function recursively mirrors the files. If the ftp_path is in the exclude list or is a directory, it will be
-    skipped. Files are mirrored concurrently using the provided executor.
+    :return:
+        A dictionary where each key is the name of a feature, in upper case, and the value is its parameters.
     """
 
-    cprint(f"[b]Logger[/]: Mirroring [b]{ftp_path}[/]...")
+    with FTP_FEATURES_LOCK:
+        if (host, port) in FTP_FEATURES:
+            return FTP_FEATURES[host, port]
 
-    if not os.path.exists(target):
-        os.makedirs(target)
-    
-    with ftp_connect(host, port, username, password, timeout=timeout) as ftp:
-        if is_ftp_dir(ftp_path, ftp):
-            ftp.cwd(ftp_path)
-
-        for file in ftp.nlst():
-            ftp_file_path: str = f"{ftp_path}/{file}"
-            target_file_path: str = os.path.join(target, file)
-            
-            if ftp_file_path in exclude:
-                continue
+    features: dict[str, str] = {}
 
-            if is_ftp_dir(ftp_file_path, ftp):
-                mirror_ftp_files(ftp_file_path, target_file_path, exclude, executor, host, port, username,
-                                 password, timeout)
-                continue
+    try:
+        for line in ftp.sendcmd("FEAT").splitlines()[1:-1]:
+            name, _, params = line.strip().partition(" ")
+            features[name.upper()] = params
 
-            executor.submit(mirror_ftp_file, ftp_file_path, target_file_path, host, port, username, password, timeout)
+    except (error_perm, error_temp) as _:
+        pass
 
+    with FTP_FEATURES_LOCK:
+        FTP_FEATURES[host, port] = features
 
-def main(usr_args: list[str]) -> None:
-    args: Namespace = parse_user_arguments(usr_args)
-    config: SyncConfig = {}
-    ftp_root: str = "/"
+    return features
 
-    with ftp_connect(args.host, args.port, args.username, args.password, timeout=args.timeout) as ftp:
-        config = get_json_config_content(ftp, args.sync_config_file)
-        ftp_root = ftp.pwd()
 
-    menu: dict[str, str] = {}
+def select_remote_check(features: dict[str, str], algorithm: Optional[str]) -> Optional[str]:
+    r"""
+    Chooses how a transfered file can be checked against the server: with HASH, when the server's selected algorithm
+    is the one of the local digest (no OPTS round trip needed), or with XCRC, that costs only a CRC-32 on the side.
 
-    for profile_name, profile in config.items():
-        menu[profile_name] = profile["Title"]
+    :return:
+        "HASH", "XCRC" or None when the server can't check the file.
+    """
 
-    profile_name: str
-    _, profile_name, _ = display_options_menu("ANDROID FTP BACKUP\n- select a backup profile", menu)
-    profile: BackupProfile = config[profile_name]
+    selected: list[str] = [name.rstrip("*").upper() for name in features.get("HASH", "").split(";") if
+                           name.endswith("*")]
 
-    clear()
-    logger("Normalizing the data path strings...", padding="both")
+    if algorithm in FTP_HASH_NAMES and FTP_HASH_NAMES[algorithm] in selected:
+        return "HASH"
 
-    for key, path in enumerate([data["Path"] for data in profile["Data"]]):
-        norm_path: str = path.replace("./", ftp_root)
-        norm_path = ("/" if norm_path[0] != "/" else "") + norm_path
-        profile["Data"][key]["Path"] = norm_path
+    if "XCRC" in features:
+        return "XCRC"
 
-        if norm_path != path:
-            cprint(f"Renamed [c]{path}[/] to [c]{norm_path}[/]")
+    return None
 
-    logger("Normalizing the exclude path strings...", padding="both")
 
-    for key, path in enumerate([data["Path"] for data in profile["Exclude"]]):
-        norm_path: str = path.replace("./", ftp_root)
-        norm_path = ("/" if norm_path[0] != "/" else "") + norm_path
-        profile["Exclude"][key]["Path"] = norm_path
+@traced("verify")
+def get_remote_checksum(ftp: FTP, ftp_path: str, command: str) -> Optional[str]:
+    r"""
+    Asks the server for the checksum of a whole file with the HASH or the XCRC command.
 
-        if norm_path != path:
-            cprint(f"Renamed [c]{path}[/] to [c]{norm_path}[/]")
+    :return:
+        The checksum as lower case hexadecimal, or None if the server refused to compute it (some servers refuse big
+        files or when they're busy).
+    """
 
-    exclude: list[str] = [item["Path"] for item in profile["Exclude"]]
+    try:
+        return parse_remote_checksum(command, ftp.sendcmd(f"{command} {ftp_path}"))
+    except (error_perm, error_temp) as _:
+        return None
 
-    logger("Everything is OK, starting the mirror process...", ptype="good", padding="both")
 
-    benchmark_start: float = time()
+def parse_remote_checksum(command: str, reply: str) -> str:
+    if command == "HASH":  #213 <algorithm> <range> <hex> <path>
+        return reply.split(" ", 4)[3].lower()
 
-    with ThreadPoolExecutor(max_workers=PROCS) as executor:
-        logger("Mirroring all files in parallel tasks...")
+    return f"{int(reply.split()[-1], 16):08x}"
 
-        for data in profile["Data"]:
-            for target in args.targets:
-                full_target: str = os.path.join(target, profile_name, data["Path"].lstrip("/"))
 
-                mirror_ftp_files(data["Path"], full_target, exclude, executor, args.host, args.port, args.username,
-                                 args.password, args.timeout)
+class ModeZPolicy:
+    r"""
+    Decides which files are transfered in MODE Z. Besides the extension lists, it learns how well each extension
+    compresses from a sample of the files transfered in MODE S, so after a few files of an unknown extension it knows
+    if compressing them is worth it.
+
+    :ivar policy:
+        One of MODE_Z_POLICIES.
+    :ivar samples:
+        Number of bytes sampled and the size they were compressed to, for each extension.
+    """
+
+    policy: str
+    samples: dict[str, tuple[int, int]]
+
+    def __init__(self, policy: str = "auto"):
+        self.policy = policy
+        self.samples = {}
+        self.__lock: Lock = Lock()
+
+    def use_mode_z(self, ftp_path: str, size: Optional[int], features: dict[str, str]) -> bool:
+        r"""
+        :param size:
+            Size of the file, if it's known. Small files aren't worth the extra MODE command round trip.
+        :param features:
+            Features of the server, as returned by get_ftp_features.
+        """
+
+        if self.policy == "never" or "Z" not in features.get("MODE", "").upper().split():
+            return False
+
+        if self.policy == "always":
+            return True
+
+        extension: str = os.path.splitext(ftp_path)[1].lower()
+
+        if extension in STORED_EXTENSIONS or (size is not None and size < MODE_Z_MIN_SIZE):
+            return False
+
+        if extension in MODE_Z_EXTENSIONS:
+            return True
+
+        with self.__lock:
+            sampled, compressed = self.samples.get(extension, (0, 0))
+
+        return sampled >= MODE_Z_SAMPLE_SIZE and compressed / sampled <= MODE_Z_MAX_RATIO
+
+    def needs_sample(self, ftp_path: str) -> bool:
+        extension: str = os.path.splitext(ftp_path)[1].lower()
+
+        if self.policy != "auto" or extension in STORED_EXTENSIONS or extension in MODE_Z_EXTENSIONS:
+            return False
+
+        with self.__lock:
+            return self.samples.get(extension, (0, 0))[0] < MODE_Z_SAMPLE_SIZE * 4
+
+    def sample(self, ftp_path: str, data: bytes) -> None:
+        r"""
+        Estimates how well the data of the file compresses, with the fastest deflate level.
+        """
+
+        extension: str = os.path.splitext(ftp_path)[1].lower()
+        compressed: int = len(zlib.compress(data, 1))
+
+        with self.__lock:
+            sampled, total = self.samples.get(extension, (0, 0))
+            self.samples[extension] = (sampled + len(data), total + compressed)
+
+
+MODE_Z: ModeZPolicy = ModeZPolicy()
+
+
+class FileCache:
+    r"""
+    Persistent per-file incremental cache, with the size and modify time of the files of each remote directory, keyed
+    by the directory path. A file is only downloaded again when its own size or modify time changed, or when the target
+    lost it, so a file added to or removed from a directory doesn't make the rest of it be downloaded again. It doesn't
+    save any listing round trips: every directory is still listed on every run, since the modify time of a directory
+    doesn't change when something deeper in its subtree does.
+
+    :ivar path:
+        Path of the JSON file where the cache is stored.
+    :ivar entries:
+        Cached files, by FTP directory path.
+    """
+
+    path: str
+    entries: dict[str, dict[str, Any]]
+
+    def __init__(self, path: str, entries: Optional[dict[str, dict[str, Any]]] = None):
+        self.path = path
+        self.entries = entries or {}
+
+    @staticmethod
+    def load(path: str) -> "FileCache":
+        r"""
+        Loads the cache stored in the path, without the entries older than FILE_CACHE_MAX_AGE.
+
+        :param path:
+            Path of the JSON file of the cache, it doesn't need to exist.
+
+        :return:
+            The loaded cache, empty if the file doesn't exist or is corrupted.
+        """
+
+        try:
+            with open(path, "r") as f:
+                entries: dict[str, dict[str, Any]] = load(f)
+
+        except (OSError, ValueError) as _:
+            return FileCache(path)
+
+        oldest: float = time() - FILE_CACHE_MAX_AGE
+
+        return FileCache(path, {ftp_path: entry for ftp_path, entry in entries.items() if entry["Listed"] >= oldest})
+
+    def save(self) -> None:
+        r"""
+        Saves the cache, keeping only the FILE_CACHE_MAX_ENTRIES most recently listed directories.
+        """
+
+        entries: list[tuple[str, dict[str, Any]]] = sorted(self.entries.items(), key=lambda item: item[1]["Listed"],
+                                                           reverse=True)[:FILE_CACHE_MAX_ENTRIES]
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with open(self.path, "w") as f:
+            dump(dict(entries), f, separators=(",", ":"))
+
+    def store(self, ftp_path: str, entries: list[FTPEntry]) -> None:
+        r"""
+        Stores the size and modify time of the files listed in the directory, the files listed without a modify time
+        (without MLSD) aren't stored since they can't be compared.
+        """
+
+        self.entries[ftp_path] = {"Listed": time(), "Files": {name: [size, modify] for name, is_dir, size, modify
+                                                              in entries if not is_dir and modify is not None}}
+
+    def get_cached_files(self, ftp_path: str) -> dict[str, tuple[int, str]]:
+        r"""
+        :return: The size and modify time of the files of the directory in the cache, keyed by their names.
+        """
+
+        entry: Optional[dict[str, Any]] = self.entries.get(ftp_path)
+
+        if entry is None:
+            return {}
+
+        return {name: (size, modify) for name, (size, modify) in entry.get("Files", {}).items()}
+
+    def discard_file(self, ftp_path: str) -> None:
+        r"""
+        Removes a file from the cache, so the next run downloads it again. Used for the files that failed to be
+        mirrored.
+        """
+
+        entry: Optional[dict[str, Any]] = self.entries.get(os.path.dirname(ftp_path))
+
+        if entry is not None:
+            entry.get("Files", {}).pop(os.path.basename(ftp_path), None)
+
+
+class BoundedThreadPoolExecutor(ThreadPoolExecutor):
+    r"""
+    ThreadPoolExecutor that limits how many submitted tasks can be waiting or running at the same time. When the limit
+    is reached, submit() blocks until a task finishes, so the memory used by the pending tasks stays constant no matter
+    how many files the walker finds.
+
+    :ivar max_in_flight:
+        Maximum number of tasks that can be queued or running at the same time.
+    """
+
+    max_in_flight: int
+
+    def __init__(self, max_workers: int, max_in_flight: int):
+        super().__init__(max_workers=max_workers)
+
+        self.max_in_flight = max_in_flight
+        self.__slots: BoundedSemaphore = BoundedSemaphore(max_in_flight)
+
+    def submit(self, fn: Callable, /, *args, **key_args) -> Future:
+        self.__slots.acquire()
+
+        try:
+            future: Future = super().submit(copy_context().run, fn, *args, **key_args)  #keeps the LOG_LABEL
+
+        except BaseException as err:
+            self.__slots.release()
+            raise err
+
+        future.add_done_callback(lambda _: self.__slots.release())  #the future isn't referenced anymore after that
+
+        return future
+
+
+class FTPSessionPool:
+    r"""
+    Keeps one logged in FTP session for each thread that uses it, so a worker transfers file after file on the same
+    control connection instead of paying for the connection and the login round trips on every file. A session that
+    raised an error is closed and replaced on the next use, since its state is unknown.
+
+    :ivar host:
+        The host of the FTP server.
+    :ivar port:
+        The port of the FTP server.
+    """
+
+    host: str
+    port: int
+
+    def __init__(self, host: str, port: int, username: str, password: str, timeout: int):
+        self.host = host
+        self.port = port
+        self.__credentials: tuple[str, str] = (username, password)
+        self.__timeout: int = timeout
+        self.__local: local = local()
+        self.__sessions: list[FTP] = []
+        self.__lock: Lock = Lock()
+
+    @contextmanager
+    def session(self) -> Iterator[FTP]:
+        ftp: Optional[FTP] = getattr(self.__local, "ftp", None)
+
+        if ftp is None:
+            ftp = ftp_connect(self.host, self.port, *self.__credentials, timeout=self.__timeout)
+            self.__local.ftp = ftp
+
+            with self.__lock:
+                self.__sessions.append(ftp)
+
+        try:
+            yield ftp
+
+        except BaseException as err:
+            self.__local.ftp = None
+            ftp.close()
+            raise err
+
+    def close(self) -> None:
+        with self.__lock:
+            sessions: list[FTP] = self.__sessions
+            self.__sessions = []
+
+        for ftp in sessions:
+            try:
+                ftp.quit()
+            except Exception as _:
+                ftp.close()
+
+
+class SegmentedDownloads:
+    r"""
+    Decides which files are downloaded in segments by mirror_ftp_file_segmented and keeps the sessions they use. The
+    segments of every file go to the same small thread pool of each server, whose threads keep their sessions in an
+    FTPSessionPool, so a snapshot with many large files doesn't log in again for every segment. Both are closed when
+    the script exits.
+
+    :ivar segments:
+        Number of segments of each file downloaded at the same time, 0 or 1 disables the segmented downloads.
+    :ivar min_size:
+        Size from which a file is downloaded in segments.
+    """
+
+    segments: int
+    min_size: int
+
+    def __init__(self, segments: int = SEGMENTS, min_size: int = SEGMENTED_MIN_SIZE):
+        self.segments = segments
+        self.min_size = min_size
+        self.__servers: dict[tuple[str, int, str], tuple[FTPSessionPool, ThreadPoolExecutor]] = {}
+        self.__lock: Lock = Lock()
+
+    def applies(self, size: Optional[int]) -> bool:
+        return self.segments > 1 and size is not None and size >= self.min_size
+
+    def sessions(self, host: str, port: int, username: str, password: str,
+                 timeout: int) -> tuple[FTPSessionPool, ThreadPoolExecutor]:
+        r"""
+        :return:
+            The session pool and the thread pool of the segments of a server, created on the first use.
+        """
+
+        with self.__lock:
+            if (host, port, username) not in self.__servers:
+                if not self.__servers:
+                    import atexit
+
+                    atexit.register(self.close)
+
+                self.__servers[host, port, username] = (FTPSessionPool(host, port, username, password, timeout),
+                                                        ThreadPoolExecutor(max_workers=self.segments))
+
+            return self.__servers[host, port, username]
+
+    def close(self) -> None:
+        with self.__lock:
+            servers: list[tuple[FTPSessionPool, ThreadPoolExecutor]] = list(self.__servers.values())
+            self.__servers = {}
+
+        for pool, segment_executor in servers:
+            segment_executor.shutdown()
+            pool.close()
+
+
+SEGMENTED: SegmentedDownloads = SegmentedDownloads()
+
+
+class DiskWriter:
+    r"""
+    Separate stage that writes the downloaded data to the disk, so a slow target disk doesn't stall the FTP data
+    connections. The chunks of each file are aggregated in large buffers that are queued to a writer thread. All the
+    files share the same memory budget: when the queued buffers reach it, the writes of the FTP callbacks block until
+    the disk catches up.
+
+    :ivar budget:
+        Maximum number of bytes queued to be written, shared by all the files.
+    :ivar buffer_size:
+        Size of the aggregated buffers sent to the writer thread.
+    :ivar bytes_written:
+        Number of bytes written so far.
+    :ivar busy_seconds:
+        Time the writer thread spent writing, used to measure the disk throughput apart from the network.
+    """
+
+    budget: int
+    buffer_size: int
+    bytes_written: int
+    busy_seconds: float
+
+    class File:
+        r"""
+        File opened by the DiskWriter, with the same write() and close() of a regular file object.
+        """
+
+        def __init__(self, writer: "DiskWriter", target: str, mode: str, offset: int, preallocate: Optional[int]):
+            self.writer: DiskWriter = writer
+            self.buffer: bytearray = bytearray()
+            self.error: Optional[BaseException] = None
+            self.closed: Event = Event()
+            self.preallocate: Optional[int] = preallocate
+            self.handle: Any = open(target, mode)
+            self.written: int = 0
+
+            self.handle.seek(offset)
+
+            if preallocate is not None:
+                self.handle.truncate(offset + preallocate)
+
+        def write(self, chunk: bytes) -> None:
+            if self.error is not None:
+                raise self.error
+
+            self.buffer += chunk
+
+            if len(self.buffer) >= self.writer.buffer_size:
+                self.writer.enqueue(self, bytes(self.buffer))
+                self.buffer.clear()
+
+        def __enter__(self) -> "DiskWriter.File":
+            return self
+
+        def __exit__(self, *_) -> None:
+            self.close()
+
+        def close(self) -> None:
+            if self.buffer:
+                self.writer.enqueue(self, bytes(self.buffer))
+                self.buffer.clear()
+
+            self.writer.enqueue(self, None)
+            self.closed.wait()
+
+            if self.error is not None:
+                raise self.error
+
+    def __init__(self, budget: int, buffer_size: int = 1024 * 1024):
+        self.budget = budget
+        self.buffer_size = min(buffer_size, budget)
+        self.bytes_written = 0
+        self.busy_seconds = 0
+        self.__queued: int = 0
+        self.__budget_available: Condition = Condition()
+        self.__jobs: Queue = Queue()
+        self.__thread: Thread = Thread(target=self.__write_jobs, daemon=True)
+
+        self.__thread.start()
+
+    def __enter__(self) -> "DiskWriter":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        r"""
+        Waits for the queued buffers to be written and stops the writer thread.
+        """
+
+        self.__jobs.put(None)
+        self.__thread.join()
+
+    def open(self, target: str, mode: str = "wb", offset: int = 0, preallocate: Optional[int] = None) -> File:
+        r"""
+        Opens a file to be written by the writer thread.
+
+        :param target:
+            Path of the local file.
+        :param mode:
+            Mode used to open the file, "r+b" to write a range of an existing file.
+        :param offset:
+            Position of the file where the writes start.
+        :param preallocate:
+            Optional number of bytes that will be written, the file is extended to that size before any write, and
+            truncated back on close if less data was written.
+        """
+
+        return DiskWriter.File(self, target, mode, offset, preallocate)
+
+    def enqueue(self, file: File, data: Optional[bytes]) -> None:
+        size: int = len(data) if data is not None else 0
+
+        with self.__budget_available:  #a single buffer larger than the budget still passes when nothing is queued
+            self.__budget_available.wait_for(lambda: self.__queued == 0 or self.__queued + size <= self.budget)
+            self.__queued += size
+
+        self.__jobs.put((file, data))
+
+    def throughput(self) -> float:
+        r"""
+        :return: The disk write throughput, in bytes per second of the time the writer thread was busy.
+        """
+
+        return self.bytes_written / self.busy_seconds if self.busy_seconds else 0
+
+    def __write_jobs(self) -> None:
+        while (job := self.__jobs.get()) is not None:
+            file, data = job
+            start: float = perf_counter()
+
+            try:
+                if data is None:
+                    if file.error is None and file.preallocate is not None and file.written != file.preallocate:
+                        file.handle.truncate(file.handle.tell())
+
+                    file.handle.close()
+                    file.closed.set()
+
+                elif file.error is None:
+                    file.handle.write(data)
+                    file.written += len(data)
+                    self.bytes_written += len(data)
+
+            except Exception as err:
+                file.error = err
+
+                if data is None:
+                    file.closed.set()
+
+            self.busy_seconds += perf_counter() - start
+
+            with self.__budget_available:
+                self.__queued -= len(data) if data is not None else 0
+                self.__budget_available.notify_all()
+
+
+class PreallocatedFile:
+    r"""
+    Regular file written directly by the transfer, without a DiskWriter, that is extended to its final size before the
+    first write and truncated back on close if less data was written, like a DiskWriter.File.
+    """
+
+    def __init__(self, target: str, mode: str, offset: int, preallocate: int):
+        self.preallocate: int = preallocate
+        self.handle: Any = open(target, mode)
+        self.written: int = 0
+
+        self.handle.seek(offset)
+        self.handle.truncate(offset + preallocate)
+
+    def write(self, chunk: bytes) -> None:
+        self.handle.write(chunk)
+        self.written += len(chunk)
+
+    def close(self) -> None:
+        if self.written != self.preallocate:
+            self.handle.truncate(self.handle.tell())
+
+        self.handle.close()
+
+    def __enter__(self) -> "PreallocatedFile":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def open_target(target: str, writer: Optional[DiskWriter] = None, mode: str = "wb", offset: int = 0,
+                preallocate: Optional[int] = None) -> Any:
+    r"""
+    Opens a local file to be written, through the DiskWriter when one is given, or as a regular file otherwise.
+
+    :param preallocate:
+        Optional number of bytes that will be written, the file is extended to that size before any write, and
+        truncated back on close if less data was written, with or without a DiskWriter.
+
+    :return:
+        A file object that supports write(), close() and the with statement.
+    """
+
+    if writer is not None:
+        return writer.open(target, mode, offset, preallocate)
+
+    if preallocate is not None:
+        return PreallocatedFile(target, mode, offset, preallocate)
+
+    target_file: Any = open(target, mode)
+    target_file.seek(offset)
+
+    return target_file
+
+
+@dataclass
+class MirrorOutcome:
+    r"""
+    Outcome of the mirroring of a single file, updated by mirror_ftp_file on every attempt.
+    """
+
+    ftp_path: str
+    target: str
+    size: Optional[int] = None
+    attempts: int = 0
+    bytes_received: int = 0
+    error: Optional[str] = None
+    message: Optional[str] = None
+    digest_algorithm: Optional[str] = None
+    digest: Optional[str] = None
+    remote_check: Optional[str] = None
+    modify: Optional[str] = None  #the MLSD modify fact of the remote file, given to the target once it's mirrored
+
+
+class FailureManifest:
+    r"""
+    Collects the outcome of every mirrored file and keeps only the failed ones, so it can be saved as a JSON manifest
+    and used later to transfer only the files that failed.
+
+    :ivar failures:
+        Outcomes of the files that could not be mirrored.
+    :ivar succeeded:
+        Number of files that were mirrored successfully.
+    :ivar bytes_received:
+        Number of bytes of the files that were mirrored successfully.
+    """
+
+    failures: list[MirrorOutcome]
+    succeeded: int
+    bytes_received: int
+
+    def __init__(self):
+        self.failures = []
+        self.succeeded = 0
+        self.bytes_received = 0
+        self.__lock: Lock = Lock()
+
+    def track(self, future: Future, outcome: MirrorOutcome) -> None:
+        r"""
+        Records the outcome of the future when it's done, a cancelled future counts as a failure.
+
+        :param future:
+            The future of a mirror_ftp_file task.
+        :param outcome:
+            The outcome object that was given to that mirror_ftp_file call.
+        """
+
+        def __record(done: Future) -> None:
+            err: Optional[BaseException] = None if done.cancelled() else done.exception()
+
+            if done.cancelled():
+                outcome.error = "CancelledError"
+                outcome.message = "Cancelled before it was mirrored"
+
+            elif err is not None:
+                outcome.error = type(err).__name__
+                outcome.message = str(err)
+
+            with self.__lock:
+                if outcome.error is None:
+                    self.succeeded += 1
+                    self.bytes_received += outcome.bytes_received
+                else:
+                    self.failures.append(outcome)
+
+        future.add_done_callback(__record)
+
+    def save(self, path: str, profile_name: str) -> None:
+        r"""
+        Saves the failed outcomes as a JSON manifest, or removes an old manifest if nothing failed.
+
+        :param path:
+            Path of the manifest file.
+        :param profile_name:
+            Name of the backup profile that was mirrored.
+        """
+
+        if not self.failures:
+            if os.path.exists(path):
+                os.remove(path)
+
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "w") as f:
+            dump({
+                "Profile": profile_name,
+                "Created": strftime("%Y-%m-%dT%H:%M:%S"),
+                "Succeeded": self.succeeded,
+                "Failures": [{"Path": outcome.ftp_path, "Target": outcome.target, "Size": outcome.size,
+                              "Modify": outcome.modify, "Error": outcome.error,
+                              "Message": outcome.message, "Attempts": outcome.attempts,
+                              "BytesReceived": outcome.bytes_received} for outcome in self.failures],
+            }, f, indent=2)
+
+    @staticmethod
+    def load(path: str) -> tuple[str, list[MirrorOutcome]]:
+        r"""
+        Loads a manifest saved by FailureManifest.save.
+
+        :param path:
+            Path of the manifest file.
+
+        :return:
+            The name of the profile and the list of the failed files, with fresh outcomes to be retried.
+        """
+
+        with open(path, "r") as f:
+            manifest: dict[str, Any] = load(f)
+
+        return manifest["Profile"], [MirrorOutcome(failure["Path"], failure["Target"], failure.get("Size"),
+                                                   modify=failure.get("Modify"))
+                                     for failure in manifest["Failures"]]
+
+
+class DigestManifest:
+    r"""
+    Collects the digests computed while the files of a snapshot are transfered, so the snapshot can be checked later
+    without reading it back twice or asking the server again. It's saved in the snapshot root as a text file sorted by
+    path, with a "<digest>\t<size>\t<path>" line for each file, where the path is relative to the root and the digest
+    is prefixed by its algorithm, like "blake2b:0a1b...". Files downloaded in segments have the same digest, taken from
+    the assembled file.
+
+    Entries of files that weren't transfered this time (skipped by the file cache, or by a retry) are kept from the
+    previous manifest as long as the file still exists with the same size, as a regular file or in the packs. When the
+    manifest is built from a walk of the server, only the files listed in that walk are kept, so the files deleted on
+    the phone leave the manifest even though the mirror never deletes them from the target.
+
+    :ivar root:
+        Local directory of the snapshot, the manifest is saved inside it.
+    :ivar algorithm:
+        Name of the hashlib algorithm used for the digests.
+    :ivar entries:
+        Digest and size of each file, keyed by its path relative to the root.
+    :ivar verified:
+        Number of files whose checksum was also compared with the server's.
+    :ivar packs:
+        Optional PackStore of the snapshot, where the small files may be stored.
+    :ivar listed:
+        Paths of the files listed on the server in this run, relative to the root, or None when the files to transfer
+        didn't come from a walk of the server (a retry).
+    """
+
+    root: str
+    algorithm: str
+    entries: dict[str, tuple[str, int]]
+    verified: int
+    packs: Optional["PackStore"]
+    listed: Optional[set[str]]
+
+    def __init__(self, root: str, algorithm: str, packs: Optional["PackStore"] = None, from_listing: bool = False):
+        self.root = root
+        self.algorithm = algorithm
+        self.entries = {}
+        self.verified = 0
+        self.packs = packs
+        self.listed = set() if from_listing else None
+        self.__lock: Lock = Lock()
+
+    def get_path(self, target: str) -> Optional[str]:
+        r"""
+        :return: The manifest path of a local target, None if it's outside of the root.
+        """
+
+        try:
+            path: str = os.path.relpath(target, self.root)
+        except ValueError as _:  #on another drive
+            return None
+
+        return path.replace(os.sep, "/") if not path.startswith("..") else None
+
+    def list_file(self, target: str) -> None:
+        r"""
+        Records that the file of a local target was listed on the server, transfered or not.
+        """
+
+        path: Optional[str] = self.get_path(target)
+
+        if self.listed is not None and path is not None:
+            self.listed.add(path)
+
+    def track(self, future: Future, outcome: MirrorOutcome) -> None:
+        r"""
+        Records the digest of the outcome when the future succeeds. Outcomes outside of the root are ignored.
+        """
+
+        path: Optional[str] = self.get_path(outcome.target)
+
+        if path is None:
+            return
+
+        def __record(done: Future) -> None:
+            if done.cancelled():  #exception() would raise the CancelledError in the callback
+                return
+
+            if done.exception() is None and outcome.digest is not None:
+                with self.__lock:
+                    self.entries[path] = (outcome.digest, outcome.bytes_received)
+                    self.verified += outcome.remote_check is not None
+
+        future.add_done_callback(__record)
+
+    def save(self) -> None:
+        path: str = os.path.join(self.root, DIGEST_MANIFEST_NAME)
+        entries: dict[str, tuple[str, int]] = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    digest, size, file = line.rstrip("\n").split("\t", 2)
+                    packed: Optional[tuple[int, int, int, float]] = self.packs and self.packs.entries.get(file)
+
+                    if self.listed is not None and file not in self.listed:  #deleted on the server
+                        continue
+
+                    if packed and packed[2] == int(size) or os.path.isfile(os.path.join(self.root, file))\
+                       and os.path.getsize(os.path.join(self.root, file)) == int(size):
+                        entries[file] = (digest, int(size))
+
+        entries.update(self.entries)
+        os.makedirs(self.root, exist_ok=True)
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(f"{digest}\t{size}\t{file}\n" for file, (digest, size) in sorted(entries.items()))
+
+
+class PackStore:
+    r"""
+    Stores the small files of a snapshot appended to a few large pack files, instead of creating a file for each one,
+    so a tree with lots of thumbnails and caches costs a handful of writes to the target disk, and reading the index is
+    enough to scan the snapshot later. The packs are saved in the PACK_DIR_NAME directory of the snapshot root, as
+    "pack-<number>.bin" files of up to PACK_SIZE bytes, with a text index sorted by path, where each line is
+    "<pack>\t<offset>\t<size>\t<modify time>\t<path>" and the path is relative to the root.
+
+    A file is only appended when its transfer succeeds, a failed attempt never reaches the packs. Files mirrored again
+    are appended again, and the packs left mostly with stale data are rewritten when the index is saved. A file is
+    either packed or written normally: packing it removes the regular file and writing it normally drops it from the
+    index.
+
+    :ivar root:
+        Local directory of the snapshot.
+    :ivar max_file_size:
+        Files up to this size are packed, 0 to only read the packs of a previous snapshot.
+    :ivar pack_size:
+        Size after which a new pack file is started.
+    :ivar entries:
+        The pack number, offset, size and modify time of each packed file, keyed by its path relative to the root.
+    """
+
+    root: str
+    max_file_size: int
+    pack_size: int
+    entries: dict[str, tuple[int, int, int, float]]
+
+    class File:
+        r"""
+        File opened by the PackStore, the data is kept in memory and appended to the packs when the with block exits
+        without an error.
+        """
+
+        def __init__(self, packs: "PackStore", target: str, modify: Optional[float] = None):
+            self.packs: PackStore = packs
+            self.target: str = target
+            self.modify: Optional[float] = modify
+            self.buffer: bytearray = bytearray()
+
+        def write(self, chunk: bytes) -> None:
+            self.buffer += chunk
+
+        def __enter__(self) -> "PackStore.File":
+            return self
+
+        def __exit__(self, err_type: Optional[type], *_) -> None:
+            if err_type is None:
+                self.packs.append(self.target, bytes(self.buffer), self.modify)
+
+    def __init__(self, root: str, max_file_size: int = 0, pack_size: int = PACK_SIZE):
+        self.root = root
+        self.max_file_size = max_file_size
+        self.pack_size = pack_size
+        self.entries = {}
+        self.__lock: Lock = Lock()
+        self.__pack: Optional[int] = None
+        self.__handle: Optional[Any] = None
+        self.__offset: int = 0
+
+        if os.path.exists(os.path.join(self.root, PACK_DIR_NAME, PACK_INDEX_NAME)):
+            with open(os.path.join(self.root, PACK_DIR_NAME, PACK_INDEX_NAME), "r", encoding="utf-8") as f:
+                for line in f:
+                    pack, offset, size, modify, path = line.rstrip("\n").split("\t", 4)
+                    self.entries[path] = (int(pack), int(offset), int(size), float(modify))
+
+    def get_path(self, target: str) -> Optional[str]:
+        r"""
+        :return: The index key of a local target, None if it's outside of the root.
+        """
+
+        try:
+            path: str = os.path.relpath(target, self.root)
+        except ValueError as _:  #on another drive
+            return None
+
+        return path.replace(os.sep, "/") if not path.startswith("..") else None
+
+    def get_pack_path(self, pack: int) -> str:
+        return os.path.join(self.root, PACK_DIR_NAME, f"pack-{pack:05}.bin")
+
+    def accepts(self, target: str, size: Optional[int]) -> bool:
+        r"""
+        :return: Whether a file of that size (None when the listing didn't tell it) should be packed.
+        """
+
+        return size is not None and size <= self.max_file_size and self.get_path(target) is not None
+
+    def open(self, target: str, modify: Optional[float] = None) -> File:
+        return PackStore.File(self, target, modify)
+
+    def get(self, target: str) -> Optional[tuple[int, int, int, float]]:
+        path: Optional[str] = self.get_path(target)
+
+        return self.entries.get(path) if path is not None else None
+
+    def read(self, target: str) -> bytes:
+        r"""
+        Reads a packed file back.
+
+        :raises KeyError:
+            If the target isn't packed.
+        """
+
+        pack, offset, size, _ = self.entries[self.get_path(target)]
+
+        with self.__lock:
+            if self.__handle is not None and pack == self.__pack:
+                self.__handle.flush()
+
+        with open(self.get_pack_path(pack), "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def append(self, target: str, data: bytes, modify: Optional[float] = None) -> None:
+        r"""
+        Appends the data of a file to the current pack and records it in the index, replacing an older entry or a
+        regular file of the same target.
+
+        :param modify:
+            The modify time of the file on the server, the time it's packed when it isn't known.
+        """
+
+        path: str = self.get_path(target)
+
+        with self.__lock:
+            self.__append(path, data, time() if modify is None else modify)
+
+        try:
+            os.remove(target)
+        except FileNotFoundError as _:
+            pass
+
+    def discard(self, target: str) -> None:
+        r"""
+        Drops a target from the index, after it was written as a regular file.
+        """
+
+        path: Optional[str] = self.get_path(target)
+
+        if path is not None and self.entries:
+            with self.__lock:
+                self.entries.pop(path, None)
+
+    def save(self) -> None:
+        r"""
+        Closes the current pack, rewrites the live files of the packs that are mostly stale into new packs, saves the
+        index and only then removes the old packs, so an interrupted save still leaves a consistent snapshot.
+        """
+
+        pack_dir: str = os.path.join(self.root, PACK_DIR_NAME)
+
+        if not os.path.isdir(pack_dir):
+            return
+
+        with self.__lock:
+            if self.__handle is not None:
+                self.__handle.close()
+                self.__handle = None
+
+            live: dict[int, int] = {}
+
+            for pack, _, size, _ in self.entries.values():
+                live[pack] = live.get(pack, 0) + size
+
+            packs: list[int] = [int(name[5:-4]) for name in os.listdir(pack_dir) if PACK_NAME_PATTERN.match(name)]
+            sparse: set[int] = {pack for pack in packs
+                                if live.get(pack, 0) * 2 < os.path.getsize(self.get_pack_path(pack))}
+            self.__pack = max(packs, default=0) + 1  #the live files are never rewritten into a pack that's removed
+
+            for path, (pack, offset, size, modify) in sorted(self.entries.items(), key=lambda item: item[1][:2]):
+                if pack in sparse:
+                    with open(self.get_pack_path(pack), "rb") as f:
+                        f.seek(offset)
+                        self.__append(path, f.read(size), modify)
+
+            if self.__handle is not None:
+                self.__handle.close()
+                self.__handle = None
+
+            self.__pack = None
+
+            with open(os.path.join(pack_dir, f"{PACK_INDEX_NAME}.tmp"), "w", encoding="utf-8") as f:
+                f.writelines(f"{pack}\t{offset}\t{size}\t{modify}\t{path}\n"
+                             for path, (pack, offset, size, modify) in sorted(self.entries.items()))
+
+            os.replace(os.path.join(pack_dir, f"{PACK_INDEX_NAME}.tmp"), os.path.join(pack_dir, PACK_INDEX_NAME))
+
+            for pack in sparse:
+                os.remove(self.get_pack_path(pack))
+
+    def __append(self, path: str, data: bytes, modify: float) -> None:
+        if self.__handle is not None and self.__offset and self.__offset + len(data) > self.pack_size:
+            self.__handle.close()
+            self.__handle = None
+            self.__pack += 1
+
+        if self.__handle is None:
+            if self.__pack is None:  #continues the last pack of the previous snapshot
+                pack_dir: str = os.path.join(self.root, PACK_DIR_NAME)
+                os.makedirs(pack_dir, exist_ok=True)
+                self.__pack = max([int(name[5:-4]) for name in os.listdir(pack_dir)
+                                   if PACK_NAME_PATTERN.match(name)], default=1)
+
+            while os.path.exists(self.get_pack_path(self.__pack))\
+                  and os.path.getsize(self.get_pack_path(self.__pack)) >= self.pack_size:
+                self.__pack += 1
+
+            self.__handle = open(self.get_pack_path(self.__pack), "ab")
+            self.__offset = self.__handle.tell()
+
+        self.__handle.write(data)
+        self.entries[path] = (self.__pack, self.__offset, len(data), modify)
+        self.__offset += len(data)
+
+
+class FileReceiver:
+    r"""
+    Handles the chunks of a file while it's received: inflates them when the transfer is in MODE Z, writes them to the
+    target, digests them and keeps the CRC-32 for XCRC and the compressibility sample for MODE_Z, so every transfer
+    engine handles the data in the same way.
+
+    :ivar ftp_path:
+        The path of the file on the FTP server.
+    :ivar algorithm:
+        The hashlib algorithm of the digest, if any.
+    :ivar remote_check:
+        The command ("HASH" or "XCRC") that should be used to check the file with the server, if any.
+    :ivar mode_z:
+        Whether the file should be transfered in MODE Z.
+    """
+
+    ftp_path: str
+    algorithm: Optional[str]
+    remote_check: Optional[str]
+    mode_z: bool
+
+    def __init__(self, ftp_path: str, target_file: Any, features: dict[str, str],
+                 outcome: Optional[MirrorOutcome] = None, mode_z: Optional[bool] = None):
+        r"""
+        :param target_file:
+            The file object returned by open_target, or None when the data is already on the disk and is only digested,
+            like the files assembled by mirror_ftp_file_segmented.
+        :param features:
+            Features of the server, as returned by get_ftp_features.
+        :param outcome:
+            Optional outcome object, where the bytes received and the digest are recorded.
+        :param mode_z:
+            Whether the data is in MODE Z, by default MODE_Z decides it.
+        """
+
+        self.ftp_path = ftp_path
+        self.algorithm = outcome and outcome.digest_algorithm
+        self.remote_check = self.algorithm and select_remote_check(features, self.algorithm)
+        self.mode_z = MODE_Z.use_mode_z(ftp_path, outcome and outcome.size, features) if mode_z is None else mode_z
+
+        self.__target_file: Any = target_file
+        self.__outcome: Optional[MirrorOutcome] = outcome
+        self.__hasher: Optional[Any] = None
+
+        if self.algorithm:
+            import hashlib  #only when a file is digested, it loads the OpenSSL bindings
+
+            self.__hasher = hashlib.new(self.algorithm)
+        self.__decompressor: Optional[Any] = zlib.decompressobj() if self.mode_z else None
+        self.__sample: Optional[bytearray] = bytearray() if not self.mode_z and "MODE" in features\
+                                             and MODE_Z.needs_sample(ftp_path) else None
+        self.__crc: int = 0
+
+    def write(self, chunk: bytes) -> None:
+        if self.__decompressor is not None:
+            chunk = self.__decompressor.decompress(chunk)
+
+        if self.__target_file is not None:
+            self.__target_file.write(chunk)
+
+        if self.__hasher is not None:
+            self.__hasher.update(chunk)
+
+        if self.remote_check == "XCRC":
+            self.__crc = zlib.crc32(chunk, self.__crc)
+
+        if self.__outcome is not None:
+            self.__outcome.bytes_received += len(chunk)
+
+        if self.__sample is not None and len(self.__sample) < MODE_Z_SAMPLE_SIZE:
+            self.__sample.extend(chunk[:MODE_Z_SAMPLE_SIZE - len(self.__sample)])
+
+    def finish(self) -> None:
+        r"""
+        Handles the end of the transfer, must be called before the target file is closed.
+
+        :raises EOFError:
+            If a MODE Z stream ended before its end marker.
+        """
+
+        if self.__decompressor is not None:
+            decompressor: Any = self.__decompressor
+            self.__decompressor = None
+
+            self.write(decompressor.flush())
+
+            if not decompressor.eof:
+                raise EOFError(f"Compressed stream of {self.ftp_path} ended before its end marker")
+
+        if self.__sample:
+            MODE_Z.sample(self.ftp_path, bytes(self.__sample))
+
+        if self.__hasher is not None:
+            self.__outcome.digest = f"{self.algorithm}:{self.__hasher.hexdigest()}"
+
+    def verify(self, remote: Optional[str]) -> None:
+        r"""
+        Compares the checksum given by the server, with the remote_check command, with the received data.
+
+        :param remote:
+            The checksum returned by get_remote_checksum, None when the server refused to compute it.
+
+        :raises ValueError:
+            If the checksums don't match.
+        """
+
+        local: str = self.__hasher.hexdigest() if self.remote_check == "HASH" else f"{self.__crc:08x}"
+
+        if remote is not None and remote != local:
+            raise ValueError(f"{self.remote_check} of {self.ftp_path} is {remote}, but the transfered data is {local}")
+
+        self.__outcome.remote_check = remote and self.remote_check
+
+
+@retry(delay_sec=MIRROR_ERROR_DELAY, max_attempts=MIRROR_MAX_ATTEMPTS)
+@traced("retrieve")
+def mirror_ftp_file(ftp_path: str, target: str, host: str, port: int, username: str, password: str,
+                    timeout: int, outcome: Optional[MirrorOutcome] = None, writer: Optional[DiskWriter] = None,
+                    packs: Optional[PackStore] = None) -> None:
+    r"""
+    Mirrors a file from an FTP server to a local target.
+
+    :param ftp_path:
+        The path of the file on the FTP server.
+    :param target:
+        The local target where the file will be mirrored.
+    :param host:
+        The host of the FTP server.
+    :param port:
+        The port of the FTP server.
+    :param username:
+        The username to connect to the FTP server.
+    :param password:
+        The password to connect to the FTP server.
+    :param timeout:
+        The timeout for the FTP connection.
+    :param outcome:
+        Optional outcome object where the number of attempts and the bytes received are recorded. When it knows the
+        size of the file and SEGMENTED applies to it, the file is downloaded in parallel segments by
+        mirror_ftp_file_segmented.
+    :param writer:
+        Optional DiskWriter that will write the file, so the network transfer doesn't wait for the disk.
+    :param packs:
+        Optional PackStore of the snapshot, the file is appended to it when the outcome's size is small enough.
+
+    When the outcome has a digest_algorithm, the chunks are hashed as they arrive and the digest is saved in the
+    outcome, then compared with the server's HASH or XCRC value when it supports one of them.
+
+    Files chosen by MODE_Z are transfered in MODE Z and inflated as they arrive, everything else (the digest, the
+    bytes received) is about the inflated data. Segmented downloads always use MODE S, are digested in order as their
+    stripes arrive, and are checked with the server once the file is assembled.
+
+    If the ftp_path is a directory, it will be skipped and a warning will be logged. If the mirroring is successful, a
+    success message will be logged.
+
+    :raises ValueError:
+        If the server's checksum doesn't match the transfered data.
+    """
+
+    cprint(f"Mirroing [c]{ftp_path}[/] to [c]{target}[/]")
+
+    if outcome is not None:
+        outcome.attempts += 1
+        outcome.bytes_received = 0
+        outcome.digest = outcome.remote_check = None
+
+    if outcome is not None and SEGMENTED.applies(outcome.size):
+        mirror_ftp_file_segmented(ftp_path, target, outcome, host, port, username, password, timeout, writer, packs)
+
+        cprint(f"[g]Mirror Successfu[/]: [y]{ftp_path}[/] to [y]{target}[/] in {SEGMENTED.segments} segments")
+        return
+
+    mode_z: bool = False
+
+    with ftp_connect(host, port, username, password, timeout=timeout) as ftp:
+        if not is_ftp_dir(ftp_path, ftp):
+            with open_mirror_target(target, outcome, writer, packs) as target_file:
+                receiver: FileReceiver = FileReceiver(ftp_path, target_file, get_ftp_features(ftp, host, port),
+                                                      outcome)
+                mode_z = receiver.mode_z
+
+                if mode_z:
+                    ftp.voidcmd("MODE Z")
+
+                ftp.retrbinary(f"RETR {ftp_path}", receiver.write)
+                receiver.finish()
+
+                if receiver.remote_check is not None:  #before the file is packed, a mismatch never reaches the packs
+                    receiver.verify(get_remote_checksum(ftp, ftp_path, receiver.remote_check))
+        else:
+            cprint(f"[y]Warning[/]: Cannot mirror a directory, skiping {ftp_path}...")
+
+    cprint(f"[g]Mirror Successfu[/]: [y]{ftp_path}[/] to [y]{target}[/]{' in MODE Z' if mode_z else ''}")
+
+
+@contextmanager
+def open_mirror_target(target: str, outcome: Optional[MirrorOutcome], writer: Optional[DiskWriter] = None,
+                       packs: Optional[PackStore] = None) -> Iterator[Any]:
+    r"""
+    Opens the target of a mirrored file: in the packs when they accept its size, or with open_target otherwise. When
+    the outcome has the remote modify time, it's saved in the pack index or given to the regular target once it's
+    closed, so a --restore can give it back to the server.
+    """
+
+    if packs is not None and packs.accepts(target, outcome and outcome.size):
+        with packs.open(target, outcome.modify and parse_ftp_modify(outcome.modify)) as target_file:
+            yield target_file
+
+        return
+
+    if packs is not None:
+        packs.discard(target)
+
+    with open_target(target, writer, preallocate=outcome and outcome.size) as target_file:
+        yield target_file
+
+    set_remote_modify(target, outcome)
+
+
+def set_remote_modify(target: str, outcome: Optional[MirrorOutcome]) -> None:
+    r"""
+    Sets the modify time of a mirrored file to the one it has on the server, when the outcome knows it.
+    """
+
+    if outcome is not None and outcome.modify is not None:
+        modify: float = parse_ftp_modify(outcome.modify)
+        os.utime(target, (modify, modify))
+
+
+@retry(delay_sec=MIRROR_ERROR_DELAY, max_attempts=MIRROR_MAX_ATTEMPTS)
+@traced("retrieve segment")
+def mirror_ftp_file_segment(ftp_path: str, target: str, offset: int, length: int, pool: FTPSessionPool,
+                            writer: Optional[DiskWriter] = None, keep_chunks: bool = False) -> tuple[int, list[bytes]]:
+    r"""
+    Downloads a byte range of a file from an FTP server into the same range of a local file, that must already exist.
+    The transfer starts at the offset with REST and, if the range doesn't go until the end of the file, the data
+    connection is closed as soon as the range is received. The server then ends the transfer with a 426 reply, or with
+    the usual 226 if it already sent everything, and the session is ready for the next segment.
+
+    :param ftp_path:
+        The path of the file on the FTP server.
+    :param target:
+        The local file where the segment will be written.
+    :param offset:
+        Position of the first byte of the segment.
+    :param length:
+        Number of bytes of the segment.
+    :param pool:
+        The FTPSessionPool of the segments, from SEGMENTED.
+    :param keep_chunks:
+        Whether the received chunks are returned too, so they can be digested without reading the segment back.
+
+    :return:
+        The number of bytes received and the received chunks, if they're kept.
+    :raises EOFError:
+        If the transfer ended before the end of the segment.
+    """
+
+    received: int = 0
+    chunks: list[bytes] = []
+
+    with pool.session() as ftp:
+        ftp.voidcmd("TYPE I")
+
+        with open_target(target, writer, "r+b", offset) as target_file:
+            with ftp.transfercmd(f"RETR {ftp_path}", rest=offset) as conn:
+                while received < length:
+                    chunk: bytes = conn.recv(min(SEGMENT_BLOCK_SIZE, length - received))
+
+                    if not chunk:
+                        break
+
+                    target_file.write(chunk)
+                    received += len(chunk)
+
+                    if keep_chunks:
+                        chunks.append(chunk)
+
+        if received < length:
+            raise EOFError(f"Segment at {offset} of {ftp_path} ended after {received} of {length} bytes")
+
+        try:
+            ftp.voidresp()
+        except error_temp as err:
+            if not str(err).startswith("426"):
+                raise err
+
+    return received, chunks
+
+
+def mirror_ftp_file_segmented(ftp_path: str, target: str, outcome: MirrorOutcome, host: str, port: int, username: str,
+                              password: str, timeout: int, writer: Optional[DiskWriter] = None,
+                              packs: Optional[PackStore] = None) -> None:
+    r"""
+    Mirrors a large file by downloading SEGMENTED.segments byte ranges of it at the same time, each one on its own FTP
+    session, into a local file preallocated with the final size. Single FTP data connections of Android servers are
+    usually much slower than the Wi-Fi link, so this uses the bandwidth that a single connection can't.
+
+    The file is split in stripes of SEGMENT_STRIPE_SIZE, that the segments download in order, and a new stripe is only
+    started when the oldest one is done. So the stripes can be digested in order from memory as they arrive, with the
+    outcome's algorithm, without reading the file back, and the digest is the same one a single transfer would give.
+    The assembled file is then checked with the server's HASH or XCRC value like in mirror_ftp_file.
+
+    :param outcome:
+        The outcome of the file, with its size, where the bytes received, the digest and the remote check are recorded.
+    :param packs:
+        Optional PackStore of the snapshot, an entry of the target left there by a previous snapshot is discarded.
+
+    :raises EOFError:
+        If the stripes don't add up to the size of the remote file.
+    :raises ValueError:
+        If the server's checksum doesn't match the assembled file.
+    """
+
+    size: int = outcome.size
+    pool, segment_executor = SEGMENTED.sessions(host, port, username, password, timeout)
+    stripes: list[tuple[int, int]] = [(offset, min(SEGMENT_STRIPE_SIZE, size - offset))
+                                      for offset in range(0, size, SEGMENT_STRIPE_SIZE)]
+    receiver: Optional[FileReceiver] = None
+
+    if packs is not None:
+        packs.discard(target)
+
+    if outcome.digest_algorithm is not None:
+        with pool.session() as ftp:  #only for the features, they're asked once for each server
+            receiver = FileReceiver(ftp_path, None, get_ftp_features(ftp, host, port), outcome, mode_z=False)
+
+    with open(target, "wb") as target_file:  #preallocated, each stripe writes in its own range
+        target_file.truncate(size)
+
+    def __submit(stripe: tuple[int, int]) -> Future:
+        return segment_executor.submit(copy_context().run, mirror_ftp_file_segment, ftp_path, target, *stripe, pool,
+                                       writer, receiver is not None)  #the copy keeps the LOG_LABEL for the retries
+
+    futures: list[Optional[Future]] = [__submit(stripe) for stripe in stripes[:SEGMENTED.segments]]
+    received: int = 0
+
+    try:
+        for index in range(len(stripes)):
+            count, chunks = futures[index].result()
+            futures[index] = None  #its chunks aren't referenced anymore after they're digested
+            received += count
+
+            if index + SEGMENTED.segments < len(stripes):
+                futures.append(__submit(stripes[index + SEGMENTED.segments]))
+
+            for chunk in chunks:
+                receiver.write(chunk)
+
+    finally:  #a failed stripe fails the file, the others can't keep writing to it while it's retried
+        for future in futures:
+            if future is not None:
+                future.cancel()
+
+        wait_futures([future for future in futures if future is not None])
+
+    if received != size or os.path.getsize(target) != size:
+        raise EOFError(f"Segments of {ftp_path} have {received} bytes, expected {size}")
+
+    set_remote_modify(target, outcome)
+
+    if receiver is None:
+        outcome.bytes_received = received
+        return
+
+    receiver.finish()
+
+    if receiver.remote_check is not None:
+        with pool.session() as ftp:
+            receiver.verify(get_remote_checksum(ftp, ftp_path, receiver.remote_check))
+
+
+@retry(delay_sec=MIRROR_ERROR_DELAY)
+def mirror_ftp_files(ftp_path: str, target: str, exclude: list[str], executor: Executor, host: str, port: int,
+                     username: str, password: str, timeout: int, manifest: Optional[FailureManifest] = None,
+                     file_cache: Optional[FileCache] = None, writer: Optional[DiskWriter] = None,
+                     digests: Optional[DigestManifest] = None, packs: Optional[PackStore] = None) -> None:
+    r"""
+    Mirrors the files from an FTP server to a local target.
+
+    :param ftp_path:
+        The path of the directory on the FTP server.
+    :param target:
+        The local target where the files will be mirrored.
+    :param exclude:
+        A list of FTP paths to exclude from the mirroring.
+    :param executor:
+        The executor that will be used for concurrent file mirroring, created by create_executor, so the walker can't
+        queue more files than it can handle.
+    :param host:
+        The host of the FTP server.
+    :param port:
+        The port of the FTP server.
+    :param username:
+        The username to connect to the FTP server.
+    :param password:
+        The password to connect to the FTP server.
+    :param timeout:
+        The timeout for the FTP connection.
+    :param manifest:
+        Optional FailureManifest where the outcome of every file is collected.
+    :param file_cache:
+        Optional FileCache of this target, the files whose size and modify time didn't change since they were cached,
+        and that are still in the target, aren't downloaded again.
+    :param writer:
+        Optional DiskWriter that will write the mirrored files.
+    :param digests:
+        Optional DigestManifest of this target, every file is digested with its algorithm while it's transfered.
+    :param packs:
+        Optional PackStore of this target, where the small files are appended.
+
+    This function recursively mirrors the files. If the ftp_path is in the exclude list or is a directory, it will be
+    skipped. Files are mirrored concurrently using the provided executor.
+    """
+
+    cprint(f"[b]Logger[/]: Mirroring [b]{ftp_path}[/]...")
+
+    if not os.path.exists(target):
+        os.makedirs(target)
+
+    entries: list[FTPEntry]
+
+    with ftp_connect(host, port, username, password, timeout=timeout) as ftp:
+        entries = list_ftp_dir(ftp, ftp_path)
+
+    cached: dict[str, tuple[int, str]] = {}
+    skipped: int = 0
+
+    if file_cache is not None:
+        cached = file_cache.get_cached_files(ftp_path)
+        file_cache.store(ftp_path, entries)
+
+    for file, is_dir, size, modify in entries:
+        ftp_file_path: str = f"{ftp_path}/{file}"
+        target_file_path: str = os.path.join(target, file)
+
+        if ftp_file_path in exclude:
+            continue
+
+        if not is_dir and digests is not None:
+            digests.list_file(target_file_path)
+
+        if not is_dir and modify is not None and cached.get(file) == (size, modify)\
+           and has_local_copy(target_file_path, size, packs):
+            skipped += 1
+            continue
+
+        if is_dir:
+            mirror_ftp_files(ftp_file_path, target_file_path, exclude, executor, host, port, username, password,
+                             timeout, manifest, file_cache, writer, digests, packs)
+            continue
+
+        outcome: MirrorOutcome = MirrorOutcome(ftp_file_path, target_file_path, size if modify is not None else None,
+                                               modify=modify)  #listed without MLSD, the size is unknown
+
+        submit_mirror_ftp_file(executor, outcome, host, port, username, password, timeout, manifest, writer, digests,
+                               packs)
+
+    if skipped:
+        cprint(f"[b]Logger[/]: Skipped {skipped} files of [b]{ftp_path}[/], unchanged since the last snapshot")
+
+
+def has_local_copy(target: str, size: int, packs: Optional[PackStore] = None) -> bool:
+    r"""
+    :return: Whether the target already has a file with that size, as a regular file or in the packs.
+    """
+
+    packed: Optional[tuple[int, int, int, float]] = packs and packs.get(target)
+
+    if packed:
+        return packed[2] == size
+
+    try:
+        return os.path.getsize(target) == size
+    except OSError as _:
+        return False
+
+
+def submit_mirror_ftp_file(executor: Executor, outcome: MirrorOutcome, host: str, port: int, username: str,
+                           password: str, timeout: int, manifest: Optional[FailureManifest] = None,
+                           writer: Optional[DiskWriter] = None, digests: Optional[DigestManifest] = None,
+                           packs: Optional[PackStore] = None) -> Future:
+    r"""
+    Submits a mirror_ftp_file task for the file described by the outcome object, and tracks it in the manifests.
+
+    :return:
+        The future of the submitted task.
+    """
+
+    if digests is not None:
+        outcome.digest_algorithm = digests.algorithm
+
+    future: Future = executor.submit(mirror_ftp_file, outcome.ftp_path, outcome.target, host, port, username, password,
+                                     timeout, outcome, writer, packs)
+
+    if manifest is not None:
+        manifest.track(future, outcome)
+
+    if digests is not None:
+        digests.track(future, outcome)
+
+    return future
+
+
+class AsyncFTP:
+    r"""
+    Minimal asyncio FTP client, with only what mirror_ftp_file_async needs: the login, single line commands and
+    passive mode downloads. Errors are raised with the ftplib exception types, so they're handled in the same way.
+
+    :ivar host:
+        The host of the FTP server, the passive data connections go to it too.
+    """
+
+    host: str
+
+    def __init__(self, host: str, reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter", timeout: int):
+        self.host = host
+        self.__reader: "asyncio.StreamReader" = reader
+        self.__writer: "asyncio.StreamWriter" = writer
+        self.__timeout: int = timeout
+
+    @staticmethod
+    @traced("connect")
+    async def connect(host: str, port: int, username: str, password: str, timeout: int) -> "AsyncFTP":
+        import asyncio
+
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        ftp: AsyncFTP = AsyncFTP(host, reader, writer, timeout)
+
+        try:
+            await ftp.get_response()
+
+            if (await ftp.send_command(f"USER {username}")).startswith("3"):
+                await ftp.send_command(f"PASS {password}")
+
+        except BaseException as err:
+            ftp.close()
+            raise err
+
+        return ftp
+
+    async def get_response(self) -> str:
+        r"""
+        Reads a reply, joining the lines of a multi-line one.
+
+        :raises error_temp, error_perm, error_reply:
+            When the reply code is 4xx, 5xx or something unexpected, like ftplib does.
+        """
+
+        import asyncio
+
+        line: str = (await asyncio.wait_for(self.__reader.readline(), self.__timeout)).decode("utf-8", "replace")
+        response: str = line.rstrip("\r\n")
+
+        if line[3:4] == "-":
+            while not line.startswith(f"{response[:3]} "):
+                line = (await asyncio.wait_for(self.__reader.readline(), self.__timeout)).decode("utf-8", "replace")
+
+                if not line:
+                    raise EOFError("Connection closed in the middle of a reply")
+
+                response += "\n" + line.rstrip("\r\n")
+
+        if not response:
+            raise EOFError("Connection closed by the server")
+
+        if response[0] == "4":
+            raise error_temp(response)
+
+        if response[0] == "5":
+            raise error_perm(response)
+
+        if response[0] not in "123":
+            raise error_reply(response)
+
+        return response
+
+    async def send_command(self, command: str) -> str:
+        self.__writer.write(f"{command}\r\n".encode("utf-8"))
+        await self.__writer.drain()
+
+        return await self.get_response()
+
+    async def retrieve(self, command: str, callback: Callable[[bytes], None], blocksize: int = 8192,
+                       finish: Optional[Callable[[], None]] = None) -> str:
+        r"""
+        Runs a download command on a passive data connection, like FTP.retrbinary, calling the callback with each
+        chunk received. The callback runs on a thread, with asyncio.to_thread, so a write that waits for the disk or
+        for a DiskWriter doesn't stall the event loop. The chunks are handed to the thread in batches of
+        ASYNC_CALLBACK_BATCH_SIZE, not one by one, so a small file costs a single thread hop, and they're still given
+        to the callback in order.
+
+        :param finish:
+            Optional function called after the last chunk, on the same thread hop of the last batch.
+        """
+
+        import asyncio
+
+        def __callback_batch(chunks: list[bytes], last: bool = False) -> None:
+            for chunk in chunks:
+                callback(chunk)
+
+            if last and finish is not None:
+                finish()
+
+        await self.send_command("TYPE I")
+        _, data_port = parse227(await self.send_command("PASV"))
+        data_reader, data_writer = await asyncio.wait_for(asyncio.open_connection(self.host, data_port),
+                                                          self.__timeout)
+
+        try:
+            await self.send_command(command)
+
+            batch: list[bytes] = []
+            batch_size: int = 0
+
+            while chunk := await asyncio.wait_for(data_reader.read(blocksize), self.__timeout):
+                batch.append(chunk)
+                batch_size += len(chunk)
+
+                if batch_size >= ASYNC_CALLBACK_BATCH_SIZE:
+                    await asyncio.to_thread(__callback_batch, batch)
+                    batch, batch_size = [], 0
+
+            if batch or finish is not None:
+                await asyncio.to_thread(__callback_batch, batch, True)
+
+        finally:
+            data_writer.close()
+
+        response: str = await self.get_response()
+
+        if not response.startswith("2"):
+            raise error_reply(response)
+
+        return response
+
+    @traced("verify")
+    async def get_remote_checksum(self, ftp_path: str, command: str) -> Optional[str]:
+        r"""
+        The same as get_remote_checksum.
+        """
+
+        try:
+            return parse_remote_checksum(command, await self.send_command(f"{command} {ftp_path}"))
+        except (error_perm, error_temp) as _:
+            return None
+
+    @traced("features")
+    async def get_features(self, port: int) -> dict[str, str]:
+        r"""
+        The same as get_ftp_features, sharing its cache.
+        """
+
+        with FTP_FEATURES_LOCK:
+            if (self.host, port) in FTP_FEATURES:
+                return FTP_FEATURES[self.host, port]
+
+        features: dict[str, str] = {}
+
+        try:
+            for line in (await self.send_command("FEAT")).splitlines()[1:-1]:
+                name, _, params = line.strip().partition(" ")
+                features[name.upper()] = params
+
+        except (error_perm, error_temp) as _:
+            pass
+
+        with FTP_FEATURES_LOCK:
+            FTP_FEATURES[self.host, port] = features
+
+        return features
+
+    async def quit(self) -> None:
+        try:
+            await self.send_command("QUIT")
+        except Exception as _:
+            pass
+
+        self.close()
+
+    def close(self) -> None:
+        self.__writer.close()
+
+
+async def mirror_ftp_file_async(ftp_path: str, target: str, host: str, port: int, username: str, password: str,
+                                timeout: int, outcome: Optional[MirrorOutcome] = None,
+                                writer: Optional[DiskWriter] = None, packs: Optional[PackStore] = None) -> None:
+    r"""
+    The asyncio counterpart of mirror_ftp_file, with the same arguments, retries, digests, remote checks and MODE Z,
+    and the same commands sent to the server. Files that would be downloaded in segments are given to mirror_ftp_file
+    on a thread, since they're few and need blocking REST transfers anyway, the rest to retrieve_ftp_file_async.
+    """
+
+    import asyncio
+
+    if outcome is not None and SEGMENTED.applies(outcome.size):
+        await asyncio.to_thread(mirror_ftp_file, ftp_path, target, host, port, username, password, timeout, outcome,
+                                writer, packs)
+        return
+
+    await retrieve_ftp_file_async(ftp_path, target, host, port, username, password, timeout, outcome, writer, packs)
+
+
+@retry(delay_sec=MIRROR_ERROR_DELAY, max_attempts=MIRROR_MAX_ATTEMPTS)
+@traced("retrieve")
+async def retrieve_ftp_file_async(ftp_path: str, target: str, host: str, port: int, username: str, password: str,
+                                  timeout: int, outcome: Optional[MirrorOutcome] = None,
+                                  writer: Optional[DiskWriter] = None, packs: Optional[PackStore] = None) -> None:
+    r"""
+    Downloads a file in a single transfer on an AsyncFTP session, retried like mirror_ftp_file. The target is opened,
+    written and closed on threads, so neither the disk nor a DiskWriter waiting for its budget blocks the event loop.
+    It's opened with the first batch of chunks and finished with the last one, so a small file costs only two thread
+    hops: one for the data and one to close the target once the server's checksum was checked.
+    """
+
+    import asyncio
+
+    cprint(f"Mirroing [c]{ftp_path}[/] to [c]{target}[/]")
+
+    if outcome is not None:
+        outcome.attempts += 1
+        outcome.bytes_received = 0
+        outcome.digest = outcome.remote_check = None
+
+    ftp: AsyncFTP = await AsyncFTP.connect(host, port, username, password, timeout)
+
+    try:
+        try:  #the same directory check of is_ftp_dir
+            await ftp.send_command(f"CWD {ftp_path}")
+            await ftp.send_command("CWD ..")
+            is_dir: bool = True
+
+        except error_perm as _:
+            is_dir = False
+
+        if is_dir:
+            cprint(f"[y]Warning[/]: Cannot mirror a directory, skiping {ftp_path}...")
+            return
+
+        features: dict[str, str] = await ftp.get_features(port)
+        mode_z: bool = MODE_Z.use_mode_z(ftp_path, outcome and outcome.size, features)
+        context: Any = open_mirror_target(target, outcome, writer, packs)
+        receiver: Optional[FileReceiver] = None
+
+        def __open() -> FileReceiver:  #on the thread of the first batch, or of the finish of an empty file
+            nonlocal receiver
+
+            if receiver is None:
+                receiver = FileReceiver(ftp_path, context.__enter__(), features, outcome, mode_z)
+
+            return receiver
+
+        if mode_z:
+            await ftp.send_command("MODE Z")
+
+        try:
+            await ftp.retrieve(f"RETR {ftp_path}", lambda chunk: __open().write(chunk), SEGMENT_BLOCK_SIZE,
+                               lambda: __open().finish())
+
+            if receiver.remote_check is not None:
+                receiver.verify(await ftp.get_remote_checksum(ftp_path, receiver.remote_check))
+
+        except BaseException as err:  #the target is only closed with the error when it was opened
+            if receiver is None or not await asyncio.to_thread(context.__exit__, type(err), err, err.__traceback__):
+                raise err
+
+        else:
+            await asyncio.to_thread(context.__exit__, None, None, None)
+
+    finally:
+        await ftp.quit()
+
+    cprint(f"[g]Mirror Successfu[/]: [y]{ftp_path}[/] to [y]{target}[/]{' in MODE Z' if mode_z else ''}")
+
+
+ASYNC_COUNTERPARTS: dict[Callable, Callable] = {mirror_ftp_file: mirror_ftp_file_async}
+
+
+class AsyncioFTPExecutor(Executor):
+    r"""
+    Executor that runs the submitted functions that have an asyncio counterpart in ASYNC_COUNTERPARTS as tasks of a
+    single event loop, running on its own thread, and any other function on a small thread pool. It has the same
+    interface as the BoundedThreadPoolExecutor, including the limit of tasks in flight, but each task in flight costs
+    only a coroutine and its sockets, not a thread, so the limit can be much higher.
+
+    :ivar max_in_flight:
+        Maximum number of tasks that can be queued or running at the same time.
+    """
+
+    max_in_flight: int
+
+    def __init__(self, max_in_flight: int, max_workers: int = PROCS):
+        import asyncio  #only loaded with the asyncio engine, the threads engine starts faster without it
+
+        self.max_in_flight = max_in_flight
+        self.__slots: BoundedSemaphore = BoundedSemaphore(max_in_flight)
+        self.__loop: "asyncio.AbstractEventLoop" = asyncio.new_event_loop()
+        self.__loop_thread: Thread = Thread(target=self.__loop.run_forever, daemon=True)
+        self.__threads: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__pending: set[Future] = set()
+        self.__lock: Lock = Lock()
+
+        self.__loop_thread.start()
+
+    def submit(self, fn: Callable, /, *args, **key_args) -> Future:
+        import asyncio
+
+        self.__slots.acquire()
+
+        try:
+            if fn in ASYNC_COUNTERPARTS:
+                future: Future = asyncio.run_coroutine_threadsafe(ASYNC_COUNTERPARTS[fn](*args, **key_args),
+                                                                  self.__loop)
+            else:
+                future = self.__threads.submit(copy_context().run, fn, *args, **key_args)
+
+        except BaseException as err:
+            self.__slots.release()
+            raise err
+
+        with self.__lock:
+            self.__pending.add(future)
+
+        future.add_done_callback(self.__release)
+
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self.__lock:
+            pending: list[Future] = list(self.__pending)
+
+        if cancel_futures:
+            for future in pending:
+                future.cancel()
+
+        if wait:
+            wait_futures(pending)
+
+        self.__threads.shutdown(wait, cancel_futures=cancel_futures)
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__loop_thread.join()
+        self.__loop.close()
+
+    def __release(self, future: Future) -> None:
+        with self.__lock:
+            self.__pending.discard(future)
+
+        self.__slots.release()
+
+
+def create_executor(engine: str, procs: int) -> Executor:
+    r"""
+    Creates the executor of the transfer engine chosen with the --engine argument.
+
+    :param procs:
+        Number of files mirrored at the same time by the threads engine, the asyncio engine handles
+        ASYNC_TASKS_PER_PROC times that.
+    """
+
+    if engine == "asyncio":
+        return AsyncioFTPExecutor(max_in_flight=procs * ASYNC_TASKS_PER_PROC, max_workers=procs)
+
+    return BoundedThreadPoolExecutor(max_workers=procs, max_in_flight=procs * 4)
+
+
+def retry_failed_files(args: Namespace) -> None:
+    r"""
+    Transfers again only the files listed in the failure manifest given by the --retry-failed argument, and updates
+    that manifest with the files that are still failing (or removes it when everything was mirrored).
+
+    :param args:
+        Parsed user arguments.
+    """
+
+    profile_name: str
+    failures: list[MirrorOutcome]
+    profile_name, failures = FailureManifest.load(args.retry_failed)
+    manifest: FailureManifest = FailureManifest()
+    packs: Optional[PackStore] = create_pack_store(os.path.dirname(os.path.abspath(args.retry_failed)), args.pack)
+    digests: Optional[DigestManifest] = create_digest_manifest(os.path.dirname(os.path.abspath(args.retry_failed)),
+                                                               args.digest, packs)
+
+    logger(f"Retrying {len(failures)} failed files of the [{profile_name}] profile...", padding="both")
+
+    writer: Optional[DiskWriter] = create_disk_writer(args.write_buffer)
+    benchmark_start: float = time()
+
+    with create_executor(args.engine, PROCS) as executor:
+        for outcome in failures:
+            os.makedirs(os.path.dirname(outcome.target), exist_ok=True)
+            submit_mirror_ftp_file(executor, outcome, args.host, args.port, args.username, args.password, args.timeout,
+                                   manifest, writer, digests, packs)
+
+    close_disk_writer(writer)
+    benchmark: float = time() - benchmark_start
+
+    manifest.save(args.retry_failed, profile_name)
+    save_pack_stores([packs])
+    save_digest_manifests([digests])
+    report_failure_manifest(manifest, [args.retry_failed])
+    logger(f"Retry finished in {benchmark:.2f} seconds", ptype="pass", padding="both")
+
+
+@traced("mkdir")
+def make_ftp_dirs(ftp: FTP, ftp_paths: list[str]) -> None:
+    r"""
+    Creates a batch of remote directories, sending all the MKD commands before reading their replies, so the whole
+    batch costs about one round trip. Directories that already exist are ignored, like any other refused MKD, since
+    their files will fail on their own.
+    """
+
+    for ftp_path in ftp_paths:
+        ftp.putcmd(f"MKD {ftp_path}")
+
+    for _ in ftp_paths:
+        try:
+            ftp.voidresp()
+        except (error_perm, error_temp) as _:
+            pass
+
+
+def format_ftp_modify(timestamp: float) -> str:
+    return strftime("%Y%m%d%H%M%S", gmtime(timestamp))
+
+
+def parse_ftp_modify(modify: str) -> float:
+    r"""
+    The inverse of format_ftp_modify, for the modify facts of MLSD, that are in UTC and may have fractions of a second.
+    """
+
+    from calendar import timegm
+
+    return timegm(strptime(modify[:14], "%Y%m%d%H%M%S")) + float(f"0{modify[14:]}")
+
+
+@retry(delay_sec=MIRROR_ERROR_DELAY, max_attempts=MIRROR_MAX_ATTEMPTS)
+@traced("store")
+def upload_ftp_file(source: str, ftp_path: str, pool: FTPSessionPool, outcome: Optional[MirrorOutcome] = None,
+                    packs: Optional[PackStore] = None) -> None:
+    r"""
+    Uploads a local file to an FTP server with STOR, on a pooled session, and sets its remote modify time with MFMT
+    (when the server supports it) to the local one, that's the one the file had on the server when it was mirrored, so
+    the next restore can tell that the file is already there.
+
+    :param source:
+        The local file.
+    :param ftp_path:
+        The path where the file is stored on the FTP server.
+    :param pool:
+        The FTPSessionPool that gives the session of the current thread.
+    :param outcome:
+        Optional outcome object, its bytes_received counts the bytes sent.
+    :param packs:
+        Optional PackStore of the snapshot, the source is read from it when it was packed.
+    """
+
+    cprint(f"Uploading [c]{source}[/] to [c]{ftp_path}[/]")
+
+    if outcome is not None:
+        outcome.attempts += 1
+        outcome.bytes_received = 0
+
+    def __count_block(block: bytes) -> None:
+        outcome.bytes_received += len(block)
+
+    packed: Optional[tuple[int, int, int, float]] = packs and not os.path.isfile(source) and packs.get(source)
+
+    with pool.session() as ftp, open(source, "rb") if not packed else BytesIO(packs.read(source)) as source_file:
+        ftp.storbinary(f"STOR {ftp_path}", source_file, SEGMENT_BLOCK_SIZE, __count_block if outcome else None)
+
+        if "MFMT" in get_ftp_features(ftp, pool.host, pool.port):
+            try:
+                ftp.sendcmd(f"MFMT {format_ftp_modify(packed[3] if packed else os.path.getmtime(source))} {ftp_path}")
+            except (error_perm, error_temp) as _:  #the file is there, it will only be uploaded again next time
+                pass
+
+    cprint(f"[g]Upload Successful[/]: [y]{source}[/] to [y]{ftp_path}[/]")
+
+
+def walk_restore_source(source: str) -> Iterator[tuple[str, list[str], list[str]]]:
+    r"""
+    Walks a snapshot to be restored, top-down, so the parents always come before their subdirectories.
+
+    :param source:
+        A snapshot profile directory, or a digest manifest saved inside one or archived in its MANIFEST_ARCHIVE_DIR,
+        then only the files listed in it are walked. The files in the packs of a directory are walked with the regular
+        ones.
+
+    :return:
+        An iterator of tuples with the directory path relative to the snapshot root ("" for the root itself), the
+        names of its subdirectories and the names of its files. The files saved by this script are left out.
+    """
+
+    tree: dict[str, tuple[list[str], list[str]]] = {"": ([], [])}
+    walked: set[str] = set()
+
+    def __add_directory(directory: str) -> None:
+        if directory in tree:
+            return
+
+        tree[directory] = ([], [])
+        child: str = directory
+
+        while child:  #registers the missing ancestors too
+            parent, _, name = child.rpartition("/")
+            known_parent: bool = parent in tree
+
+            tree.setdefault(parent, ([], []))[0].append(name)
+
+            if known_parent:
+                break
+
+            child = parent
+
+    def __add_file(path: str) -> None:
+        if path in walked:  #a regular file and a stale packed copy, the regular one is restored
+            return
+
+        directory, _, file = path.rpartition("/")
+
+        walked.add(path)
+        __add_directory(directory)
+        tree[directory][1].append(file)
+
+    if os.path.isdir(source):
+        for directory, subdirs, files in os.walk(source):
+            relative: str = os.path.relpath(directory, source).replace(os.sep, "/")
+            relative = "" if relative == "." else relative
+            subdirs[:] = [subdir for subdir in subdirs if not subdir.startswith(".mkftp-")]
+
+            __add_directory(relative)
+
+            for file in files:
+                if not file.startswith(".mkftp-"):
+                    __add_file(f"{relative}/{file}" if relative else file)
+
+        for path in PackStore(source).entries:
+            __add_file(path)
+
+    else:
+        for path, _, _ in read_manifest_entries(source):
+            __add_file(path)
+
+    for directory in sorted(tree):  #a prefix sorts before the paths that start with it
+        yield directory, *tree[directory]
+
+
+@retry(delay_sec=MIRROR_ERROR_DELAY, max_attempts=MIRROR_MAX_ATTEMPTS)
+def prepare_restore_dir(pool: FTPSessionPool, ftp_dir: str, subdirs: list[str]) -> dict[str, FTPEntry]:
+    r"""
+    Lists a remote directory that's about to receive restored files and creates the subdirectories it's missing.
+
+    :return:
+        The remote entries of the directory, keyed by their names.
+    """
+
+    with pool.session() as ftp:
+        entries = list_ftp_dir(ftp, ftp_dir)
+        remote: dict[str, FTPEntry] = {entry[0]: entry for entry in entries}
+
+        make_ftp_dirs(ftp, [f"{ftp_dir.rstrip('/')}/{name}" for name in subdirs if name not in remote])
+
+    return remote
+
+
+@traced("restore")
+def restore_snapshot(args: Namespace) -> None:
+    r"""
+    Pushes the snapshot given by the --restore argument back to the FTP server, with the same bounded executor and
+    progress messages as the mirror, but on pooled sessions.
+
+    :param args:
+        Parsed user arguments.
+    """
+
+    source: str = os.path.abspath(args.restore)
+    local_root: str = source if os.path.isdir(source) else os.path.dirname(source)
+
+    if os.path.basename(local_root) == MANIFEST_ARCHIVE_DIR:  #an archived manifest, the snapshot is its parent
+        local_root = os.path.dirname(local_root)
+    pool: FTPSessionPool = FTPSessionPool(args.host, args.port, args.username, args.password, args.timeout)
+    packs: PackStore = PackStore(local_root)
+    manifest: FailureManifest = FailureManifest()
+    skipped: int = 0
+
+    logger(f"Restoring [{local_root}] to the FTP server...", padding="both")
+    benchmark_start: float = time()
+
+    with BoundedThreadPoolExecutor(max_workers=PROCS, max_in_flight=MAX_IN_FLIGHT) as executor:
+        for directory, subdirs, files in walk_restore_source(source):
+            ftp_dir: str = f"/{directory}"
+            remote: dict[str, FTPEntry] = prepare_restore_dir(pool, ftp_dir, subdirs)
+
+            for file in files:
+                local_path: str = os.path.join(local_root, directory, file)
+                ftp_path: str = f"{ftp_dir.rstrip('/')}/{file}"
+
+                packed: Optional[tuple[int, int, int, float]] = packs.get(local_path)
+
+                if os.path.isfile(local_path):
+                    stat: os.stat_result = os.stat(local_path)
+                    local_size, local_modify = stat.st_size, stat.st_mtime
+                elif packed is not None:
+                    _, _, local_size, local_modify = packed
+                else:
+                    cprint(f"[y]Warning[/]: {local_path} isn't in the snapshot anymore, skiping...")
+                    continue
+
+                _, is_dir, size, modify = remote.get(file, (file, False, -1, None))
+
+                if not is_dir and size == local_size and (modify or "")[:14] == format_ftp_modify(local_modify):
+                    skipped += 1
+                    continue
+
+                outcome: MirrorOutcome = MirrorOutcome(ftp_path, local_path, local_size)  #the target is the source here
+                manifest.track(executor.submit(upload_ftp_file, local_path, ftp_path, pool, outcome, packs), outcome)
+
+    pool.close()
+    benchmark: float = time() - benchmark_start
+
+    logger(f"{manifest.succeeded} files uploaded, {skipped} already on the server",
+           ptype="good" if not manifest.failures else "fail")
+
+    for outcome in manifest.failures:
+        cprint(f"  [r]{outcome.ftp_path}[/]: {outcome.error}: {outcome.message}")
+
+    if manifest.failures:
+        cprint("Run the restore again to upload only the files that are still missing.")
+
+    logger(f"Restore finished in {benchmark:.2f} seconds", ptype="pass", padding="both")
+
+
+def normalize_profile_paths(profile: BackupProfile, ftp_root: str) -> list[str]:
+    r"""
+    Makes the data and the exclude paths of a profile absolute, replacing the "./" with the FTP root directory.
+
+    :return:
+        The list of the excluded paths.
+    """
+
+    logger("Normalizing the data path strings...", padding="both")
+
+    for key, path in enumerate([data["Path"] for data in profile["Data"]]):
+        norm_path: str = path.replace("./", ftp_root)
+        norm_path = ("/" if norm_path[0] != "/" else "") + norm_path
+        profile["Data"][key]["Path"] = norm_path
+
+        if norm_path != path:
+            cprint(f"Renamed [c]{path}[/] to [c]{norm_path}[/]")
+
+    logger("Normalizing the exclude path strings...", padding="both")
+
+    for key, path in enumerate([data["Path"] for data in profile["Exclude"]]):
+        norm_path: str = path.replace("./", ftp_root)
+        norm_path = ("/" if norm_path[0] != "/" else "") + norm_path
+        profile["Exclude"][key]["Path"] = norm_path
+
+        if norm_path != path:
+            cprint(f"Renamed [c]{path}[/] to [c]{norm_path}[/]")
+
+    return [item["Path"] for item in profile["Exclude"]]
+
+
+@traced("snapshot")
+def snapshot_profile(profile_name: str, profile: BackupProfile, exclude: list[str], targets: list[str], host: str,
+                     port: int, username: str, password: str, timeout: int, procs: int, args: Namespace,
+                     writer: Optional[DiskWriter] = None) -> dict[str, FailureManifest]:
+    r"""
+    Mirrors every data path of a profile into each target, then saves the failure manifests, the run histories, the
+    file caches, the pack indexes and the digest manifests of the snapshot, with an archived copy of each digest
+    manifest. Each target has its own failure manifest, so its files and its history only count its own transfers.
+
+    :param profile_name:
+        Name of the profile, the snapshot is saved in a directory with that name on each target.
+    :param exclude:
+        The normalized exclude paths of the profile.
+    :param procs:
+        Number of files mirrored at the same time.
+    :param args:
+        Parsed user arguments, for the --incremental, --digest, --pack and --engine options.
+    :param writer:
+        Optional DiskWriter that will write the mirrored files, it's not closed here.
+
+    :return:
+        The failure manifest of each target.
+    """
+
+    manifests: dict[str, FailureManifest] = {target: FailureManifest() for target in targets}
+    file_caches: dict[str, Optional[FileCache]] = {
+        target: FileCache.load(os.path.join(target, profile_name, FILE_CACHE_NAME)) if args.incremental else None
+        for target in targets
+    }
+    packs: dict[str, Optional[PackStore]] = {
+        target: create_pack_store(os.path.join(target, profile_name), args.pack) for target in targets
+    }
+    digests: dict[str, Optional[DigestManifest]] = {
+        target: create_digest_manifest(os.path.join(target, profile_name), args.digest, packs[target], True)
+        for target in targets
+    }
+    start: float = time()
+
+    with create_executor(args.engine, procs) as executor:
+        logger("Mirroring all files in parallel tasks...")
+
+        for data in profile["Data"]:
+            for target in targets:
+                full_target: str = os.path.join(target, profile_name, data["Path"].lstrip("/"))
+
+                mirror_ftp_files(data["Path"], full_target, exclude, executor, host, port, username, password,
+                                 timeout, manifests[target], file_caches[target], writer, digests[target],
+                                 packs[target])
+
+    seconds: float = time() - start
+
+    for target, manifest in manifests.items():
+        manifest.save(os.path.join(target, profile_name, FAILURE_MANIFEST_NAME), profile_name)
+
+        if manifest.succeeded:
+            save_run_history(os.path.join(target, profile_name, HISTORY_NAME), manifest.succeeded,
+                             manifest.bytes_received, seconds)
+
+        if file_caches[target] is not None:
+            for outcome in manifest.failures:
+                file_caches[target].discard_file(outcome.ftp_path)
+
+            file_caches[target].save()
+
+    save_pack_stores(list(packs.values()))
+    save_digest_manifests(list(digests.values()), [data["Path"] for data in profile["Data"]])
+
+    return manifests
+
+
+def load_run_history(path: str) -> list[dict[str, Any]]:
+    try:
+        with open(path, "r") as f:
+            return load(f)
+
+    except (OSError, ValueError) as _:
+        return []
+
+
+def save_run_history(path: str, files: int, size: int, seconds: float) -> None:
+    r"""
+    Appends a run to the history of a snapshot, that keeps the last HISTORY_MAX_RUNS runs for the --plan estimates.
+
+    :param files:
+        Number of files transfered.
+    :param size:
+        Number of bytes transfered.
+    :param seconds:
+        Time spent on the transfers.
+    """
+
+    history: list[dict[str, Any]] = load_run_history(path)
+    history.append({"Date": strftime("%Y-%m-%dT%H:%M:%S"), "Files": files, "Bytes": size,
+                    "Seconds": round(seconds, 3)})
+
+    with open(path, "w") as f:
+        dump(history[-HISTORY_MAX_RUNS:], f, indent=2)
+
+
+def estimate_duration(history: list[dict[str, Any]], files: int, size: int) -> Optional[float]:
+    r"""
+    Estimates how long a transfer takes from the previous runs, fitting seconds = files * a + bytes * b with least
+    squares, since both the per file round trips and the bandwidth matter. When the runs don't tell the two costs apart,
+    it scales the average of both ratios instead.
+
+    :return:
+        The estimated seconds, or None without any previous run.
+    """
+
+    runs: list[tuple[int, int, float]] = [(run["Files"], run["Bytes"], run["Seconds"]) for run in history
+                                          if run["Seconds"] > 0]
+
+    if not runs:
+        return None
+
+    sum_ff: float = sum(f * f for f, _, _ in runs)
+    sum_fb: float = sum(f * b for f, b, _ in runs)
+    sum_bb: float = sum(b * b for _, b, _ in runs)
+    sum_fs: float = sum(f * t for f, _, t in runs)
+    sum_bs: float = sum(b * t for _, b, t in runs)
+    determinant: float = sum_ff * sum_bb - sum_fb * sum_fb
+
+    if determinant > 1e-9 * sum_ff * sum_bb:
+        per_file: float = (sum_fs * sum_bb - sum_bs * sum_fb) / determinant
+        per_byte: float = (sum_bs * sum_ff - sum_fs * sum_fb) / determinant
+
+        if per_file >= 0 and per_byte >= 0:
+            return files * per_file + size * per_byte
+
+    total_files: int = sum(f for f, _, _ in runs)
+    total_bytes: int = sum(b for _, b, _ in runs)
+    total_seconds: float = sum(t for _, _, t in runs)
+
+    return total_seconds * (files / max(total_files, 1) + size / max(total_bytes, 1)) / 2
+
+
+def format_size(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+
+        size /= 1024
+
+    return f"{size:.1f} TB"
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return f"{hours}h{minutes:02}m{seconds:02}s" if hours else f"{minutes}m{seconds:02}s"
+
+
+def plan_ftp_dir(ftp: FTP, ftp_path: str, targets: list[str], exclude: list[str],
+                 directories: list[tuple[int, str]],
+                 packs: Optional[list[PackStore]] = None) -> tuple[int, int, list[int]]:
+    r"""
+    Walks a remote directory, like mirror_ftp_files but on a single session and without downloading anything.
+
+    :param targets:
+        The local directories where this directory would be mirrored, one for each target.
+    :param directories:
+        List where the total size of each directory walked is appended, with its path.
+    :param packs:
+        Optional PackStore of each target, the packed files count as already there too.
+
+    :return:
+        The number of files and bytes in the directory (and its subdirectories), and the number of bytes each target
+        still needs to mirror them, discounting the files that are already there.
+    """
+
+    entries = list_ftp_dir(ftp, ftp_path)
+    files: int = 0
+    size: int = 0
+    needed: list[int] = [0] * len(targets)
+
+    for name, is_dir, entry_size, modify in entries:
+        entry_path: str = f"{ftp_path}/{name}"
+
+        if entry_path in exclude:
+            continue
+
+        if is_dir:
+            dir_files, dir_size, dir_needed = plan_ftp_dir(ftp, entry_path, [os.path.join(target, name)
+                                                                              for target in targets], exclude,
+                                                           directories, packs)
+            files += dir_files
+            size += dir_size
+            needed = [total + dir_total for total, dir_total in zip(needed, dir_needed)]
+            continue
+
+        if modify is None:  #listed without MLSD, the size is unknown
+            try:
+                entry_size = ftp.size(entry_path) or 0
+            except (error_perm, error_temp) as _:
+                pass
+
+        files += 1
+        size += entry_size
+
+        for key, target in enumerate(targets):
+            local_path: str = os.path.join(target, name)
+            packed: Optional[tuple[int, int, int, float]] = packs and packs[key].get(local_path)
+            local_size: int = packed[2] if packed else os.path.getsize(local_path) if os.path.isfile(local_path) else 0
+            needed[key] += max(0, entry_size - local_size)
+
+    directories.append((size, ftp_path))
+
+    return files, size, needed
+
+
+def get_free_space(path: str) -> int:
+    while not os.path.exists(path) and os.path.dirname(path) != path:  #the target may not have been created yet
+        path = os.path.dirname(path)
+
+    import shutil
+
+    return shutil.disk_usage(path).free
+
+
+@traced("plan")
+def plan_snapshot(profile_name: str, profile: BackupProfile, exclude: list[str], args: Namespace) -> None:
+    r"""
+    Reports what a snapshot of the profile would transfer, for the --plan argument: the files and bytes of each data
+    path, the largest directories, the estimated time from the run history of the targets and a warning for each
+    target without enough free space.
+
+    :param exclude:
+        The normalized exclude paths of the profile.
+    :param args:
+        Parsed user arguments.
+    """
+
+    directories: list[tuple[int, str]] = []
+    total_files: int = 0
+    total_size: int = 0
+    needed: list[int] = [0] * len(args.targets)
+
+    logger(f"Planning the [{profile_name}] profile, nothing will be downloaded...", padding="both")
+
+    packs: list[PackStore] = [PackStore(os.path.join(target, profile_name)) for target in args.targets]
+
+    with ftp_connect(args.host, args.port, args.username, args.password, timeout=args.timeout) as ftp:
+        for data in profile["Data"]:
+            files, size, data_needed = plan_ftp_dir(ftp, data["Path"], [
+                os.path.join(target, profile_name, data["Path"].lstrip("/")) for target in args.targets
+            ], exclude, directories, packs)
+
+            total_files += files
+            total_size += size
+            needed = [total + data_total for total, data_total in zip(needed, data_needed)]
+
+            cprint(f"  [c]{data['Path']}[/]: {files} files, {format_size(size)}")
+
+    logger(f"Total: {total_files} files, {format_size(total_size)}", padding="both")
+    cprint("Largest directories:")
+
+    for size, ftp_path in sorted(directories, reverse=True)[:PLAN_LARGEST_DIRECTORIES]:
+        cprint(f"  [y]{format_size(size):>10}[/]  {ftp_path}")
+
+    history: list[dict[str, Any]] = max([load_run_history(os.path.join(target, profile_name, HISTORY_NAME))
+                                         for target in args.targets], key=len)
+    estimate: Optional[float] = estimate_duration(history, total_files, total_size)
+
+    if estimate is None:
+        logger("No previous snapshot of this profile, so there's no time estimate yet", padding="both")
+    else:
+        logger(f"Estimated time for a full snapshot: {format_duration(estimate)}, from the last {len(history)} runs"
+               f"{' (an incremental one only transfers the changes)' if args.incremental else ''}", padding="both")
+
+    for target, target_needed in zip(args.targets, needed):
+        free: int = get_free_space(os.path.join(target, profile_name))
+
+        if target_needed > free:
+            logger(f"{target} needs {format_size(target_needed)} more, but only has {format_size(free)} free",
+                   ptype="warning")
+        else:
+            logger(f"{target} needs {format_size(target_needed)} more and has {format_size(free)} free", ptype="good")
+
+
+@dataclass
+class DeviceReport:
+    r"""
+    Summary of the snapshots of a single device, in a --devices run.
+    """
+
+    name: str
+    profiles: list[str]
+    succeeded: int = 0
+    failed: int = 0
+    bytes_received: int = 0
+    seconds: float = 0
+    error: Optional[str] = None
+
+
+def snapshot_device(name: str, device: dict[str, Any], args: Namespace, writer: Optional[DiskWriter] = None,
+                    targets: Optional[list[str]] = None) -> DeviceReport:
+    r"""
+    Snapshots the profiles of a single device listed in the --devices file, one profile after the other, with the
+    device's own Procs budget. Any error is kept in the report instead of being raised, so it doesn't stop the other
+    devices.
+
+    :param name:
+        Name of the device, the snapshots are saved in a directory with that name on each target.
+    :param device:
+        The device entry, with the same Host, Port, Username and Password keys of the credential file, plus the list
+        of Profiles and the optional Procs, Timeout and SyncConfigFile.
+    :param writer:
+        Optional DiskWriter shared by all the devices.
+    :param targets:
+        Targets where the profiles are saved, by default a directory named after the device in each of the --targets.
+    """
+
+    report: DeviceReport = DeviceReport(name, device["Profiles"])
+    host, port = device["Host"], device["Port"]
+    username, password = device["Username"], device["Password"]
+    timeout: int = device.get("Timeout", args.timeout)
+    procs: int = device.get("Procs", PROCS)
+    targets = targets or [os.path.join(target, name) for target in args.targets]
+    label_token: Token = LOG_LABEL.set(name)
+    start: float = time()
+
+    try:
+        with socket.create_connection((host, port), timeout=timeout):  #ftp_connect would wait forever for it
+            pass
+
+        with ftp_connect(host, port, username, password, timeout=timeout) as ftp:
+            config: SyncConfig = get_json_config_content(ftp, device.get("SyncConfigFile", args.sync_config_file))
+            ftp_root: str = ftp.pwd()
+
+        for profile_name in device["Profiles"]:
+            profile: BackupProfile = config[profile_name]
+            exclude: list[str] = normalize_profile_paths(profile, ftp_root)
+
+            for manifest in snapshot_profile(profile_name, profile, exclude, targets, host, port, username, password,
+                                             timeout, procs, args, writer).values():
+                report.succeeded += manifest.succeeded
+                report.failed += len(manifest.failures)
+                report.bytes_received += manifest.bytes_received
+
+    except Exception as err:
+        report.error = f"{type(err).__name__}: {err}"
+
+    finally:
+        LOG_LABEL.reset(label_token)
+
+    report.seconds = time() - start
+
+    return report
+
+
+def snapshot_devices(args: Namespace) -> None:
+    r"""
+    Snapshots all the devices of the --devices file at the same time, each one in its own thread and with its own
+    executor, while all of them share the disk writer (and its memory budget). So the total time is close to the one
+    of the slowest device, not the sum of all of them. The lines written for each device start with its name.
+
+    :param args:
+        Parsed user arguments.
+    """
+
+    with open(args.devices, "r") as f:
+        devices: dict[str, dict[str, Any]] = load(f)
+
+    if not isinstance(devices, dict) or not devices:
+        logger(f"No devices listed in {args.devices}, it should map each device name to its entry", ptype="error")
+        return
+
+    logger(f"Mirroring {len(devices)} devices at the same time...", padding="both")
+
+    writer: Optional[DiskWriter] = create_disk_writer(args.write_buffer)
+    benchmark_start: float = time()
+
+    with ThreadPoolExecutor(max_workers=len(devices)) as device_executor:
+        reports: list[DeviceReport] = list(device_executor.map(lambda item: snapshot_device(*item, args, writer),
+                                                               devices.items()))
+
+    close_disk_writer(writer)
+    benchmark: float = time() - benchmark_start
+
+    logger("Devices summary:", padding="both")
+
+    for report in reports:
+        print_device_report(report)
+
+    logger(f"All devices finished in {benchmark:.2f} seconds, "
+           f"{sum(report.seconds for report in reports):.2f} seconds one after the other", ptype="pass", padding="both")
+
+
+def print_device_report(report: DeviceReport) -> None:
+    megabytes: float = report.bytes_received / 1024 / 1024
+    status: str = f"[r]{report.error}[/]" if report.error else f"[r]{report.failed} failed[/]" if report.failed\
+        else "[g]OK[/]"
+
+    cprint(f"  [c]{report.name}[/] ({', '.join(report.profiles)}): {report.succeeded} files, {megabytes:.2f} MB in "
+           f"{report.seconds:.2f} seconds ({megabytes / max(report.seconds, 1e-9):.2f} MB/s) {status}")
+
+
+def probe_ftp_host(host: str, port: int, timeout: int) -> bool:
+    r"""
+    Checks if the FTP server accepts connections, with a single TCP handshake and without logging in, so it's cheap
+    enough to be repeated for hours.
+    """
+
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+
+    except OSError as _:
+        return False
+
+
+def watch_device(args: Namespace) -> None:
+    r"""
+    Probes the host until the phone shows up on the network, waiting longer after each failed probe as in
+    WATCH_PROBE_DELAYS, then makes an incremental snapshot of the --watch profiles, without the menu. After a snapshot
+    without failures it waits the --cooldown before probing again, so the phone is synced in small and frequent deltas
+    instead of a huge backlog. A snapshot with failures is tried again as soon as the phone answers the probe.
+
+    :param args:
+        Parsed user arguments.
+    """
+
+    device: dict[str, Any] = {"Host": args.host, "Port": args.port, "Username": args.username,
+                              "Password": args.password, "Profiles": args.watch}
+    probes: int = 0
+
+    args.incremental = True
+
+    logger(f"Watching ftp://{args.host}:{args.port} for the {', '.join(args.watch)} profiles, Ctrl+C to stop...",
+           padding="both")
+
+    try:
+        while True:
+            if not probe_ftp_host(args.host, args.port, args.timeout):
+                sleep(WATCH_PROBE_DELAYS[min(probes, len(WATCH_PROBE_DELAYS) - 1)])
+                probes += 1
+                continue
+
+            probes = 0
+            logger(f"The phone is on the network, starting a snapshot at {strftime('%Y-%m-%d %H:%M:%S')}...",
+                   ptype="good", padding="both")
+
+            writer: Optional[DiskWriter] = create_disk_writer(args.write_buffer)
+            report: DeviceReport = snapshot_device(args.host, device, args, writer, args.targets)
+
+            close_disk_writer(writer)
+            print_device_report(report)
+
+            if report.error is None and not report.failed:
+                logger(f"Snapshot finished, next probe in {args.cooldown} minutes", ptype="pass", padding="both")
+                sleep(args.cooldown * 60)
+            else:
+                sleep(WATCH_PROBE_DELAYS[0])
+
+    except KeyboardInterrupt as _:
+        logger("Watch mode stopped", padding="both")
+
+
+def create_disk_writer(write_buffer_mb: int) -> Optional[DiskWriter]:
+    return DiskWriter(write_buffer_mb * 1024 * 1024) if write_buffer_mb > 0 else None
+
+
+def close_disk_writer(writer: Optional[DiskWriter]) -> None:
+    r"""
+    Waits for the writer to finish and logs its throughput, that only accounts for the time spent writing to the disk.
+    """
+
+    if writer is None:
+        return
+
+    writer.close()
+
+    written_mb: float = writer.bytes_written / 1024 / 1024
+    throughput_mb: float = writer.throughput() / 1024 / 1024
+
+    logger(f"Disk writer: {written_mb:.2f} MB written in {writer.busy_seconds:.2f} seconds ({throughput_mb:.2f} MB/s)")
+
+
+def create_digest_manifest(root: str, algorithm: str, packs: Optional[PackStore] = None,
+                           from_listing: bool = False) -> Optional[DigestManifest]:
+    return DigestManifest(root, algorithm, packs, from_listing) if algorithm != "none" else None
+
+
+def create_pack_store(root: str, pack_kb: int) -> Optional[PackStore]:
+    return PackStore(root, pack_kb * 1024) if pack_kb > 0 else None
+
+
+def save_pack_stores(packs: list[Optional[PackStore]]) -> None:
+    r"""
+    Saves the index of each pack store and logs how many files are packed.
+    """
+
+    for pack_store in filter(None, packs):
+        pack_store.save()
+
+        logger(f"{len(pack_store.entries)} small files packed: {os.path.join(pack_store.root, PACK_DIR_NAME)}")
+
+
+@traced("digests")
+def save_digest_manifests(digests: list[Optional[DigestManifest]], data_paths: Optional[list[str]] = None) -> None:
+    r"""
+    Saves each digest manifest and logs how many files were digested and checked against the server.
+
+    :param data_paths:
+        The data paths of the snapshot profile, when given each manifest is archived too, for --diff.
+    """
+
+    for digest_manifest in filter(None, digests):
+        digest_manifest.save()
+
+        logger(f"{len(digest_manifest.entries)} files digested with {digest_manifest.algorithm}, "
+               f"{digest_manifest.verified} verified by the server: "
+               f"{os.path.join(digest_manifest.root, DIGEST_MANIFEST_NAME)}")
+
+        if data_paths is not None:
+            cprint(f"Archived as [c]{archive_digest_manifest(digest_manifest.root, data_paths)}[/], use"
+                   f" [c]--diff {digest_manifest.root}[/] to see what changed since the previous snapshot")
+
+
+def archive_digest_manifest(root: str, data_paths: list[str]) -> str:
+    r"""
+    Keeps a gzip compressed copy of the digest manifest of a snapshot in its MANIFEST_ARCHIVE_DIR, named after the
+    time of the snapshot, so --diff can compare it with the previous ones later. The first line is a header with the
+    creation time and the data paths of the profile, the rest are the manifest lines as they are, still sorted by path.
+    Only the MANIFEST_ARCHIVE_MAX most recent copies are kept.
+
+    :param root:
+        The snapshot root, where the digest manifest was saved.
+    :param data_paths:
+        The data paths of the profile, the changes are grouped by them.
+
+    :return:
+        The path of the archived manifest.
+    """
+
+    import gzip, shutil
+
+    archive_dir: str = os.path.join(root, MANIFEST_ARCHIVE_DIR)
+    path: str = os.path.join(archive_dir, f"{strftime('%Y%m%d-%H%M%S')}.txt.gz")
+
+    os.makedirs(archive_dir, exist_ok=True)
+
+    with open(os.path.join(root, DIGEST_MANIFEST_NAME), "r", encoding="utf-8") as source,\
+         gzip.open(f"{path}.tmp", "wt", compresslevel=6, encoding="utf-8") as f:
+        f.write("\t".join([MANIFEST_HEADER, strftime("%Y-%m-%dT%H:%M:%S")] + data_paths) + "\n")
+        shutil.copyfileobj(source, f)
+
+    os.replace(f"{path}.tmp", path)
+
+    archived: list[str] = sorted(name for name in os.listdir(archive_dir) if name.endswith(".txt.gz"))
+
+    for name in archived[:-MANIFEST_ARCHIVE_MAX]:
+        os.remove(os.path.join(archive_dir, name))
+
+    return path
+
+
+def read_manifest_entries(path: str, header: Optional[list[str]] = None) -> Iterator[tuple[str, str, int]]:
+    r"""
+    Streams the entries of a digest manifest, either the one saved in a snapshot or an archived copy, one line at a
+    time, checking that they're sorted by path.
+
+    :param header:
+        Optional list where the creation time and the data paths of an archived manifest are put, once the first entry
+        is read.
+
+    :return:
+        An iterator of (path, digest, size) tuples.
+
+    :raises ValueError:
+        If the manifest isn't sorted by path, since the merge of diff_manifests would be wrong.
+    """
+
+    import gzip
+
+    previous: str = ""
+
+    with (gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, "r", encoding="utf-8")) as f:
+        first: str = f.readline()
+
+        if first.startswith(MANIFEST_HEADER):
+            if header is not None:
+                header.extend(first.rstrip("\n").split("\t")[1:])
+
+            first = ""
+
+        lines: list[str] = [first] if first else f.readlines(MANIFEST_READ_SIZE)
+
+        while lines:  #read in batches of lines, iterating the file line by line is a lot slower with gzip
+            for line in lines:
+                digest, size, file = line.rstrip("\n").split("\t", 2)
+
+                if file <= previous:
+                    raise ValueError(f"{path} isn't sorted by path, {file} comes after {previous}")
+
+                previous = file
+
+                yield file, digest, int(size)
+
+            lines = f.readlines(MANIFEST_READ_SIZE)
+
+
+@dataclass
+class ManifestDiff:
+    r"""
+    Changes between two snapshots in a single data path, counted by diff_manifests.
+    """
+
+    data_path: str
+    added: int = 0
+    added_bytes: int = 0
+    deleted: int = 0
+    deleted_bytes: int = 0
+    modified: int = 0
+    modified_bytes: int = 0  #the size of the new versions
+    modified_delta: int = 0
+    examples: list[tuple[str, str]] = field(default_factory=list)  #up to DIFF_LISTED_FILES kinds and paths
+
+
+def diff_manifests(old_path: str, new_path: str) -> list[ManifestDiff]:
+    r"""
+    Compares two digest manifests with a single merge of their sorted entries, so it takes linear time and only keeps
+    the counters of each data path in memory, no matter how many files the snapshots have. A file is modified when its
+    digest or its size changed.
+
+    :param old_path:
+        The manifest of the previous snapshot.
+    :param new_path:
+        The manifest of the most recent snapshot, its data paths (when it's an archived copy) group the changes, or
+        the first directory of each path otherwise.
+
+    :return:
+        The changes of each data path that has any, sorted by the data path.
+    """
+
+    header: list[str] = []
+    old_entries: Iterator[tuple[str, str, int]] = read_manifest_entries(old_path)
+    new_entries: Iterator[tuple[str, str, int]] = read_manifest_entries(new_path, header)
+    old: Optional[tuple[str, str, int]] = next(old_entries, None)
+    new: Optional[tuple[str, str, int]] = next(new_entries, None)
+    prefixes: list[tuple[str, str]] = sorted(((data_path.strip("/") + "/", data_path) for data_path in header[1:]),
+                                             key=lambda prefix: -len(prefix[0]))  #the most specific data path first
+    groups: dict[str, ManifestDiff] = {}
+
+    def __group(path: str) -> ManifestDiff:
+        data_path: str = next((data_path for prefix, data_path in prefixes if path.startswith(prefix)),
+                              "/" + path.split("/", 1)[0])
+
+        if data_path not in groups:
+            groups[data_path] = ManifestDiff(data_path)
+
+        return groups[data_path]
+
+    def __example(group: ManifestDiff, kind: str, path: str) -> None:
+        if len(group.examples) < DIFF_LISTED_FILES:
+            group.examples.append((kind, path))
+
+    while old is not None or new is not None:
+        if new is None or old is not None and old[0] < new[0]:
+            group: ManifestDiff = __group(old[0])
+            group.deleted += 1
+            group.deleted_bytes += old[2]
+            __example(group, "-", old[0])
+            old = next(old_entries, None)
+
+        elif old is None or new[0] < old[0]:
+            group = __group(new[0])
+            group.added += 1
+            group.added_bytes += new[2]
+            __example(group, "+", new[0])
+            new = next(new_entries, None)
+
+        else:
+            if old[1] != new[1] or old[2] != new[2]:
+                group = __group(new[0])
+                group.modified += 1
+                group.modified_bytes += new[2]
+                group.modified_delta += new[2] - old[2]
+                __example(group, "~", new[0])
+
+            old = next(old_entries, None)
+            new = next(new_entries, None)
+
+    return [groups[data_path] for data_path in sorted(groups)]
+
+
+def select_diff_manifests(paths: list[str]) -> tuple[str, str]:
+    r"""
+    Finds the manifests given by the --diff argument: two manifest files, or a snapshot profile directory, then its
+    two most recent archived manifests are compared.
+
+    :raises ValueError:
+        If there aren't two manifests to compare.
+    """
+
+    if len(paths) == 2:
+        return paths[0], paths[1]
+
+    archive_dir: str = os.path.join(paths[0], MANIFEST_ARCHIVE_DIR)
+    archived: list[str] = sorted(name for name in os.listdir(archive_dir) if name.endswith(".txt.gz"))\
+                          if os.path.isdir(archive_dir) else []
+
+    if len(paths) != 1 or len(archived) < 2:
+        raise ValueError("--diff needs a snapshot profile directory with at least two archived manifests, or the paths"
+                         " of two manifests")
+
+    return os.path.join(archive_dir, archived[-2]), os.path.join(archive_dir, archived[-1])
+
+
+@traced("diff")
+def diff_snapshots(args: Namespace) -> None:
+    r"""
+    Reports what changed between two snapshots, for the --diff argument, without walking the snapshot directories:
+    the new, deleted and modified files of each data path, with the bytes involved and a few of their paths.
+
+    :param args:
+        Parsed user arguments.
+    """
+
+    try:
+        old_path, new_path = select_diff_manifests(args.diff)
+    except ValueError as err:
+        logger(str(err), ptype="fail")
+        return
+
+    total: ManifestDiff = ManifestDiff("total")
+    colors: dict[str, str] = {"+": "g", "-": "r", "~": "y"}
+
+    logger(f"Comparing [{old_path}] with [{new_path}]...", padding="both")
+
+    for diff in diff_manifests(old_path, new_path):
+        cprint(f"[c]{diff.data_path}[/]: [g]+{diff.added}[/] files ({format_size(diff.added_bytes)}),"
+               f" [r]-{diff.deleted}[/] ({format_size(diff.deleted_bytes)}), [y]~{diff.modified}[/]"
+               f" ({format_size(diff.modified_bytes)}, {'+' if diff.modified_delta >= 0 else '-'}"
+               f"{format_size(abs(diff.modified_delta))})")
+
+        for kind, path in diff.examples:
+            cprint(f"  [{colors[kind]}]{kind}[/] {path}")
+
+        if diff.added + diff.deleted + diff.modified > len(diff.examples):
+            cprint(f"  ... and {diff.added + diff.deleted + diff.modified - len(diff.examples)} more")
+
+        for counter in ["added", "added_bytes", "deleted", "deleted_bytes", "modified", "modified_bytes",
+                        "modified_delta"]:
+            setattr(total, counter, getattr(total, counter) + getattr(diff, counter))
+
+    logger(f"Total: {total.added} new files ({format_size(total.added_bytes)}), {total.deleted} deleted"
+           f" ({format_size(total.deleted_bytes)}) and {total.modified} modified ({format_size(total.modified_bytes)})",
+           ptype="good", padding="both")
+
+
+
+def report_failure_manifest(manifest: FailureManifest, manifest_paths: list[str]) -> None:
+    r"""
+    Logs how many files were mirrored and, if some failed, where their manifests were saved.
+    """
+
+    if not manifest.failures:
+        logger(f"All the {manifest.succeeded} files were mirrored", ptype="good")
+        return
+
+    logger(f"{len(manifest.failures)} files failed ({manifest.succeeded} mirrored)", ptype="fail")
+    cprint("Use [c]--retry-failed[/] with one of these manifests to transfer only the failed files:")
+
+    for path in manifest_paths:
+        cprint(f"  [y]{path}[/]")
+
+
+def main(usr_args: list[str]) -> None:
+    args: Namespace = parse_user_arguments(usr_args)
+    config: SyncConfig = {}
+    ftp_root: str = "/"
+
+    MODE_Z.policy = args.compress
+    SEGMENTED.segments = args.segments
+    start_instrumentation("mkftp_android_snapshot", args.trace, args.profile)
+
+    if args.retry_failed is not None:
+        retry_failed_files(args)
+        input()
+        return
+
+    if args.restore is not None:
+        restore_snapshot(args)
+        input()
+        return
+
+    if args.diff is not None:
+        diff_snapshots(args)
+        return
+
+    if args.devices is not None:
+        snapshot_devices(args)
+        input()
+        return
+
+    if args.watch is not None:
+        watch_device(args)
+        return
+
+    with ftp_connect(args.host, args.port, args.username, args.password, timeout=args.timeout) as ftp:
+        config = get_json_config_content(ftp, args.sync_config_file)
+        ftp_root = ftp.pwd()
+
+    menu: dict[str, str] = {}
+
+    for profile_name, profile in config.items():
+        menu[profile_name] = profile["Title"]
+
+    profile_name: str
+    _, profile_name, _ = display_options_menu("ANDROID FTP BACKUP\n- select a backup profile", menu)
+    profile: BackupProfile = config[profile_name]
+
+    clear()
+
+    exclude: list[str] = normalize_profile_paths(profile, ftp_root)
+
+    if args.plan:
+        plan_snapshot(profile_name, profile, exclude, args)
+        input()
+        return
+
+    logger("Everything is OK, starting the mirror process...", ptype="good", padding="both")
+
+    writer: Optional[DiskWriter] = create_disk_writer(args.write_buffer)
+    benchmark_start: float = time()
+
+    manifests: dict[str, FailureManifest] = snapshot_profile(profile_name, profile, exclude, args.targets, args.host,
+                                                             args.port, args.username, args.password, args.timeout,
+                                                             PROCS, args, writer)
 
+    close_disk_writer(writer)
     benchmark: float = time() - benchmark_start
 
+    for target, manifest in manifests.items():
+        cprint(f"[c]{target}[/]:")
+        report_failure_manifest(manifest, [os.path.join(target, profile_name, FAILURE_MANIFEST_NAME)])
     logger(f"Backup finished in {benchmark:.2f} seconds", ptype="pass", padding="both")
     input()
 
@@ -1,19 +1,82 @@
 from typing import Callable
-from num2words import num2words
 from random import choice
 from os import system, name
-from time import time
-from datetime import datetime
+from time import time, localtime
+from array import array
+from itertools import accumulate
+from contextlib import nullcontext
+import json, os, sys, zlib
+
+try:  #optional span timers and profiler, enabled with the SCRIPTS_TRACE environment variable
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "share", "python"))
+    from instrumentation import span, traced, start_instrumentation
+except ImportError:
+    span = lambda name, **args: nullcontext()
+    traced = lambda name: lambda function: function
+    start_instrumentation = lambda *args, **key_args: False
 
 EXCLUDE_DLMTR = ","
 MAX_WORD_RESULT = 100
-WORD_NUMS = [num2words(n, lang="ptbr").replace("ê", "e")  #removes the only accent mark from 'três'
-             for n in range(MAX_WORD_RESULT + 1)]
+WORDS_LANG = "ptbr"
+WORDS_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "multiplication_trainer.words.json")
 LOG_FILE = r"C:\Users\kevin\Desktop\data\datasets\logger\multiplication_trainer.log.txt"
+HISTORY_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "multiplication_trainer.history")
+HISTORY_COLUMNS = {"timestamp": "d", "cases": "H", "correct": "H", "duration": "f"}  #array type codes
+HISTORY_SPARKLINE = 30
+ROLLING_WINDOW = 10
+SPARK_CHARS = " .:-=+*#"
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+word_nums = None  #see get_word_nums
 
 #todo: put the 'F'/'P' of the results.txt file into variables too
 
 
+@traced("words")
+def load_number_words(numbers: list[int], lang: str = WORDS_LANG) -> dict[int, str]:
+    #num2words takes longer to import than the rest of the script, so the words are read from a cache file (the same
+    #one of the multiplication_trainer_game command) and num2words is only imported for the numbers that are missing
+    cache = {}
+
+    try:
+        with open(WORDS_CACHE_FILE, "r", encoding="utf-8") as cachef:
+            cache = json.load(cachef)
+    except (OSError, ValueError):
+        pass
+
+    words = cache.setdefault(lang, {})
+    missing = [n for n in numbers if str(n) not in words]
+
+    if missing:
+        from num2words import num2words
+
+        words.update({str(n): num2words(n, lang=lang) for n in missing})
+
+        try:
+            os.makedirs(os.path.dirname(WORDS_CACHE_FILE), exist_ok=True)
+
+            with open(f"{WORDS_CACHE_FILE}.tmp", "w", encoding="utf-8") as cachef:
+                json.dump(cache, cachef, ensure_ascii=False)
+
+            os.replace(f"{WORDS_CACHE_FILE}.tmp", WORDS_CACHE_FILE)
+        except OSError:
+            pass
+
+    return {n: words[str(n)] for n in numbers}
+
+
+def get_word_nums() -> list[str]:
+    #the WORD_NUMS list used to be built when the module was imported, now it's only built (from the words cache) the
+    #first time it's asked for
+    global word_nums
+
+    if word_nums is None:
+        words = load_number_words(list(range(MAX_WORD_RESULT + 1)))
+        word_nums = [words[n].replace("ê", "e")  #removes the only accent mark from 'três'
+                     for n in range(MAX_WORD_RESULT + 1)]
+
+    return word_nums
+
+
 def display_all_results(log_file: str) -> None:
     with open(log_file, "r") as logf:
         for line in [l[:-1] for l in logf.readlines()]:
@@ -27,6 +90,162 @@ def display_all_results(log_file: str) -> None:
             print(f"{timestamp_str} {results_str} {duration_str}")
 
 
+def load_history_columns(log_lines: list[bytes]) -> dict[str, array]:
+    from datetime import datetime
+
+    columns = {column: array(code) for column, code in HISTORY_COLUMNS.items()}
+
+    for line in log_lines:
+        timestamp, results, duration = line.decode().split(" ")
+
+        columns["timestamp"].append(datetime.fromisoformat(timestamp.replace("_", " ")).timestamp())
+        columns["cases"].append(len(results))
+        columns["correct"].append(results.count("P"))
+        columns["duration"].append(float(duration))
+
+    return columns
+
+
+def update_history_aggregates(aggregates: dict, columns: dict[str, array], first: int) -> None:
+    #the totals, the weekday stats and the sums of the least squares trend lines only need the new sessions, so they
+    #are kept in the cache instead of being computed again from every session
+    trend = aggregates.setdefault("Trend", [0.0] * 7)  #n, sum of x, x*x, accuracy, x*accuracy, duration, x*duration
+    weekdays = aggregates.setdefault("Weekdays", [[0, 0, 0, 0.0] for _ in range(7)])  #sessions, correct, cases, secs
+
+    for x, (timestamp, cases, correct, duration) in enumerate(zip(columns["timestamp"], columns["cases"],
+                                                                 columns["correct"], columns["duration"]),
+                                                             start=first):
+        accuracy = correct / cases if cases else 0
+        weekday = weekdays[localtime(timestamp).tm_wday]
+
+        for i, value in enumerate([1, x, x * x, accuracy, x * accuracy, duration, x * duration]):
+            trend[i] += value
+
+        weekday[0] += 1
+        weekday[1] += correct
+        weekday[2] += cases
+        weekday[3] += duration
+
+
+def load_history(log_file: str, cache_dir: str = HISTORY_CACHE_DIR) -> tuple[dict[str, array], dict]:
+    #the sessions are kept as binary columns in the cache directory, with the offset of the log file that was already
+    #read, so each call only parses the sessions appended since the last one; a log that shrank, or that was modified
+    #and whose part already read has another CRC-32, was rewritten and is read again from the start
+    meta_file = os.path.join(cache_dir, "aggregates.json")
+    log_mtime = os.stat(log_file).st_mtime_ns
+    meta = {}
+
+    try:
+        with open(meta_file, "r") as metaf:
+            meta = json.load(metaf)
+    except (OSError, ValueError):
+        pass
+
+    if meta.get("Log") != os.path.abspath(log_file) or meta.get("Offset", 0) > os.path.getsize(log_file):
+        meta = {"Log": os.path.abspath(log_file), "Offset": 0, "Sessions": 0, "Aggregates": {}}
+
+    columns = {column: array(code) for column, code in HISTORY_COLUMNS.items()}
+
+    try:
+        for column, values in columns.items():
+            with open(os.path.join(cache_dir, f"{column}.bin"), "rb") as columnf:
+                values.fromfile(columnf, meta["Sessions"])
+    except (OSError, EOFError):  #missing or truncated columns, everything is read again
+        meta = {"Log": os.path.abspath(log_file), "Offset": 0, "Sessions": 0, "Aggregates": {}}
+        columns = {column: array(code) for column, code in HISTORY_COLUMNS.items()}
+
+    with open(log_file, "rb") as logf:
+        if log_mtime == meta.get("Mtime"):
+            logf.seek(meta["Offset"])
+        elif zlib.crc32(logf.read(meta["Offset"])) != meta.get("Crc", 0):
+            meta = {"Log": os.path.abspath(log_file), "Offset": 0, "Sessions": 0, "Aggregates": {}}
+            columns = {column: array(code) for column, code in HISTORY_COLUMNS.items()}
+            logf.seek(0)
+
+        tail = logf.read()
+
+    tail = tail[:tail.rfind(b"\n") + 1]  #a line that is still being written is left for the next call
+    new_columns = load_history_columns(tail.splitlines())
+
+    if not tail:
+        return columns, meta["Aggregates"]
+
+    update_history_aggregates(meta["Aggregates"], new_columns, meta["Sessions"])
+    os.makedirs(cache_dir, exist_ok=True)
+
+    for column, values in new_columns.items():
+        with open(os.path.join(cache_dir, f"{column}.bin"), "r+b" if meta["Sessions"] else "wb") as columnf:
+            columnf.seek(meta["Sessions"] * values.itemsize)  #drops anything after the last session of the meta
+            columnf.truncate()
+            values.tofile(columnf)
+
+        columns[column].extend(values)
+
+    meta["Offset"] += len(tail)
+    meta["Crc"] = zlib.crc32(tail, meta.get("Crc", 0))
+    meta["Mtime"] = log_mtime
+    meta["Sessions"] += len(new_columns["cases"])
+
+    with open(f"{meta_file}.tmp", "w") as metaf:
+        json.dump(meta, metaf)
+
+    os.replace(f"{meta_file}.tmp", meta_file)
+    return columns, meta["Aggregates"]
+
+
+def summarize_history(columns: dict[str, array], aggregates: dict, window: int = ROLLING_WINDOW) -> dict:
+    #each statistic is one pass over the columns (prefix sums, one sort for the median), the trend and weekday
+    #sums come from the cached aggregates, which load_history only updates with the new sessions
+    sessions = len(columns["cases"])
+
+    if sessions == 0:
+        return {"sessions": 0}
+
+    correct_sums = list(accumulate(columns["correct"], initial=0))
+    cases_sums = list(accumulate(columns["cases"], initial=0))
+    window = min(window, sessions)
+    rolling = [(c1 - c0) / ((n1 - n0) or 1) for c1, c0, n1, n0 in zip(correct_sums[window:], correct_sums,
+                                                                        cases_sums[window:], cases_sums)]
+    durations = sorted(columns["duration"])
+    median_duration = (durations[(sessions - 1) // 2] + durations[sessions // 2]) / 2
+
+    n, sx, sxx, sy, sxy, sd, sxd = aggregates["Trend"]
+    denominator = n * sxx - sx * sx
+
+    return {
+        "sessions": sessions,
+        "accuracy": correct_sums[-1] / (cases_sums[-1] or 1),
+        "rolling_accuracy": rolling,
+        "median_duration": median_duration,
+        "accuracy_trend": (n * sxy - sx * sy) / denominator if denominator else 0,  #per session
+        "duration_trend": (n * sxd - sx * sd) / denominator if denominator else 0,
+        "weekdays": [(sessions_, correct / (cases or 1), secs / (sessions_ or 1))
+                     for sessions_, correct, cases, secs in aggregates["Weekdays"]],
+    }
+
+
+def display_history_summary(log_file: str) -> None:
+    summary = summarize_history(*load_history(log_file))
+
+    if summary["sessions"] == 0:
+        return
+
+    recent = summary["rolling_accuracy"][-HISTORY_SPARKLINE:]
+    low, high = min(recent), max(recent)  #the sparkline is relative to the range shown, or it would be flat near 100%
+    sparkline = "".join(SPARK_CHARS[round((a - low) / ((high - low) or 1) * (len(SPARK_CHARS) - 1))] for a in recent)
+
+    print(f"\n\033[33msessions\033[m {summary['sessions']}  \033[33maccuracy\033[m {summary['accuracy']:.1%}  "
+          f"\033[33mmedian\033[m {summary['median_duration']:.2f} secs")
+    print(f"\033[33mrolling accuracy\033[m ({ROLLING_WINDOW} sessions) \033[32m{sparkline}\033[m "
+          f"{summary['rolling_accuracy'][-1]:.1%}")
+    print(f"\033[33mtrend\033[m {summary['accuracy_trend'] * 100:+.2%} accuracy and "
+          f"{summary['duration_trend'] * 100:+.2f} secs every 100 sessions")
+
+    for weekday, (sessions, accuracy, duration) in zip(WEEKDAYS, summary["weekdays"]):
+        if sessions:
+            print(f"\033[30m{weekday}\033[m {sessions:>6} sessions {accuracy:>7.1%} {duration:>8.2f} secs")
+
+
 def clear() -> None:
     if name == "nt":
         system("cls")
@@ -44,6 +263,8 @@ def get_multiply_numbers(nums: list[int], exclude_func: Callable) -> tuple[int,
 
 
 def main() -> None:
+    start_instrumentation("multiplication_trainer")
+
     exclude = "1,2,5,10"
     exclude_func = lambda c: c[0] == c[1]
     end = 10
@@ -53,11 +274,12 @@ def main() -> None:
             if n not in (int(e) for e in exclude.split(EXCLUDE_DLMTR))]
 
     test_cases = []
+    all_multiply_numbers = [get_multiply_numbers(nums, exclude_func) for _ in range(case_count)]
+    words = load_number_words(sorted({x * y for x, y in all_multiply_numbers}))
 
-    for _ in range(case_count):
-        multiply_numbers = get_multiply_numbers(nums, exclude_func)
+    for multiply_numbers in all_multiply_numbers:
         correct_result = multiply_numbers[0] * multiply_numbers[1]
-        possible_results = str(correct_result), num2words(correct_result, lang="ptbr")
+        possible_results = str(correct_result), words[correct_result]
 
         test_cases.append((multiply_numbers, possible_results))
 
@@ -71,7 +293,9 @@ def main() -> None:
         test_nums, possible_results = test_case
         prompt_str = f"{past_result_str} \033[32m$\033[m {test_nums[0]} * {test_nums[1]} \033[33m:\033[m "
 
-        user_input = input(prompt_str)
+        with span("challenge", case=f"{test_nums[0]} * {test_nums[1]}"):
+            user_input = input(prompt_str)
+
         is_correct = user_input in possible_results
 
         if is_correct:
@@ -86,7 +310,9 @@ def main() -> None:
     timer_end = time()
     becnhmark = timer_end - timer_begin
 
-    with open(LOG_FILE, "r+") as logf:
+    from datetime import datetime
+
+    with span("log"), open(LOG_FILE, "r+") as logf:
         logf.read()
 
         current_time = str(datetime.now()).replace(" ", "_")
@@ -96,6 +322,7 @@ def main() -> None:
         logf.write(f"{current_time} {results_str} {becnhmark_str}\n")
 
     display_all_results(LOG_FILE)
+    display_history_summary(LOG_FILE)
     input("\n\nPress any key to continue...")
 
 
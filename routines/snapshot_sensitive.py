@@ -1,51 +1,134 @@
 from typing import Optional
 from datetime import datetime
 from getpass import getpass
-import json, os
+from time import perf_counter
+from contextlib import nullcontext
+import asyncio, json, os, sys
+
+try:  #optional span timers and profiler, enabled with the SCRIPTS_TRACE environment variable
+  sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "share", "python"))
+  from instrumentation import span, start_instrumentation
+except ImportError:
+  span = lambda name, **args: nullcontext()
+  start_instrumentation = lambda *args, **key_args: False
 
 FSINFO_MUST_INCLUDE_FILES_BACKUP_JSON: str = r"C:\Users\kevin\Desktop\data\datasets\fsinfo\must_include_files.backup.json"
 
+COPY_FILE_COMMAND: str = 'COPY "{source}" "{target}"'
+COPY_DIR_COMMAND: str = 'XCOPY "{source}" "{target}\\{group}\\{source_name}" /E /I'
+COMPRESS_COMMAND: str = '7z a -t7z -mx=9 -m0=lzma2 "{target}.7z" "{target}"'
+CLEANUP_COMMAND: str = 'RMDIR "{target}" /S /Q'
+
+STAGES: list[str] = ["copy", "compress", "cleanup"]
+STAGE_LIMITS: dict[str, int] = {"copy": 1, "compress": 1, "cleanup": 2}  #the copies share a disk, 7z uses every core
+OK_EXIT_CODES: dict[str, list[int]] = {"copy": [0], "compress": [0, 1], "cleanup": [0]}  #7z warnings exit with 1
+
 backup_data: Optional[str] = None
 archive_name: Optional[str] = None
+timeline: list[tuple[str, str, float, float, bool]] = []  #target, stage, start, end and if it succeeded
+pipeline_start: float = 0
 
 
-## get file information from the json data file
+async def run_command(stage: str, command: str) -> bool:
+  #the windows commands are cmd.exe builtins, so they're run with the shell like os.system did; the output is
+  #dropped because the stages run at the same time and it would be mixed up, the errors are still shown
+  process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.DEVNULL)
+  exit_code = await process.wait()
 
-with open(FSINFO_MUST_INCLUDE_FILES_BACKUP_JSON) as file:
-  file_content = file.read()
-  backup_data = json.loads(file_content)["windows"]
-  archive_name = datetime.now().strftime(backup_data["prefix"]) + backup_data["sufix"]
+  if exit_code not in OK_EXIT_CODES[stage]:
+    print(f"[ERRO]: the {stage} stage failed with exit code {exit_code}: {command}")
+    return False
 
-backup_data["target"] = list(map(lambda t: os.path.join(t, archive_name),  #include the archive name for each path
-                                 filter(lambda t: os.path.isdir(t),
-                                        backup_data["target"])))
+  return True
 
 
-## create the base target directory with windows system commands
+async def run_stage(stage: str, target: str, commands: list[str], limits: dict[str, asyncio.Semaphore]) -> bool:
+  async with limits[stage]:
+    start = perf_counter() - pipeline_start
+    succeeded = True
 
-for target in backup_data["target"]:
-  os.system(f'MKDIR "{target}"')
+    with span(stage, target=target):
+      for command in commands:  #keeps going after a failed command, so every problem is reported at once
+        succeeded = await run_command(stage, command) and succeeded
 
+    timeline.append((target, stage, start, perf_counter() - pipeline_start, succeeded))
 
-## iterate for each group and copy every file/folder to the target
+  return succeeded
 
-for group, sources in backup_data["files"].items():
-  for target in backup_data["target"]:
+
+def copy_commands(target: str) -> list[str]:
+  commands = []
+
+  for group, sources in backup_data["files"].items():
     for source in sources:
 
       if os.path.isfile(source):
-        os.system(f'COPY "{source}" "{target}"')
+        commands.append(COPY_FILE_COMMAND.format(source=source, target=target))
 
       elif os.path.isdir(source):
         source_name = os.path.basename(source)
-        os.system(f'XCOPY "{source}" "{target}\\{group}\\{source_name}" /E /I')
+        commands.append(COPY_DIR_COMMAND.format(source=source, target=target, group=group, source_name=source_name))
 
       else:
         print(f"[ERRO]: this script only works with files/dirs, the file {source} type is invalid")
 
+  return commands
+
+
+async def snapshot_target(target: str, limits: dict[str, asyncio.Semaphore]) -> None:
+  #each target goes through the stages on its own, so the compression of a target runs while the next one is being
+  #copied; a target is only removed after 7z succeeded, and it's only compressed if every copy succeeded
+  os.makedirs(target, exist_ok=True)
+
+  if not await run_stage("copy", target, copy_commands(target), limits):
+    return
+
+  if not await run_stage("compress", target, [COMPRESS_COMMAND.format(target=target)], limits):
+    return
+
+  await run_stage("cleanup", target, [CLEANUP_COMMAND.format(target=target)], limits)
+
+
+async def run_pipeline(targets: list[str], stage_limits: dict[str, int]) -> None:
+  global pipeline_start
+
+  pipeline_start = perf_counter()
+  limits = {stage: asyncio.Semaphore(stage_limits[stage]) for stage in STAGES}
+
+  await asyncio.gather(*(snapshot_target(target, limits) for target in targets))
+
+
+def print_timeline(width: int = 40) -> None:
+  total = max([end for _, _, _, end, _ in timeline], default=0) or 1
+
+  for target, stage, start, end, succeeded in sorted(timeline, key=lambda t: t[2]):
+    bar = " " * round(start / total * width) + "#" * max(1, round((end - start) / total * width))
+    status = "done" if succeeded else "FAIL"
+
+    print(f"{stage:<8} |{bar:<{width + 1}}| {start:>8.1f}s {end - start:>8.1f}s  {status}  {target}")
+
+
+start_instrumentation("snapshot_sensitive")
+
+
+## get file information from the json data file
+
+with open(FSINFO_MUST_INCLUDE_FILES_BACKUP_JSON) as file:
+  file_content = file.read()
+  backup_data = json.loads(file_content)["windows"]
+  archive_name = datetime.now().strftime(backup_data["prefix"]) + backup_data["sufix"]
+
+backup_data["target"] = list(map(lambda t: os.path.join(t, archive_name),  #include the archive name for each path
+                                 filter(lambda t: os.path.isdir(t),
+                                        backup_data["target"])))
+
+
+## copy every group into each target, compress it with 7zip and remove the copy, as a pipeline of stages where the
+## optional "limits" of the json data file override how many targets can be in each stage at the same time
+
+asyncio.run(run_pipeline(backup_data["target"], STAGE_LIMITS | backup_data.get("limits", {})))
+
 
-## Use the 7zip program to compress the generated snapshot
+## report the timeline of each stage
 
-for target in backup_data["target"]:
-  os.system(f'7z a -t7z -mx=9 -m0=lzma2 "{target}.7z" "{target}"')
-  os.system(f'RMDIR "{target}" /S /Q')
\ No newline at end of file
+print_timeline()
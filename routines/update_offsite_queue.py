@@ -1,9 +1,23 @@
 from typing import Optional
 from getpass import getpass
-import json, os, re
+from datetime import datetime
+from contextlib import nullcontext
+import hashlib, json, os, re, sys
+
+try:  #optional span timers and profiler, enabled with the SCRIPTS_TRACE environment variable
+  sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "share", "python"))
+  from instrumentation import span, start_instrumentation
+except ImportError:
+  span = lambda name, **args: nullcontext()
+  start_instrumentation = lambda *args, **key_args: False
 
 OFFSITE_ARCHIVE_INFO: str = r"C:\Users\kevin\Desktop\data\datasets\fsinfo\offsite_archive_info.backup.json"
+OFFSITE_QUEUE_STATE: str = r"C:\Users\kevin\Desktop\data\datasets\fsinfo\offsite_queue.state.json"
 offsite_info: Optional[dict] = None
+queue_state: dict[str, dict] = {}
+
+
+start_instrumentation("update_offsite_queue")
 
 
 ## GET THE JSON CONFIGURATION DICTIONARY
@@ -17,6 +31,45 @@ if offsite_info is None:
   exit(1)
 
 
+## GET THE STATE OF THE ARCHIVES THAT WERE ALREADY QUEUED
+
+try:
+  with open(OFFSITE_QUEUE_STATE) as file:
+    queue_state = json.load(file)
+except (OSError, ValueError):  #first run, or a broken state file, everything is queued again
+  pass
+
+
+def save_queue_state() -> None:
+  with open(f"{OFFSITE_QUEUE_STATE}.tmp", "w") as file:  #replaced at once, so an interrupted run can't break it
+    json.dump(queue_state, file, indent=2)
+
+  os.replace(f"{OFFSITE_QUEUE_STATE}.tmp", OFFSITE_QUEUE_STATE)
+
+
+def archive_fingerprint(archive: str, content_hash: bool = False) -> list:
+  #the size, file count and newest modify time of the whole tree, only with stat calls; the "hash" option of the
+  #config adds a digest of the contents, for sources whose modify times can't be trusted
+  size, count, newest = 0, 0, 0
+  hasher = hashlib.blake2b() if content_hash else None
+  paths = [archive] if os.path.isfile(archive) else sorted(os.path.join(directory, name)
+                                                           for directory, _, names in os.walk(archive)
+                                                           for name in names)
+
+  for path in paths:
+    stat = os.stat(path)
+    size, count, newest = size + stat.st_size, count + 1, max(newest, stat.st_mtime_ns)
+
+    if hasher is not None:
+      hasher.update(os.path.relpath(path, archive).encode())
+
+      with open(path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+          hasher.update(chunk)
+
+  return [size, count, newest] + ([hasher.hexdigest()] if hasher is not None else [])
+
+
 def user_passwd() -> str:
   while True:
     passwd = getpass("Create a encryption password (Ctrl+Shift+V to paste): ")
@@ -27,23 +80,84 @@ def user_passwd() -> str:
       return passwd
 
 
-password = user_passwd()
+## FIND THE NEW OR MODIFIED ARCHIVES, THE UNCHANGED ONES ARE SKIPPED WITHOUT RUNNING 7Z
 
+exclude_pattern = re.compile(offsite_info["exclude"])
+queue = []  #archive, fingerprint and the targets that it should be compressed to
 
 for archives_dir in offsite_info["paths"]["archives"]:
   if not os.path.isdir(archives_dir):
     continue
 
   for archive_name in os.listdir(archives_dir):
-    if re.match(offsite_info["exclude"], archive_name):
+    if exclude_pattern.match(archive_name):
       continue
 
     archive = os.path.join(archives_dir, archive_name)
-    
+
+    with span("fingerprint", archive=archive):
+      fingerprint = archive_fingerprint(archive, offsite_info.get("hash", False))
+
+    state = queue_state.get(archive, {})
+    targets = []
+
     for target_dir in offsite_info["paths"]["offqueue"]:
       if not os.path.isdir(target_dir):
         continue
 
       target = os.path.join(target_dir, archive_name) + ".7z"
 
-      os.system(f'7z a -t7z -mx=9 -m0=lzma2 -p"{password}" "{target}" "{archive}" && RMDIR {archive} /S /Q')
\ No newline at end of file
+      if state.get("Fingerprint") == fingerprint and target in state.get("Outputs", []):
+        print(f"[SKIP]: {archive} didn't change since it was queued to {target}")
+        continue
+
+      targets.append(target)
+
+    if targets:
+      queue.append((archive, fingerprint, targets))
+
+
+## COMPRESS AND ENCRYPT THE QUEUED ARCHIVES
+
+if queue:
+  password = user_passwd()
+
+for archive, fingerprint, targets in queue:
+  queued = []
+
+  for target in targets:
+    with span("compress", archive=archive, target=target):
+      exit_code = os.system(f'7z a -t7z -mx=9 -m0=lzma2 -p"{password}" "{target}" "{archive}"')
+
+    if exit_code != 0:  #not saved in the state, so it's tried again on the next run
+      print(f"[ERRO]: failed to queue {archive} to {target}, exit code {exit_code}")
+      continue
+
+    queued.append(target)
+
+  if not queued:
+    continue
+
+  state = queue_state.setdefault(archive, {})
+
+  if state.get("Fingerprint") != fingerprint:
+    state["Fingerprint"], state["Outputs"] = fingerprint, []
+
+  state["Outputs"] = sorted(set(state["Outputs"] + queued))
+  state["Queued"] = datetime.now().isoformat(timespec="seconds")
+
+  save_queue_state()
+
+  if queued == targets and os.path.isdir(archive):  #only removed once it's in every queue
+    os.system(f'RMDIR {archive} /S /Q')
+
+
+## FORGET THE ARCHIVES THAT WERE REMOVED AND ARE NOT IN ANY QUEUE ANYMORE
+
+#the directory archives are removed above once they're queued, their state is kept while one of their outputs is still
+#waiting in a queue, so a directory that comes back unchanged in the meantime isn't compressed again
+for archive in [archive for archive, state in queue_state.items() if not os.path.exists(archive)
+                and not any(os.path.exists(output) for output in state.get("Outputs", []))]:
+  del queue_state[archive]
+
+save_queue_state()
@@ -0,0 +1,488 @@
+from typing import Any, Optional
+from argparse import ArgumentParser, Namespace
+from socketserver import ThreadingTCPServer, StreamRequestHandler
+from threading import Lock
+from time import sleep, strftime, strptime, gmtime
+from calendar import timegm
+from json import dumps
+from sys import argv
+import hashlib, socket, random, os, zlib
+
+
+LINK_PROFILES: dict[str, dict[str, float]] = {
+    "loopback":  {"latency": 0.0,   "drop_rate": 0.0},
+    "wifi":      {"latency": 0.004, "drop_rate": 0.001},
+    "bad-wifi":  {"latency": 0.030, "drop_rate": 0.010},
+}
+DATA_CHUNK_SIZE: int = 64 * 1024
+
+
+class FTPStandinServer(ThreadingTCPServer):
+    r"""
+    Minimal FTP server, only meant to stand in for the phone on the loopback interface when benchmarking the mirror
+    routines. It serves (and accepts uploads to) a local directory, supports the passive mode only and can simulate a
+    slow link by delaying every control reply and randomly aborting data transfers.
+
+    :ivar root:
+        Local directory that is served as the FTP root.
+    :ivar latency:
+        Seconds to wait before sending each control connection reply, simulating the round trip time.
+    :ivar drop_rate:
+        Probability, between 0 and 1, of aborting a RETR/STOR data transfer in the middle of it.
+    :ivar commands:
+        Count of the commands received by the server (all sessions), by command name.
+    """
+
+    daemon_threads: bool = True
+    allow_reuse_address: bool = True
+    request_queue_size: int = 128  #the default of 5 drops the connections of the bigger benchmark runs
+
+    root: str
+    latency: float
+    drop_rate: float
+    commands: dict[str, int]
+
+    def __init__(self, address: tuple[str, int], root: str, latency: float = 0, drop_rate: float = 0,
+                 seed: Optional[int] = None):
+        super().__init__(address, FTPStandinHandler)
+
+        self.root = os.path.realpath(root)
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.commands = {}
+        self.random = random.Random(seed)
+        self.lock = Lock()
+
+    def count_command(self, command: str) -> None:
+        with self.lock:
+            self.commands[command] = self.commands.get(command, 0) + 1
+
+    def should_drop(self) -> bool:
+        with self.lock:
+            return self.drop_rate > 0 and self.random.random() < self.drop_rate
+
+
+class FTPStandinHandler(StreamRequestHandler):
+    r"""
+    Handles one FTP control connection of the FTPStandinServer.
+    """
+
+    server: FTPStandinServer
+
+    def setup(self) -> None:
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.cwd: str = "/"
+        self.rest: int = 0
+        self.mode: str = "S"
+        self.pasv_socket: Optional[socket.socket] = None
+
+    def reply(self, line: str) -> None:
+        if self.server.latency:
+            sleep(self.server.latency)
+
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def local_path(self, ftp_path: str) -> Optional[str]:
+        virtual_path: str = os.path.normpath(os.path.join(self.cwd, ftp_path or ".")).replace("\\", "/")
+        local: str = os.path.realpath(os.path.join(self.server.root, virtual_path.lstrip("/")))
+
+        return local if local == self.server.root or local.startswith(self.server.root + os.sep) else None
+
+    def open_data_connection(self) -> Optional[socket.socket]:
+        if self.pasv_socket is None:
+            self.reply("425 Use PASV or EPSV first.")
+            return None
+
+        try:
+            self.pasv_socket.settimeout(10)
+            conn, _ = self.pasv_socket.accept()
+        except OSError:
+            self.reply("425 Can't open data connection.")
+            return None
+        finally:
+            self.pasv_socket.close()
+            self.pasv_socket = None
+
+        return conn
+
+    def send_data(self, payload: bytes) -> None:
+        conn: Optional[socket.socket] = self.open_data_connection()
+
+        if conn is None:
+            return
+
+        self.reply("150 Opening data connection.")
+
+        with conn:
+            conn.sendall(payload)
+
+        self.reply("226 Transfer complete.")
+
+    def handle(self) -> None:
+        self.reply("220 FTP stand-in server ready.")
+
+        while True:
+            try:
+                line: str = self.rfile.readline().decode("utf-8", "replace")
+            except OSError:
+                return
+
+            if not line:
+                return
+
+            command, _, arg = line.rstrip("\r\n").partition(" ")
+            command = command.upper()
+            self.server.count_command(command)
+            method: Any = getattr(self, f"ftp_{command}", None)
+
+            if method is None:
+                self.reply(f"502 Command {command} not implemented.")
+                continue
+
+            try:
+                if method(arg) is False:
+                    return
+            except OSError as err:
+                self.reply(f"550 {err.strerror or err}.")
+
+    #authentication and session commands
+
+    def ftp_USER(self, arg: str) -> None:
+        self.reply("331 Password required.")
+
+    def ftp_PASS(self, arg: str) -> None:
+        self.reply("230 Logged in.")
+
+    def ftp_QUIT(self, arg: str) -> bool:
+        self.reply("221 Bye.")
+        return False
+
+    def ftp_NOOP(self, arg: str) -> None:
+        self.reply("200 OK.")
+
+    def ftp_SYST(self, arg: str) -> None:
+        self.reply("215 UNIX Type: L8")
+
+    def ftp_FEAT(self, arg: str) -> None:
+        self.wfile.write(b"211-Features:\r\n HASH SHA-256*\r\n MDTM\r\n MFMT\r\n MLST type*;size*;modify*;\r\n MODE Z\r\n REST STREAM\r\n"
+                         b" SIZE\r\n UTF8\r\n XCRC\r\n")
+        self.reply("211 End")
+
+    def ftp_OPTS(self, arg: str) -> None:
+        self.reply("200 OK.")
+
+    def ftp_TYPE(self, arg: str) -> None:
+        self.reply(f"200 Type set to {arg}.")
+
+    def ftp_MODE(self, arg: str) -> None:
+        if arg.upper() not in ["S", "Z"]:
+            self.reply("504 Mode not supported.")
+            return
+
+        self.mode = arg.upper()
+        self.reply(f"200 Mode set to {self.mode}.")
+
+    def ftp_SITE(self, arg: str) -> None:
+        if arg.upper() != "STATS":
+            self.reply("504 SITE command not supported.")
+            return
+
+        with self.server.lock:
+            stats: str = dumps(self.server.commands)
+
+        self.reply(f"200 {stats}")
+
+    #navigation commands
+
+    def ftp_PWD(self, arg: str) -> None:
+        self.reply(f'257 "{self.cwd}" is the current directory.')
+
+    def ftp_CWD(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.isdir(local):
+            self.reply(f"550 {arg}: No such directory.")
+            return
+
+        relative_path: str = os.path.relpath(local, self.server.root).replace("\\", "/")
+        self.cwd = "/" if relative_path == "." else f"/{relative_path}"
+        self.reply("250 Directory changed.")
+
+    def ftp_CDUP(self, arg: str) -> None:
+        self.ftp_CWD("..")
+
+    def ftp_PASV(self, arg: str) -> None:
+        self.pasv_socket = socket.create_server(("127.0.0.1", 0))
+        port: int = self.pasv_socket.getsockname()[1]
+
+        self.reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 0xFF}).")
+
+    def ftp_EPSV(self, arg: str) -> None:
+        self.pasv_socket = socket.create_server(("127.0.0.1", 0))
+        self.reply(f"229 Entering Extended Passive Mode (|||{self.pasv_socket.getsockname()[1]}|).")
+
+    #listing and information commands
+
+    def ftp_NLST(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.exists(local):
+            self.reply(f"550 {arg}: No such file or directory.")
+            return
+
+        names: list[str] = sorted(os.listdir(local)) if os.path.isdir(local) else [arg]
+        self.send_data("".join(f"{name}\r\n" for name in names).encode())
+
+    def ftp_LIST(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg if not arg.startswith("-") else "")
+
+        if local is None or not os.path.isdir(local):
+            self.reply(f"550 {arg}: No such directory.")
+            return
+
+        lines: list[str] = []
+
+        for entry in sorted(os.scandir(local), key=lambda e: e.name):
+            stat: os.stat_result = entry.stat()
+            kind: str = "d" if entry.is_dir() else "-"
+            lines.append(f"{kind}rw-r--r-- 1 user group {stat.st_size:>12} "
+                         f"{strftime('%b %d %H:%M', gmtime(stat.st_mtime))} {entry.name}\r\n")
+
+        self.send_data("".join(lines).encode())
+
+    def mlsx_facts(self, local: str, name: str) -> str:
+        stat: os.stat_result = os.stat(local)
+        kind: str = ("cdir" if name == "." else "dir") if os.path.isdir(local) else "file"
+
+        return f"type={kind};size={stat.st_size};modify={strftime('%Y%m%d%H%M%S', gmtime(stat.st_mtime))}; {name}"
+
+    def ftp_MLSD(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.isdir(local):
+            self.reply(f"550 {arg}: No such directory.")
+            return
+
+        lines: list[str] = [self.mlsx_facts(local, ".")]
+        lines += [self.mlsx_facts(os.path.join(local, name), name) for name in sorted(os.listdir(local))]
+
+        self.send_data("".join(f"{line}\r\n" for line in lines).encode())
+
+    def ftp_MLST(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.exists(local):
+            self.reply(f"550 {arg}: No such file or directory.")
+            return
+
+        self.wfile.write(f"250-Listing {arg}\r\n {self.mlsx_facts(local, arg)}\r\n".encode())
+        self.reply("250 End")
+
+    def ftp_SIZE(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.isfile(local):
+            self.reply(f"550 {arg}: No such file.")
+            return
+
+        self.reply(f"213 {os.path.getsize(local)}")
+
+    def ftp_MDTM(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.exists(local):
+            self.reply(f"550 {arg}: No such file.")
+            return
+
+        self.reply(f"213 {strftime('%Y%m%d%H%M%S', gmtime(os.path.getmtime(local)))}")
+
+    def ftp_HASH(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.isfile(local):
+            self.reply(f"550 {arg}: No such file.")
+            return
+
+        with open(local, "rb") as file:
+            digest: str = hashlib.file_digest(file, "sha256").hexdigest()
+
+        self.reply(f"213 SHA-256 0-{os.path.getsize(local)} {digest} {arg}")
+
+    def ftp_XCRC(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+        crc: int = 0
+
+        if local is None or not os.path.isfile(local):
+            self.reply(f"550 {arg}: No such file.")
+            return
+
+        with open(local, "rb") as file:
+            while chunk := file.read(DATA_CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+
+        self.reply(f"250 {crc:08X}")
+
+    #transfer commands
+
+    def ftp_REST(self, arg: str) -> None:
+        self.rest = int(arg)
+        self.reply(f"350 Restarting at {self.rest}.")
+
+    def ftp_ABOR(self, arg: str) -> None:
+        self.reply("226 Abort successful.")
+
+    def ftp_RETR(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+        offset: int = self.rest
+        self.rest = 0
+
+        if local is None or not os.path.isfile(local):
+            self.reply(f"550 {arg}: No such file.")
+            return
+
+        conn: Optional[socket.socket] = self.open_data_connection()
+
+        if conn is None:
+            return
+
+        self.reply("150 Opening BINARY mode data connection.")
+        drop_after: int = -1
+
+        if self.server.should_drop():
+            drop_after = self.server.random.randint(0, max(0, os.path.getsize(local) - offset))
+
+        with conn, open(local, "rb") as file:
+            file.seek(offset)
+            compressor: Any = zlib.compressobj() if self.mode == "Z" else None
+            sent: int = 0
+
+            while chunk := file.read(DATA_CHUNK_SIZE):
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+
+                if drop_after >= 0 and sent + len(chunk) > drop_after:
+                    conn.sendall(chunk[:drop_after - sent])
+                    break
+
+                try:
+                    conn.sendall(chunk)
+                except OSError:  #the client closed the data connection, e.g. after an ABOR
+                    break
+
+                sent += len(chunk)
+
+            else:
+                if compressor is not None:
+                    conn.sendall(compressor.flush())
+
+        self.reply("426 Connection closed; transfer aborted." if drop_after >= 0 else "226 Transfer complete.")
+
+    def ftp_STOR(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+        offset: int = self.rest
+        self.rest = 0
+
+        if local is None or not os.path.isdir(os.path.dirname(local)):
+            self.reply(f"553 {arg}: Could not create file.")
+            return
+
+        conn: Optional[socket.socket] = self.open_data_connection()
+
+        if conn is None:
+            return
+
+        self.reply("150 Ok to send data.")
+        dropped: bool = self.server.should_drop()
+
+        with conn, open(local, "r+b" if offset and os.path.exists(local) else "wb") as file:
+            file.seek(offset)
+            file.truncate()
+            decompressor: Any = zlib.decompressobj() if self.mode == "Z" else None
+
+            while chunk := conn.recv(DATA_CHUNK_SIZE):
+                file.write(chunk if decompressor is None else decompressor.decompress(chunk))
+
+                if dropped:
+                    break
+
+        self.reply("426 Connection closed; transfer aborted." if dropped else "226 Transfer complete.")
+
+    def ftp_MKD(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or os.path.exists(local):
+            self.reply(f"550 {arg}: Can't create directory.")
+            return
+
+        os.mkdir(local)
+        self.reply(f'257 "{arg}" created.')
+
+    def ftp_RMD(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.isdir(local):
+            self.reply(f"550 {arg}: No such directory.")
+            return
+
+        os.rmdir(local)
+        self.reply("250 Directory removed.")
+
+    def ftp_DELE(self, arg: str) -> None:
+        local: Optional[str] = self.local_path(arg)
+
+        if local is None or not os.path.isfile(local):
+            self.reply(f"550 {arg}: No such file.")
+            return
+
+        os.remove(local)
+        self.reply("250 File deleted.")
+
+    def ftp_MFMT(self, arg: str) -> None:
+        timestamp, _, path = arg.partition(" ")
+        local: Optional[str] = self.local_path(path)
+
+        if local is None or not os.path.exists(local):
+            self.reply(f"550 {path}: No such file.")
+            return
+
+        mtime: int = timegm(strptime(timestamp[:14], "%Y%m%d%H%M%S"))
+        os.utime(local, (mtime, mtime))
+        self.reply(f"213 Modify={timestamp}; {path}")
+
+
+def parse_user_arguments(usr_args: list[str]) -> Namespace:
+    r"""
+    Parses the arguments to run the stand-in FTP server from the command line.
+
+    :param usr_args:
+        User arguments
+
+    :return:
+        Parsed arguments
+    """
+
+    parser: ArgumentParser = ArgumentParser(description="Minimal FTP server that serves a local directory on the\
+                                            loopback interface, used to benchmark the FTP mirror routines.")
+
+    parser.add_argument("root", type=str, help="Local directory that will be served as the FTP root.")
+    parser.add_argument("-p", "--port", type=int, default=0, help="Port to listen on, 0 picks a free one.")
+    parser.add_argument("-l", "--link", type=str, choices=LINK_PROFILES.keys(), default="loopback", help="Latency\
+                        and drop rate profile used to simulate the phone network link.")
+    parser.add_argument("-s", "--seed", type=int, default=None, help="Seed for the random transfer drops.")
+
+    return parser.parse_args(usr_args)
+
+
+def main(usr_args: list[str]) -> None:
+    args: Namespace = parse_user_arguments(usr_args)
+    link: dict[str, float] = LINK_PROFILES[args.link]
+
+    with FTPStandinServer(("127.0.0.1", args.port), args.root, link["latency"], link["drop_rate"], args.seed) as server:
+        print(f"listening 127.0.0.1:{server.server_address[1]}", flush=True)
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main(argv[1:])
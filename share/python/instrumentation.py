@@ -0,0 +1,209 @@
+from typing import Any, Callable, Iterator, Optional
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter_ns, strftime
+from threading import Lock, current_thread, get_ident
+import atexit, os, sys
+
+
+TRACE_ENV: str = "SCRIPTS_TRACE"
+PROFILE_ENV: str = "SCRIPTS_PROFILE"
+CO_COROUTINE: int = 0x80  #the same flag as inspect.CO_COROUTINE, without importing inspect
+
+#state of the instrumentation, set by start_instrumentation; while it's disabled a span costs a single check
+
+ENABLED: bool = False
+OUTPUT_DIR: Optional[str] = None
+SCRIPT_NAME: str = "script"
+PROFILER: Optional[Any] = None
+EPOCH_NS: int = perf_counter_ns()
+SPANS: list[tuple[str, int, int, int, dict[str, Any]]] = []  #name, start, duration, tid and arguments
+TRACKS: dict[int, str] = {}
+TRACKS_LOCK: Lock = Lock()
+
+
+def start_instrumentation(script_name: str, output_dir: Optional[str] = None, profile: bool = False) -> bool:
+    r"""
+    Enables the span timers of the current process, and optionally cProfile, if an output directory is given or the
+    SCRIPTS_TRACE environment variable is set to one. The results are saved in that directory when the process exits,
+    or when stop_instrumentation is called.
+
+    :param script_name:
+        Name used as the prefix of the files saved in the output directory.
+    :param output_dir:
+        Directory where the trace, the profile and the span summary are saved, usually the value of a --trace flag.
+    :param profile:
+        Also run cProfile on the calling thread and dump its pstats file, the SCRIPTS_PROFILE environment variable set
+        to anything but 0 does the same.
+
+    :return:
+        True if the instrumentation is enabled.
+    """
+
+    global ENABLED, OUTPUT_DIR, SCRIPT_NAME, PROFILER
+
+    output_dir = output_dir or os.getenv(TRACE_ENV)
+
+    if ENABLED or not output_dir:
+        return ENABLED
+
+    ENABLED = True
+    OUTPUT_DIR = output_dir
+    SCRIPT_NAME = script_name
+
+    if profile or os.getenv(PROFILE_ENV, "0") not in ["", "0"]:
+        import cProfile
+
+        PROFILER = cProfile.Profile()
+        PROFILER.enable()
+
+    atexit.register(stop_instrumentation)
+    return True
+
+
+def get_track() -> int:
+    r"""
+    Returns the id of the track where the spans of the caller are drawn in the trace: the current asyncio task, so
+    the interleaved transfers of the event loop don't overlap each other, or else the current thread.
+    """
+
+    asyncio: Any = sys.modules.get("asyncio")  #only when the script already imported it
+    task: Any = None
+
+    if asyncio is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError as _:  #no running event loop on this thread
+            pass
+
+    track: int = id(task) if task is not None else get_ident()
+
+    if track not in TRACKS:
+        with TRACKS_LOCK:
+            TRACKS[track] = task.get_name() if task is not None else current_thread().name
+
+    return track
+
+
+@contextmanager
+def span(name: str, **args: Any) -> Iterator[None]:
+    r"""
+    Times the code inside the with block as a named phase, like connect, list, retrieve, copy, compress or verify.
+
+    :param name:
+        Name of the phase, the summary groups the spans by it.
+    :param args:
+        Extra values shown with the span in the trace viewer, like the path of the file.
+    """
+
+    if not ENABLED:
+        yield
+        return
+
+    start: int = perf_counter_ns()
+
+    try:
+        yield
+    finally:
+        SPANS.append((name, start, perf_counter_ns() - start, get_track(), args))  #list.append is thread safe
+
+
+def traced(name: str) -> Callable:
+    r"""
+    Decorator that runs every call of a function, or of a coroutine function, inside a span.
+
+    :param name:
+        Name of the span.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        if function.__code__.co_flags & CO_COROUTINE:
+            @wraps(function)
+            async def async_wrapper(*args, **key_args) -> Any:
+                with span(name):
+                    return await function(*args, **key_args)
+
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **key_args) -> Any:
+            with span(name):
+                return function(*args, **key_args)
+
+        return wrapper
+
+    return decorator
+
+
+def summarize_spans() -> list[tuple[str, int, float, float, float]]:
+    r"""
+    Groups the recorded spans by name.
+
+    :return:
+        A list of (name, count, total, mean and max milliseconds) tuples, sorted by the total time.
+    """
+
+    groups: dict[str, list[int]] = {}
+
+    for name, _, duration, _, _ in SPANS:
+        groups.setdefault(name, []).append(duration)
+
+    return sorted(((name, len(durations), sum(durations) / 1e6, sum(durations) / len(durations) / 1e6,
+                    max(durations) / 1e6) for name, durations in groups.items()), key=lambda group: -group[2])
+
+
+def write_chrome_trace(path: str) -> None:
+    r"""
+    Saves the recorded spans as a Chrome trace-event JSON file, that can be opened in chrome://tracing or Perfetto.
+    """
+
+    from json import dump
+
+    pid: int = os.getpid()
+    events: list[dict[str, Any]] = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": track,
+                                     "args": {"name": track_name}} for track, track_name in TRACKS.items()]
+    events += [{"name": name, "cat": SCRIPT_NAME, "ph": "X", "pid": pid, "tid": track, "ts": (start - EPOCH_NS) / 1e3,
+                "dur": duration / 1e3, "args": {key: str(value) for key, value in args.items()}}
+               for name, start, duration, track, args in list(SPANS)]
+
+    with open(path, "w") as file:
+        dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def stop_instrumentation() -> list[str]:
+    r"""
+    Stops the profiler and saves the results of the instrumentation in the output directory: a Chrome trace of the
+    spans, the pstats dump of cProfile (if it was enabled) and a plain text summary of the spans, that's printed to
+    the stderr too.
+
+    :return:
+        The paths of the saved files, nothing if the instrumentation wasn't enabled.
+    """
+
+    global ENABLED, PROFILER
+
+    if not ENABLED:
+        return []
+
+    ENABLED = False
+    prefix: str = os.path.join(OUTPUT_DIR, f"{SCRIPT_NAME}.{strftime('%Y%m%d-%H%M%S')}.{os.getpid()}")
+    saved: list[str] = [f"{prefix}.trace.json", f"{prefix}.spans.txt"]
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    write_chrome_trace(saved[0])
+
+    if PROFILER is not None:
+        PROFILER.disable()
+        PROFILER.dump_stats(f"{prefix}.pstats")
+        saved.append(f"{prefix}.pstats")
+        PROFILER = None
+
+    summary: str = f"{'span':<24} {'count':>8} {'total ms':>12} {'mean ms':>10} {'max ms':>10}\n" + "".join(
+        f"{name:<24} {count:>8} {total:>12.2f} {mean:>10.3f} {longest:>10.3f}\n"
+        for name, count, total, mean, longest in summarize_spans())
+
+    with open(saved[1], "w") as file:
+        file.write(summary)
+
+    sys.stderr.write(f"{summary}Instrumentation saved to {', '.join(saved)}\n")
+    return saved
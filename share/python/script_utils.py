@@ -1,12 +1,14 @@
-from typing import Any, Literal, Optional, Callable, Any
+from typing import Any, Literal, Optional, Callable
 from time import sleep
-import curses, os
+from threading import Lock
+import os, re, sys
 
 
 def display_options_menu(title: str, options: dict[Any, str], default_option: int = 0,
-                            up_keys: list[int] = [curses.KEY_UP, ord("k")],
-                            down_keys: list[int] = [curses.KEY_DOWN, ord("j")],
-                            select_keys: list[int] = [curses.KEY_ENTER, 10, 13, ord("o")]) -> Any:
+                            up_keys: Optional[list[int]] = None,
+                            down_keys: Optional[list[int]] = None,
+                            select_keys: Optional[list[int]] = None,
+                            filter_keys: list[int] = [ord("/")]) -> Any:
     r"""
     This function displays an interactive options menu in the terminal. The menu is navigable using specified keys
     for moving the selection up and down, and for selecting an option.
@@ -28,6 +30,11 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
     :param select_keys:
         A list of key codes that, when pressed, select the currently highlighted option. By default, these are the
         enter key and the 'o' key.
+    :param filter_keys:
+        A list of key codes that, when pressed, start the type-to-filter mode. While filtering, every printable key
+        narrows the options with a fuzzy (subsequence) match, backspace undoes the last character, the up and down
+        arrows move the selection, the enter key selects and escape clears the filter. By default, this is the '/'
+        key.
 
     :return:
         A tuple containing three elements: the index of the selected option, the key of the selected option, and
@@ -35,11 +42,18 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
         user.
     """
 
+    import curses  #only loaded when a menu is shown, the callers that just print don't pay for it
+
+    up_keys = [curses.KEY_UP, ord("k")] if up_keys is None else up_keys
+    down_keys = [curses.KEY_DOWN, ord("j")] if down_keys is None else down_keys
+    select_keys = [curses.KEY_ENTER, 10, 13, ord("o")] if select_keys is None else select_keys
+
     TITLE_PADDING_START: int = 1
     PROMPT_PADDING_START: int = 2
 
     option_keys: list[Any] = list(options.keys())
     option_values: list[str] = list(options.values())
+    option_index: list[str] = [option_value.lower() for option_value in option_values]  #precomputed for the filter
 
     #variables related to formating the style of the menu, size of each option, paddings, etc.
 
@@ -59,7 +73,11 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
     def __display_options_menu_wrapper(stdscr: "curses._CursesWindow"):
         r"""
         This function displays an options menu in a curses window. It allows the user to navigate through the
-        options using the up and down keys.
+        options using the up and down keys, or to type a fuzzy filter after pressing one of the filter keys.
+
+        Only the rows that changed are repainted on each keypress (the previous and the new highlighted option), and
+        the screen is flushed with noutrefresh/doupdate. When the menu is taller than the terminal, only a scrolling
+        viewport of the options is drawn, so the cost of a keypress doesn't depend on the number of options.
 
         :param stdscr:
             The curses window in which the options menu will be displayed.
@@ -69,65 +87,216 @@ def display_options_menu(title: str, options: dict[Any, str], default_option: in
 
         nonlocal title_lines, option_keys, option_values, selected_key, selected_index, selected_value, user_input
 
-        stdscr.refresh()
+        screen_height: int = 0
+        screen_width: int = 0
+        viewport_height: int = 1
+        viewport_top: int = 0
+
+        #the filter keeps a stack of candidates, one level per typed character; each level stores the option indexes
+        #that still match and the position right after their last matched character, so a new character only scans
+        #the previous level instead of every option, and the backspace just pops a level
+
+        filter_mode: bool = False
+        filter_query: str = ""
+        filter_stack: list[tuple[list[int], list[int]]] = [(list(range(len(option_values))), [0] * len(option_values))]
+        visible_options: list[int] = filter_stack[-1][0]
+        cursor: int = selected_index
+
+        def __draw_option(row: int) -> None:
+            option_value: str = option_values[visible_options[row]]
+            option_length_difference: int = max_prompt_length - len(option_value)
+            option_prompt: str = f"  {option_value.strip()}  " + " " * option_length_difference
+
+            stdscr.addnstr(row - viewport_top + menu_list_padding_top, PROMPT_PADDING_START, option_prompt,
+                           max(1, screen_width - PROMPT_PADDING_START - 1), curses.A_REVERSE if row == cursor else 0)
+
+        def __draw_filter_prompt() -> None:
+            if not filter_mode and not filter_query:
+                return
+
+            filter_prompt: str = f"/{filter_query}" + ("" if visible_options else "  (no matches)")
+
+            stdscr.move(screen_height - 1, 0)
+            stdscr.clrtoeol()
+            stdscr.addnstr(screen_height - 1, PROMPT_PADDING_START, filter_prompt,
+                           max(1, screen_width - PROMPT_PADDING_START - 1))
+
+        def __draw_viewport() -> None:
+            stdscr.move(menu_list_padding_top, 0)
+            stdscr.clrtobot()
+
+            for row in range(viewport_top, min(len(visible_options), viewport_top + viewport_height)):
+                __draw_option(row)
 
-        while user_input not in select_keys:  #only stops the event listener when the enter key is pressed
-            stdscr.clear()
+            __draw_filter_prompt()
+
+        def __draw_screen() -> None:
+            nonlocal screen_height, screen_width, viewport_height, viewport_top
+
+            screen_height, screen_width = stdscr.getmaxyx()
+            viewport_height = max(1, screen_height - menu_list_padding_top - 2)  #the last line is for the filter
+            viewport_top = min(viewport_top, cursor)
+            viewport_top = max(viewport_top, cursor - viewport_height + 1)
+
+            stdscr.erase()
 
             for key, title_line in enumerate(title_lines):  #logic to write the title lines
-                stdscr.addstr(title_padding_top + key, TITLE_PADDING_START + PROMPT_PADDING_START, title_line)
+                stdscr.addnstr(title_padding_top + key, TITLE_PADDING_START + PROMPT_PADDING_START, title_line,
+                               max(1, screen_width - TITLE_PADDING_START - PROMPT_PADDING_START - 1))
+
+            __draw_viewport()
+
+        def __narrow_filter(char: str) -> None:
+            candidates: list[int]; positions: list[int]
+            candidates, positions = filter_stack[-1]
+            next_candidates: list[int] = []
+            next_positions: list[int] = []
+
+            for index, position in zip(candidates, positions):
+                found: int = option_index[index].find(char, position)
 
-            for key, option_value in enumerate(option_values):  #logic to write the menu options formated in a beaty way
-                option_length: int = len(option_value)
-                option_length_difference: int = max_prompt_length - option_length
-                option_prompt: str = f"  {option_value.strip()}  " + " " * option_length_difference
+                if found != -1:
+                    next_candidates.append(index)
+                    next_positions.append(found + 1)
 
-                stdscr.addstr(key + menu_list_padding_top, PROMPT_PADDING_START, option_prompt,
-                                curses.A_REVERSE if key == selected_index else 0)
+            filter_stack.append((next_candidates, next_positions))
 
-                if key == len(option_values) - 1:
-                    stdscr.addstr(key + menu_list_padding_top + 2, 0, "")
+        curses.set_escdelay(25)
+        __draw_screen()
+
+        while True:  #only stops the event listener when an option is selected
+            shown_options: int = min(len(visible_options) - viewport_top, viewport_height)
+
+            if filter_mode:
+                stdscr.move(screen_height - 1, min(PROMPT_PADDING_START + 1 + len(filter_query), screen_width - 1))
+            else:
+                stdscr.move(min(menu_list_padding_top + shown_options + 1, screen_height - 1), 0)
+
+            stdscr.noutrefresh()
+            curses.doupdate()
 
             #user event listeners section
 
-            stdscr.refresh()
             user_input = stdscr.getch()
-
-            if user_input in up_keys:
-                selected_index = (selected_index - 1) % len(option_keys)
+            previous_cursor: int = cursor
+            previous_query: str = filter_query
+            previous_filter_mode: bool = filter_mode
+
+            if user_input == curses.KEY_RESIZE:
+                __draw_screen()
+                continue
+
+            if filter_mode:
+                if user_input in [curses.KEY_ENTER, 10, 13]:
+                    if visible_options:
+                        break
+                elif user_input == 27:  #escape leaves the filter mode and shows every option again
+                    filter_mode = False
+                    filter_query = ""
+                    del filter_stack[1:]
+                elif user_input in [curses.KEY_BACKSPACE, 127, 8]:
+                    if filter_query:
+                        filter_query = filter_query[:-1]
+                        filter_stack.pop()
+                elif user_input == curses.KEY_UP and visible_options:
+                    cursor = (cursor - 1) % len(visible_options)
+                elif user_input == curses.KEY_DOWN and visible_options:
+                    cursor = (cursor + 1) % len(visible_options)
+                elif 32 <= user_input <= 126:
+                    filter_query += chr(user_input).lower()
+                    __narrow_filter(filter_query[-1])
+
+            elif user_input in select_keys:
+                break
+            elif user_input in filter_keys:
+                filter_mode = True
+            elif user_input in up_keys:
+                cursor = (cursor - 1) % len(visible_options)
             elif user_input in down_keys:
-                selected_index = (selected_index + 1) % len(option_keys)
+                cursor = (cursor + 1) % len(visible_options)
+
+            if filter_query != previous_query or filter_mode != previous_filter_mode:
+                visible_options = filter_stack[-1][0]
+
+                try:  #keeps the same option highlighted if it still matches the filter
+                    cursor = visible_options.index(selected_index)
+                except ValueError:
+                    cursor = 0
 
-            selected_key = option_keys[selected_index]
-            selected_value = option_values[selected_index]
+                viewport_top = max(0, cursor - viewport_height + 1)
+                __draw_viewport()
+
+            elif cursor != previous_cursor:
+                if viewport_top <= cursor < viewport_top + viewport_height:  #only the two changed rows
+                    __draw_option(previous_cursor)
+                    __draw_option(cursor)
+                else:
+                    viewport_top = cursor if cursor < viewport_top else cursor - viewport_height + 1
+                    __draw_viewport()
+
+            if visible_options:
+                selected_index = visible_options[cursor]
+                selected_key = option_keys[selected_index]
+                selected_value = option_values[selected_index]
 
     curses.wrapper(__display_options_menu_wrapper)
     return (selected_index, selected_key, selected_value)
 
 
-def cprint(message: str) -> None:
+CPRINT_TAGS: dict[str, str] = {
+    "[B]": "\033[;;30m", "[^B]": "\033[;;40m",
+    "[r]": "\033[;;31m", "[^r]": "\033[;;41m",
+    "[g]": "\033[;;32m", "[^g]": "\033[;;42m",
+    "[y]": "\033[;;33m", "[^y]": "\033[;;43m",
+    "[b]": "\033[;;34m", "[^b]": "\033[;;44m",
+    "[m]": "\033[;;35m", "[^m]": "\033[;;45m",
+    "[c]": "\033[;;36m", "[^c]": "\033[;;46m",
+    "[w]": "\033[;;37m", "[^w]": "\033[;;47m",
+    "[/]": "\033[m",
+}
+CPRINT_TAGS_PATTERN: re.Pattern = re.compile(r"\[\^?[Brgybmcw]\]|\[/\]")
+CPRINT_COLORED: bool = sys.stdout.isatty()
+ANSI_CODES_PATTERN: re.Pattern = re.compile(r"\033\[[;\d]*m")
+STDOUT_LOCK: Lock = Lock()
+
+
+def write_line(line: str) -> None:
     r"""
-    Prints a colored message to the console based on color tags within the message.
+    Writes a line to the stdout in a single locked call, so the lines written by different threads don't interleave.
 
-    :param message: The message to print with color tags.
+    :param line: The line to write, without the trailing line break.
     """
 
-    clr_tags: list[tuple[str, str]] = [
-        ("[B]", "\033[;;30m"), ("[^B]", "\033[;;40m"),
-        ("[r]", "\033[;;31m"), ("[^r]", "\033[;;41m"),
-        ("[g]", "\033[;;32m"), ("[^g]", "\033[;;42m"),
-        ("[y]", "\033[;;33m"), ("[^y]", "\033[;;43m"),
-        ("[b]", "\033[;;34m"), ("[^b]", "\033[;;44m"),
-        ("[m]", "\033[;;35m"), ("[^m]", "\033[;;45m"),
-        ("[c]", "\033[;;36m"), ("[^c]", "\033[;;46m"),
-        ("[w]", "\033[;;37m"), ("[^w]", "\033[;;47m"),
-        ("[/]", "\033[m"),
-    ]
+    with STDOUT_LOCK:
+        sys.stdout.write(line + "\n")
+
+
+def render_color_tags(message: str, colored: bool = True) -> str:
+    r"""
+    Replaces the color tags within the message by their ANSI codes in a single pass of a precompiled regex, or removes
+    them when the output is not colored.
+
+    :param message: The message with color tags.
+    :param colored: Whether the tags should be replaced by the color codes or just stripped.
+
+    :return: The rendered message.
+    """
 
-    for clr_tag, clr_code in clr_tags:
-        message = message.replace(clr_tag, clr_code)
+    if "[" not in message:  #nothing to render, most of the plain messages end here
+        return message
 
-    print(message)
+    return CPRINT_TAGS_PATTERN.sub(lambda match: CPRINT_TAGS[match.group()] if colored else "", message)
+
+
+def cprint(message: str) -> None:
+    r"""
+    Prints a colored message to the console based on color tags within the message. The tags are stripped when the
+    stdout is not a terminal.
+
+    :param message: The message to print with color tags.
+    """
+
+    write_line(render_color_tags(message, CPRINT_COLORED))
 
 
 logger_msg_type = Literal["warning", "info", "todo", "error", "fail", "good", "pass"]
@@ -135,7 +304,8 @@ logger_pad_type = Literal["top", "bottom", "both"]
 
 def logger(message: str, ptype: logger_msg_type = "info", padding: Optional[logger_pad_type] = None) -> None:
     r"""
-    Logs a message with a specified type and optional padding.
+    Logs a message with a specified type and optional padding. The type label is written without its colors when the
+    stdout is not a terminal, like cprint does.
 
     :param message:
         The message to log.
@@ -158,7 +328,11 @@ def logger(message: str, ptype: logger_msg_type = "info", padding: Optional[logg
     padding_top: str = "\n" if padding in ["top", "both"] else ""
     padding_bottom: str = "\n" if padding in ["bottom", "both"] else ""
 
-    print(f"{padding_top}{prefix[ptype]} {message}\033[m{padding_bottom}")
+    if not CPRINT_COLORED:
+        write_line(f"{padding_top}{ANSI_CODES_PATTERN.sub('', prefix[ptype]).strip()} {message}{padding_bottom}")
+        return
+
+    write_line(f"{padding_top}{prefix[ptype]} {message}\033[m{padding_bottom}")
 
 
 def clear() -> None:
@@ -169,24 +343,29 @@ def clear() -> None:
     os.system("cls" if os.name == "nt" else "clear")
 
 
-def retry(expected_err: Exception = Exception, delay_sec: int = 1) -> Callable:
+def retry(expected_err: Exception = Exception, delay_sec: int = 1, max_attempts: Optional[int] = None) -> Callable:
     r"""
     A decorator for retrying a function execution upon encountering specified exceptions.
 
     This decorator wraps a function such that if the function raises an exception of the type `expected_err`, it will
     retry executing the function after a delay specified by `delay_sec`. If the function raises an exception that is not
-    of the type `expected_err`, it will print an error message and raise that error too.
+    of the type `expected_err`, it will print an error message and raise that error too. When `max_attempts` is set,
+    the last error is raised after that many failed attempts, with the count in its `retry_attempts` attribute.
 
     :param expected_err:
         The type of the exceptions upon which the function should be retried. Default is `Exception`, which means the
         function will be retried for any exception.
     :param delay_sec:
         The number of seconds to wait before retrying the function. Default is 1.
+    :param max_attempts:
+        The maximum number of times the function will be executed before giving up. Default is None, which means the
+        function will be retried forever.
 
     :returns:
         A callable that takes a function and returns a wrapped version of the function.
     :raises Exception:
-        If the function raises an exception that is not of the type `expected_err`.
+        If the function raises an exception that is not of the type `expected_err`, or keeps raising it after
+        `max_attempts` attempts.
 
     :Example:
 
@@ -199,7 +378,11 @@ def retry(expected_err: Exception = Exception, delay_sec: int = 1) -> Callable:
 
     def decorator(function: Callable) -> Callable:
         def wrapper(*args, **key_args) -> Any:
+            attempts: int = 0
+
             while True:
+                attempts += 1
+
                 try:
                     return function(*args, **key_args)
 
@@ -208,6 +391,11 @@ def retry(expected_err: Exception = Exception, delay_sec: int = 1) -> Callable:
                         cprint(f"[r]Unexpected Error[/]: [B][retry][/] {err} at {function}")
                         raise err
 
+                    if max_attempts is not None and attempts >= max_attempts:
+                        cprint(f"[r]Error[/]: [B][retry][/] {err} at {function}, giving up after {attempts} attempts")
+                        err.retry_attempts = attempts
+                        raise err
+
                     cprint(f"[r]Error[/]: [B][retry][/] {err} at {function}, trying again...")
                     sleep(delay_sec)
 